@@ -0,0 +1,208 @@
+"""
+Source and sink adapters streaming records in and out of the tokenizer.
+
+Sources are iterables of records and sinks have the same interface as
+BulkWriter(add, is_full, flush), so records are never all kept in memory.
+'-' is used as the path of stdin and stdout
+"""
+
+import copy
+import io
+import sys
+import time
+
+from bson import json_util
+
+# Path used for reading stdin and writing stdout
+STDIO_PATH = '-'
+
+
+def open_input(path):
+    """
+    Returns:
+        File object of path or stdin
+    """
+    if path == STDIO_PATH:
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def open_output(path):
+    """
+    Returns:
+        File object of path or stdout
+    """
+    if path == STDIO_PATH:
+        return io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def iter_batches(records, batch_size):
+    """
+    Splits records into lists of batch_size records
+
+    Returns:
+        Generator of record lists
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class TextSource(object):
+    """Reads lines of a text file(ie: test ingredients file) one by one"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        f = open_input(self.path)
+        try:
+            for line in f:
+                yield line.rstrip('\r\n')
+        finally:
+            if self.path == STDIO_PATH:
+                # Keeping stdin open
+                f.detach()
+            else:
+                f.close()
+
+
+class JsonlSource(object):
+    """
+    Reads documents from a JSON lines file, one document per line.
+    Lines are parsed as mongo extended JSON, so mongoexport output
+    is read with ObjectId and dates
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        for line in TextSource(self.path):
+            if line.strip():
+                yield json_util.loads(line)
+
+
+class MongoSource(object):
+    """Reads documents of an aggregation pipeline using one cursor"""
+
+    def __init__(self, collection, pipeline, batch_size=1000):
+        self.collection = collection
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        cursor = self.collection.aggregate(
+            self.pipeline, allowDiskUse=True, batchSize=self.batch_size)
+        try:
+            for document in cursor:
+                yield document
+        finally:
+            cursor.close()
+
+
+class JsonlSink(object):
+    """
+    Writes documents into a JSON lines file as mongo extended JSON.
+    Documents are buffered like BulkWriter and written on flush
+    """
+
+    def __init__(self, path, batch_size=1000, batch_bytes=16 * 1024 * 1024):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.file = open_output(path)
+        self.lines = []
+        self.pending_bytes = 0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def add(self, document):
+        """Buffers document to be written in next flush"""
+        line = json_util.dumps(document) + '\n'
+        self.lines.append(line)
+        self.pending_bytes += len(line)
+
+    def detach(self):
+        """
+        Moves buffered documents into a new writer, so they can be
+        flushed while next documents are buffered in this writer
+
+        Returns:
+            Writer with the buffered documents
+        """
+        writer = copy.copy(self)
+        self.lines = []
+        self.pending_bytes = 0
+        return writer
+
+    def is_full(self):
+        return len(self.lines) >= self.batch_size or \
+            self.pending_bytes >= self.batch_bytes
+
+    def flush(self):
+        """
+        Writes buffered documents
+
+        Returns:
+            Flush stats(dict) same as BulkWriter.flush
+        """
+        start_time = time.time()
+        documents, pending_bytes = len(self.lines), self.pending_bytes
+        if documents:
+            self.file.write("".join(self.lines))
+            self.file.flush()
+        seconds = time.time() - start_time
+
+        self.lines = []
+        self.pending_bytes = 0
+        return {
+            'documents': documents,
+            'written': documents,
+            'bytes': pending_bytes,
+            'seconds': round(seconds, 3),
+            'docs_per_sec': round(documents / seconds, 1) if seconds else 0.0,
+            'bytes_per_sec': round(pending_bytes / seconds, 1) if seconds else 0.0,
+            'retries': 0
+        }
+
+    def close(self):
+        """Writes buffered documents and closes the file"""
+        self.flush()
+        if self.path == STDIO_PATH:
+            # Keeping stdout open
+            self.file.detach()
+        else:
+            self.file.close()
+
+
+class JsonArraySink(JsonlSink):
+    """
+    Writes documents into a file as one JSON array, which is the format of
+    the test run output. Documents are still written on flush
+    """
+
+    def __init__(self, path, batch_size=1000, batch_bytes=16 * 1024 * 1024):
+        super(JsonArraySink, self).__init__(
+            path, batch_size=batch_size, batch_bytes=batch_bytes)
+        self.separator = '['
+
+    def add(self, document):
+        """Buffers document to be written in next flush"""
+        line = self.separator + json_util.dumps(document)
+        self.separator = ', '
+        self.lines.append(line)
+        self.pending_bytes += len(line)
+
+    def close(self):
+        """Writes buffered documents, ends the array and closes the file"""
+        self.flush()
+        self.file.write('[]' if self.separator == '[' else ']')
+        super(JsonArraySink, self).close()
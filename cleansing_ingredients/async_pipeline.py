@@ -0,0 +1,255 @@
+"""
+asyncio version of the reader -> parser -> writer pipeline.
+
+pymongo calls are blocking, so reading and bulk writes are offloaded to
+a thread pool executor and parsing runs in a worker pool or executor.
+The event loop only hands batches between them, so cursor prefetch,
+parsing and several in flight bulk writes overlap
+"""
+
+import asyncio
+import time
+from collections import deque
+
+# Marks the end of the items read by AsyncSource
+END = object()
+
+
+def pool_future(pool, func, arg):
+    """
+    Runs func(arg) in pool(multiprocessing Pool)
+
+    Returns:
+        asyncio Future of the result
+    """
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def set_result(result):
+        if not future.done():
+            future.set_result(result)
+
+    def set_exception(error):
+        if not future.done():
+            future.set_exception(error)
+
+    def call_soon(callback, value):
+        # Called in the result handler thread of pool, which stops if
+        # this raises. Results of batches still parsing when the pipeline
+        # stopped on an error come after the loop is closed, so are dropped
+        try:
+            loop.call_soon_threadsafe(callback, value)
+        except RuntimeError:
+            pass
+
+    pool.apply_async(
+        func, (arg,),
+        callback=lambda result: call_soon(set_result, result),
+        error_callback=lambda error: call_soon(set_exception, error)
+    )
+    return future
+
+
+class AsyncSource(object):
+    """
+    Iterates a blocking iterable(ie: generator reading a cursor)
+    in executor, keeping up to prefetch items read ahead.
+    get_stall is the time consumer waited for items and
+    put_stall is the time reading waited for the consumer
+    """
+
+    def __init__(self, iterable, executor, prefetch=4):
+        self.iterable = iterable
+        self.executor = executor
+        self.prefetch = max(prefetch, 1)
+        self.queue = None
+        self.max_depth = 0
+        self.put_stall = 0.0
+        self.get_stall = 0.0
+
+    async def _fill(self):
+        loop = asyncio.get_event_loop()
+        iterator = iter(self.iterable)
+        while True:
+            try:
+                item = await loop.run_in_executor(
+                    self.executor, next, iterator, END)
+            except Exception as e:
+                item = e
+            start_time = time.time()
+            await self.queue.put(item)
+            self.put_stall += time.time() - start_time
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+            if item is END or isinstance(item, Exception):
+                break
+
+    async def __aiter__(self):
+        self.queue = asyncio.Queue(self.prefetch)
+        fill_task = asyncio.ensure_future(self._fill())
+        try:
+            while True:
+                start_time = time.time()
+                item = await self.queue.get()
+                self.get_stall += time.time() - start_time
+                if item is END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            fill_task.cancel()
+            try:
+                await fill_task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self):
+        """
+        Returns:
+            Prefetch counters(dict) for logging
+        """
+        return {
+            'name': 'read',
+            'depth': self.queue.qsize() if self.queue else 0,
+            'max_depth': self.max_depth,
+            'put_stall': round(self.put_stall, 3),
+            'get_stall': round(self.get_stall, 3)
+        }
+
+
+class AsyncBulkWriter(object):
+    """
+    Runs flushes of writer(BulkWriter or JsonlSink) in executor with
+    up to in_flight flushes at a time, documents are buffered in writer
+    while the detached batches are being written.
+
+    on_flushed is called in the event loop with flush stats and
+    context of every flush in the order of flushes, so a flush is
+    reported only after all the flushes before it are completed
+    """
+
+    def __init__(self, writer, executor, in_flight=2, on_flushed=None):
+        self.writer = writer
+        self.executor = executor
+        self.in_flight = max(in_flight, 1)
+        self.on_flushed = on_flushed
+        self.pending = deque()
+        self.max_depth = 0
+        self.put_stall = 0.0
+
+    async def _complete_first(self):
+        future, context = self.pending[0]
+        try:
+            stats = await future
+        finally:
+            self.pending.popleft()
+        if self.on_flushed is not None:
+            self.on_flushed(stats, context)
+
+    async def flush(self, context=None):
+        """
+        Starts writing documents buffered in writer,
+        waits only if in_flight flushes are running
+        """
+        start_time = time.time()
+        while len(self.pending) >= self.in_flight:
+            await self._complete_first()
+        self.put_stall += time.time() - start_time
+
+        loop = asyncio.get_event_loop()
+        batch = self.writer.detach()
+        self.pending.append((loop.run_in_executor(self.executor, batch.flush), context))
+        self.max_depth = max(self.max_depth, len(self.pending))
+        # Reporting flushes completed meanwhile
+        while self.pending and self.pending[0][0].done():
+            await self._complete_first()
+
+    async def drain(self):
+        """Waits for all the running flushes"""
+        while self.pending:
+            await self._complete_first()
+
+    def stats(self):
+        """
+        Returns:
+            In flight write counters(dict) for logging
+        """
+        return {
+            'name': 'write',
+            'depth': len(self.pending),
+            'max_depth': self.max_depth,
+            'put_stall': round(self.put_stall, 3),
+            'get_stall': 0.0
+        }
+
+
+class AsyncPipeline(object):
+    """
+    Runs reader -> parser -> writer stages in an event loop.
+
+    reader is a generator function of batches iterated in io_executor,
+    parser is called for every batch in pool(multiprocessing Pool) or
+    parse_executor with at most in_flight batches being parsed and
+    writer is a coroutine function called with parsed batches
+    in the order batches are read. Flushes of sink(AsyncBulkWriter)
+    started by writer are waited for after the last batch
+    """
+
+    def __init__(self, reader, parser, writer, io_executor, parse_executor=None,
+                 pool=None, sink=None, prefetch=4, in_flight=1):
+        self.reader = reader
+        self.parser = parser
+        self.writer = writer
+        self.sink = sink
+        self.io_executor = io_executor
+        self.parse_executor = parse_executor
+        self.pool = pool
+        self.in_flight = max(in_flight, 1)
+        self.source = AsyncSource(self.reader(), io_executor, prefetch)
+
+    def _parse(self, batch):
+        if self.pool is not None:
+            return pool_future(self.pool, self.parser, batch)
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.parse_executor, self.parser, batch)
+
+    async def _run(self):
+        pending = deque()
+        batches = self.source.__aiter__()
+        try:
+            async for batch in batches:
+                pending.append(self._parse(batch))
+                if len(pending) >= self.in_flight:
+                    await self.writer(await pending.popleft())
+
+            while pending:
+                await self.writer(await pending.popleft())
+            if self.sink is not None:
+                await self.sink.drain()
+        finally:
+            for future in pending:
+                future.cancel()
+            await batches.aclose()
+
+    def run(self):
+        """
+        Runs all the stages till reader is exhausted in a new event loop,
+        errors raised in any stage are raised again here
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self._run())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def stats(self):
+        """
+        Returns:
+            Counters(list of dict) of prefetched batches
+            and in flight writes for logging
+        """
+        if self.sink is None:
+            return [self.source.stats()]
+        return [self.source.stats(), self.sink.stats()]
@@ -16,10 +16,12 @@ from optparse import OptionParser
 import pandas as pd
 from unidecode import unidecode
 
+from snapshot import MasterdataSnapshot
 from utils import get_master_mongo_conn, \
     get_ing_mongo_conn, \
-    standardize_ingredient, \
+    standardize_ingredient, StringReplacer, \
     get_ingredientmaster_values, \
+    get_masterdata_fingerprint, get_peak_rss, \
     get_logger
 
 BASEDIR = os.path.dirname(os.path.realpath(__file__))
@@ -44,6 +46,7 @@ class CommonWords(object):
         self.testrun = options.testrun
         self.ingredients_file = options.ingredients_file
         self.threshold_limit = int(options.threshold_limit)
+        self.use_snapshot = options.use_snapshot
         self.master_db = get_master_mongo_conn()
         self.ing_db = get_ing_mongo_conn()
         self.before_char_re = r'[\s,\-:\(\d\*\/x]'
@@ -150,6 +153,45 @@ class CommonWords(object):
                             cleaned_ing_text.strip()
                         )
 
+    def load_masterdata(self):
+        """
+        Loads ingredientMaster data and the replacer from master data
+        snapshot, snapshot is rebuilt from db if master data is changed
+
+        Returns:
+            get_ingredientmaster_values result
+        """
+        snapshot = None
+        if self.use_snapshot:
+            snapshot = MasterdataSnapshot(
+                os.path.join(DATADIR, 'masterdata_common_words.pickle'),
+                get_masterdata_fingerprint(),
+                options={
+                    'before_char_re': self.before_char_re,
+                    'after_char_re': self.after_char_re
+                }
+            )
+            masterdata = snapshot.load()
+            if masterdata is not None:
+                logger.info(
+                    "Loaded master data snapshot: %s", snapshot.snapshot_file)
+                self.replacer = masterdata['replacer']
+                return masterdata['ing_data']
+
+        ing_time = datetime.now()
+        ing_data = get_ingredientmaster_values()
+        logger.info(
+            "Time taken to get Ingredients data from db: %s, PeakRSS: %sMB",
+            str(datetime.now() - ing_time)[:-3], get_peak_rss()
+        )
+        self.replacer = StringReplacer(
+            ing_data[0], self.before_char_re, self.after_char_re)
+        if snapshot is not None:
+            snapshot.save({'ing_data': ing_data, 'replacer': self.replacer})
+            logger.info(
+                "Saved master data snapshot: %s", snapshot.snapshot_file)
+        return ing_data
+
     def start_process(self):
         """
         This is the main function where the common words extraction starts
@@ -162,12 +204,11 @@ class CommonWords(object):
         db_start_time = datetime.now()
 
         self.ing_master_values = []
-        ing_data = get_ingredientmaster_values(
-            self.ing_db,
-        )
+        ing_data = self.load_masterdata()
         self.replace_strings, ingmaster_values, \
             ingredient_dict, alcoholic_beverages, \
-            nonfood_goods, ingredient_patterns, valid_skus = ing_data
+            nonfood_goods, ingredient_patterns, \
+            valid_skus, state_uom_chart = ing_data
         self.ing_master_values.extend(ingmaster_values.keys())
         self.ing_master_values.extend(alcoholic_beverages)
         self.ing_master_values.extend(nonfood_goods)
@@ -224,7 +265,8 @@ class CommonWords(object):
                     replace_strings=self.replace_strings,
                     before_char_re=self.before_char_re,
                     after_char_re=self.after_char_re,
-                    cleaning_func=self.basic_cleaning
+                    cleaning_func=self.basic_cleaning,
+                    replacer=self.replacer
                 )
                 cleaned_ing_text = cleaned_ing_text.lower()
                 self.extract_neighbor_words(
@@ -300,6 +342,12 @@ if __name__ == '__main__':
         default="30",
         help="Ingredients file"
     )
+    parser.add_option(
+        "--no-snapshot", dest="use_snapshot",
+        action="store_false", default=True,
+        help="Load master data from db with out using "
+             "or saving the master data snapshot"
+    )
 
     (options, args) = parser.parse_args()
     CommonWords(options)
@@ -0,0 +1,61 @@
+"""
+Lexer splitting ingredient text into word and value tokens
+"""
+
+import re
+
+from token_stream import TokenStream
+
+# Alternatives are tried in order like the old numbers_re, so only single
+# digits take '%'(ie: '2%' is a value, '25%' is '25' and '%')
+# and '1-2' is '1' and '-2'
+# Ex: '2 1/2', '1/2', '2.4', '.5', '25', '2%', '2', 'l/2', 'l', 'x' in '18x13'
+TOKEN_RE = re.compile(r'''
+    (?P<mixed>\d+\s\d+/\d+)
+    |(?P<fraction>\d+/\d+)
+    |(?P<decimal>\d+\.\d+|(?<!\S)\.\d+(?=\s))
+    |(?P<whole>\d{2,}|\d(?!%))
+    |(?P<percent>\d%)
+    |(?P<ocr_fraction>(?<!\S)l/\d+)
+    |(?P<ocr_whole>(?<!\S)l(?!\S))
+    |(?P<dimension>(?:(?<=\d)|(?<!\S))x(?=\d))
+    |(?P<slash>/)
+    |(?P<word>[^\s\d/]+(?:\d+[^\s\d/]*)*)
+''', re.VERBOSE | re.IGNORECASE)
+
+# Fractions like 11/2 which are 1 1/2 with out space
+MISSING_SPACE_RE = re.compile(r'\d\d/\d')
+
+
+def lex_ingredient(ingredient, token_index, tokens_replaced):
+    """
+    Splits ingredient text into tokens in a single pass.
+    Numbers are emitted as value tokens with their kind,
+    'l' and 'l/2'(OCR errors for 1 and 1/2) are emitted as values
+    and '/' and 'x' in dimensions(ie: 18x13) are emitted as separate tokens
+
+    Returns:
+        tokens(TokenStream)
+    """
+    tokens = TokenStream(token_index)
+    for matched in TOKEN_RE.finditer(ingredient):
+        kind = matched.lastgroup
+        value = matched.group()
+        if kind == 'word' or kind == 'slash':
+            tokens.append(value)
+            continue
+
+        if kind == 'ocr_whole':
+            # handeling cases like l creaml whipping plusl l milk
+            value, kind = '1', 'whole'
+        elif kind == 'ocr_fraction':
+            # handeling cases like l/2 teaspoon paprika
+            value, kind = '1' + value[1:], 'fraction'
+        elif kind == 'fraction' and MISSING_SPACE_RE.search(value):
+            # To handle cases like 11/2 etc
+            # This will add space between 1 and 1/2
+            _value = value[0] + ' ' + value[1:]
+            tokens_replaced[_value] = value
+            value, kind = _value, 'mixed'
+        tokens.append(value, kind=kind)
+    return tokens
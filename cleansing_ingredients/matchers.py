@@ -0,0 +1,338 @@
+"""
+Multi pattern matchers used for finding ingredientMaster values in ingredient text
+"""
+
+import re
+
+# Characters which makes a master value a regex instead of plain text
+REGEX_META_CHARS = set('.^$*+?{}[]|()\\')
+
+
+def unescape_value(value):
+    """
+    Converts ingredientMaster value(which is a regex source) to plain text
+    ie: 'bok choy \\(chinese\\)' to 'bok choy (chinese)'
+
+    Returns:
+        Plain text or None if the value uses regex syntax
+    """
+    chars = []
+    escaped = False
+    for char in value:
+        if escaped:
+            if char.isalnum():
+                # Character classes like \d, \s etc
+                return None
+            chars.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in REGEX_META_CHARS:
+            return None
+        else:
+            chars.append(char)
+
+    if escaped:
+        return None
+    return "".join(chars)
+
+
+class CharClass(object):
+    """Caches single character checks against a regex character class"""
+
+    def __init__(self, char_re):
+        self.char_re = re.compile(char_re, re.IGNORECASE)
+        self.chars = {}
+
+    def __contains__(self, char):
+        try:
+            return self.chars[char]
+        except KeyError:
+            is_match = bool(self.char_re.match(char))
+            self.chars[char] = is_match
+            return is_match
+
+
+class RegexMatcher(object):
+    """
+    Matches values using one alternation regex wrapped in
+    before and after lookarounds.
+    This is the old matching behaviour, kept for parity testing
+    """
+
+    def __init__(self, values, before_char_re, after_char_re):
+        self.values = values
+        self.match_re = re.compile(r'(?<={})({})(?={})'.format(
+            before_char_re, "|".join(values), after_char_re
+        ), re.IGNORECASE)
+
+    def spans(self, text):
+        """
+        Returns:
+            List of (start, end) of matched values in text
+        """
+        return [m.span(1) for m in self.match_re.finditer(text)]
+
+    def findall(self, text):
+        return self.match_re.findall(text)
+
+
+class TrieMatcher(object):
+    """
+    Matches values using a character trie, returns the same matches
+    as RegexMatcher(first value in values order wins on a position)
+    with out backtracking through all the values.
+
+    Values having regex syntax(ie: '.*') are matched using a small
+    regex built only from those values
+    """
+    END = None
+
+    def __init__(self, values, before_char_re, after_char_re):
+        self.values = values
+        self.before_chars = CharClass(before_char_re)
+        self.after_chars = CharClass(after_char_re)
+        self.root = {}
+        self.regex_ranks = {}
+
+        regex_values = []
+        group_index = 1
+        for rank, value in enumerate(values):
+            text = unescape_value(value)
+            if text is None:
+                regex_values.append(value)
+                self.regex_ranks[group_index] = rank
+                group_index += re.compile(value).groups + 1
+                continue
+
+            if not text:
+                continue
+
+            node = self.root
+            for char in text.lower():
+                node = node.setdefault(char, {})
+            # Keeping the first rank for duplicate values
+            node.setdefault(self.END, rank)
+
+        self.regex_re = None
+        if regex_values:
+            self.regex_re = re.compile(r'(?<={})(?:{})(?={})'.format(
+                before_char_re,
+                "|".join('(%s)' % v for v in regex_values),
+                after_char_re
+            ), re.IGNORECASE)
+
+    def match_at(self, text, lowered, pos):
+        """
+        Finds the value matched at pos
+
+        Returns:
+            (rank, end) of the matched value or None
+        """
+        length = len(text)
+        after_chars = self.after_chars
+        matched = None
+        node = self.root
+        index = pos
+        while index < length:
+            node = node.get(lowered[index])
+            if node is None:
+                break
+            index += 1
+            rank = node.get(self.END)
+            if rank is not None and index < length and text[index] in after_chars:
+                if matched is None or rank < matched[0]:
+                    matched = (rank, index)
+
+        if self.regex_re is not None:
+            regex_match = self.regex_re.match(text, pos)
+            if regex_match:
+                rank = self.regex_ranks[regex_match.lastindex]
+                if matched is None or rank < matched[0]:
+                    matched = (rank, regex_match.end(regex_match.lastindex))
+        return matched
+
+    def spans(self, text):
+        """
+        Returns:
+            List of (start, end) of matched values in text
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            lowered = text
+
+        spans = []
+        before_chars = self.before_chars
+        pos = 1
+        length = len(text)
+        while pos < length:
+            if text[pos - 1] not in before_chars:
+                pos += 1
+                continue
+
+            matched = self.match_at(text, lowered, pos)
+            if not matched or matched[1] == pos:
+                pos += 1
+                continue
+
+            spans.append((pos, matched[1]))
+            pos = matched[1]
+        return spans
+
+    def findall(self, text):
+        return [text[start:end] for start, end in self.spans(text)]
+
+
+class WildcardMatcher(object):
+    """
+    Matches a text against all the ingredientMaster values containing '.*'
+    using one combined regex, compiled once when master data is loaded.
+
+    The last matching value in values order wins, same as
+    checking every value with re.search one by one
+    """
+
+    def __init__(self, values):
+        self.value_types = {}
+        patterns = []
+        wildcard_values = [(k, v) for k, v in values.items() if '.*' in k]
+        for index, (value, value_type) in enumerate(reversed(wildcard_values)):
+            group_name = 'w%s' % index
+            self.value_types[group_name] = value_type
+            patterns.append(r'[\s\S]*?(?P<{}>{})'.format(group_name, value))
+
+        self.match_re = None
+        if patterns:
+            self.match_re = re.compile('^(?:{})'.format("|".join(patterns)))
+
+    def match_type(self, text):
+        """
+        Returns:
+            Type of the matched value or None
+        """
+        if self.match_re is None:
+            return None
+
+        matched = self.match_re.match(text)
+        if not matched:
+            return None
+        return self.value_types[matched.lastgroup]
+
+
+class PhraseIndex(object):
+    """
+    Index of ingredientMaster phrases used while converting plurals.
+    Phrases are also kept in a trie of their words in reverse order,
+    so phrases ending at a token are found by walking back from it
+    """
+    END = None
+
+    def __init__(self, *vocabularies):
+        self.phrases = set()
+        self.root = {}
+        for vocabulary in vocabularies:
+            for phrase in vocabulary:
+                self.phrases.add(phrase)
+                node = self.root
+                for word in reversed(phrase.split(" ")):
+                    node = node.setdefault(word, {})
+                node[self.END] = True
+
+    def __contains__(self, phrase):
+        return phrase in self.phrases
+
+    def has_phrase_ending_at(self, tokens, index, min_words=2):
+        """
+        Checks if any phrase of min_words or more words
+        ends at tokens[index]
+
+        Returns:
+            Boolean
+        """
+        node = self.root
+        words_count = 0
+        while index >= 0:
+            node = node.get(tokens[index])
+            if node is None:
+                return False
+            words_count += 1
+            if words_count >= min_words and self.END in node:
+                return True
+            index -= 1
+        return False
+
+
+def build_matcher(values, before_char_re, after_char_re, use_trie=True):
+    """
+    Builds the matcher used for finding values in ingredient text
+
+    Returns:
+        TrieMatcher or RegexMatcher object
+    """
+    if use_trie:
+        return TrieMatcher(values, before_char_re, after_char_re)
+    return RegexMatcher(values, before_char_re, after_char_re)
+
+
+class TokenIndex(object):
+    """
+    Index of ingredient tokens for finding the tokens of a matched value
+    with out running a regex per token.
+
+    A token matches a word when it is the word itself, optionally with
+    one before_char_re character before and one after_char_re
+    character after it(ie: '(salt' or 'salt,' matches 'salt')
+    """
+
+    def __init__(self, before_char_re, after_char_re):
+        self.before_chars = CharClass(before_char_re)
+        self.after_chars = CharClass(after_char_re)
+
+    def token_keys(self, token):
+        """
+        Returns:
+            Words(set) the token matches
+        """
+        if not token or \
+                (len(token) == 1 and not token.isdigit() and not token.isalpha()):
+            # Skipping characters like ( . etc
+            return set()
+
+        token = token.lower()
+        keys = set([token])
+        has_before = token[0] in self.before_chars
+        has_after = token[-1] in self.after_chars
+        if has_before:
+            keys.add(token[1:])
+        if has_after:
+            keys.add(token[:-1])
+        if has_before and has_after and len(token) > 2:
+            keys.add(token[1:-1])
+        keys.discard('')
+        return keys
+
+    def build(self, tokens):
+        """
+        Indexes the positions of tokens
+
+        Returns:
+            Positions(dict) of words
+        """
+        positions = {}
+        for i, token in enumerate(tokens):
+            for key in self.token_keys(token):
+                positions.setdefault(key, []).append(i)
+        return positions
+
+    def find(self, positions, word):
+        """
+        Looks up word in positions built by build
+
+        Returns:
+            Positions(list) of tokens matching word
+            or None if word has regex syntax and can't be looked up
+        """
+        word = unescape_value(word)
+        if word is None:
+            return None
+        return positions.get(word.lower(), [])
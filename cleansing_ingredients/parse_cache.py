@@ -0,0 +1,101 @@
+"""
+Cache of parsed ingredient texts, so repeated ingredient texts
+(ie: '1 tsp salt') are extracted only once
+"""
+
+import hashlib
+import shelve
+from collections import OrderedDict
+from copy import deepcopy
+
+
+class ParseCache(object):
+    """
+    LRU cache of cleansed ingredient dicts keyed by the normalized
+    ingredient text and the master data fingerprint.
+
+    When cache_file is given, parsed values are also kept in a shelve
+    file which is reused by the next runs till the master data changes
+    """
+
+    def __init__(self, fingerprint, maxsize=100000, cache_file=None):
+        self.fingerprint = fingerprint
+        self.maxsize = maxsize
+        self.values = OrderedDict()
+        self.shelf = None
+        if cache_file:
+            self.shelf = shelve.open(cache_file)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_key(self, ingredient):
+        key = '%s\x00%s' % (self.fingerprint, ingredient)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _add(self, key, cleansed_dict):
+        self.values[key] = cleansed_dict
+        if len(self.values) > self.maxsize:
+            self.values.popitem(last=False)
+
+    def get(self, ingredient, actual_ingredient):
+        """
+        Gets the cleansed dict of ingredient text
+
+        Returns:
+            Copy of cached cleansed dict with actual_ingredient
+            or None if ingredient is not parsed yet
+        """
+        key = self.get_key(ingredient)
+        try:
+            cleansed_dict = self.values[key]
+            self.values.move_to_end(key)
+            self.hits += 1
+        except KeyError:
+            if self.shelf is None or key not in self.shelf:
+                self.misses += 1
+                return None
+            cleansed_dict = self.shelf[key]
+            self._add(key, cleansed_dict)
+            self.disk_hits += 1
+
+        cleansed_dict = deepcopy(cleansed_dict)
+        cleansed_dict['actual_ingredient'] = actual_ingredient
+        return cleansed_dict
+
+    def set(self, ingredient, cleansed_dict):
+        """Caches copy of cleansed dict of ingredient text"""
+        key = self.get_key(ingredient)
+        cleansed_dict = deepcopy(cleansed_dict)
+        self._add(key, cleansed_dict)
+        if self.shelf is not None:
+            self.shelf[key] = cleansed_dict
+
+    def reset(self, fingerprint):
+        """
+        Switches to fingerprint of reloaded master data, values cached
+        in memory are dropped and values in cache file are not
+        found anymore as the keys include the fingerprint
+        """
+        self.fingerprint = fingerprint
+        self.values = OrderedDict()
+
+    def close(self):
+        if self.shelf is not None:
+            self.shelf.close()
+            self.shelf = None
+
+    def stats(self):
+        """
+        Returns:
+            Cache counters(dict) for logging
+        """
+        hits = self.hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'size': len(self.values),
+            'hit_rate': round(hits * 100.0 / lookups, 2) if lookups else 0.0
+        }
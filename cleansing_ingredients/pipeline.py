@@ -0,0 +1,163 @@
+"""
+Bounded producer/consumer pipeline used for overlapping reading recipes,
+parsing them and writing the parsed recipes
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+# Marks the end of the items put in a StageQueue
+END = object()
+
+
+class StageQueue(object):
+    """
+    Bounded queue between two pipeline stages.
+    Keeps the max depth and the time stages were blocked on it,
+    put_stall is the time producer waited for the consumer
+    and get_stall is the time consumer waited for the producer
+    """
+
+    def __init__(self, name, maxsize, stop_event):
+        self.name = name
+        self.queue = queue.Queue(maxsize)
+        self.stop_event = stop_event
+        self.max_depth = 0
+        self.put_stall = 0.0
+        self.get_stall = 0.0
+
+    def put(self, item):
+        start_time = time.time()
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=1)
+                break
+            except queue.Full:
+                continue
+        self.put_stall += time.time() - start_time
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def get(self):
+        start_time = time.time()
+        item = END
+        while not self.stop_event.is_set():
+            try:
+                item = self.queue.get(timeout=1)
+                break
+            except queue.Empty:
+                continue
+        self.get_stall += time.time() - start_time
+        return item
+
+    def stats(self):
+        """
+        Returns:
+            Queue counters(dict) for logging
+        """
+        return {
+            'name': self.name,
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'put_stall': round(self.put_stall, 3),
+            'get_stall': round(self.get_stall, 3)
+        }
+
+
+class Pipeline(object):
+    """
+    Runs reader -> parser -> writer stages connected with bounded queues.
+
+    reader is a generator function of batches run in a thread,
+    parser is called for every batch in the calling thread or
+    in pool(multiprocessing Pool) with at most in_flight batches
+    being parsed, writer is called with parsed batches in a thread
+    in the order batches are read
+    """
+
+    def __init__(self, reader, parser, writer, queue_size=4,
+                 pool=None, in_flight=1):
+        self.reader = reader
+        self.parser = parser
+        self.writer = writer
+        self.pool = pool
+        self.in_flight = max(in_flight, 1)
+        self.stop_event = threading.Event()
+        self.read_queue = StageQueue('read', queue_size, self.stop_event)
+        self.write_queue = StageQueue('write', queue_size, self.stop_event)
+        self.errors = []
+
+    def _read(self):
+        try:
+            for batch in self.reader():
+                if self.stop_event.is_set():
+                    break
+                self.read_queue.put(batch)
+        except Exception as e:
+            self.errors.append(e)
+            self.stop_event.set()
+        finally:
+            self.read_queue.put(END)
+
+    def _write(self):
+        try:
+            while True:
+                parsed_batch = self.write_queue.get()
+                if parsed_batch is END:
+                    break
+                self.writer(parsed_batch)
+        except Exception as e:
+            self.errors.append(e)
+            self.stop_event.set()
+
+    def _parse(self):
+        pending = deque()
+        while not self.stop_event.is_set():
+            batch = self.read_queue.get()
+            if batch is END:
+                break
+
+            if self.pool is None:
+                self.write_queue.put(self.parser(batch))
+                continue
+
+            pending.append(self.pool.apply_async(self.parser, (batch,)))
+            if len(pending) >= self.in_flight:
+                self.write_queue.put(pending.popleft().get())
+
+        while pending and not self.stop_event.is_set():
+            self.write_queue.put(pending.popleft().get())
+        self.write_queue.put(END)
+
+    def run(self):
+        """
+        Runs all the stages till reader is exhausted,
+        errors raised in any stage are raised again here
+        """
+        threads = [
+            threading.Thread(target=self._read, name='pipeline-reader'),
+            threading.Thread(target=self._write, name='pipeline-writer')
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            self._parse()
+        except Exception:
+            self.stop_event.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+    def stats(self):
+        """
+        Returns:
+            Counters(list of dict) of the queues for logging
+        """
+        return [self.read_queue.stats(), self.write_queue.stats()]
@@ -0,0 +1,32 @@
+"""
+Seeded random ingredient texts used by the parity tests, comparing
+new implementations with the old ones they replaced
+"""
+
+import random
+
+# Same as TokenizeIngredients
+BEFORE_CHAR_RE = r'[\s,:\(\d\*\/x\.\;\)]'
+AFTER_CHAR_RE = r'[\s,:\)\*\/\.\;\(]'
+
+# Separators between words, spaces are the most common
+SEPARATORS = [' ', ' ', ' ', ', ', ' (', ') ', ' * ', '/', ';', '.']
+
+
+def get_random_texts(words, count, seed=0, separators=SEPARATORS,
+                     max_words=8):
+    """
+    Builds texts of 1 to max_words random words joined by random separators,
+    same texts are returned for the same seed
+
+    Returns:
+        List of texts
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        text = rng.choice(words)
+        for _ in range(rng.randint(1, max_words) - 1):
+            text += rng.choice(separators) + rng.choice(words)
+        texts.append(text)
+    return texts
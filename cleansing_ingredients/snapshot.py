@@ -0,0 +1,73 @@
+"""
+On disk snapshot of master data read from db and the matchers built from
+it, so the next runs load them with out reading all the records again
+"""
+
+import gc
+import os
+import pickle
+
+# Snapshots of older versions are rebuilt, should be changed whenever
+# the snapshot data or the pickled matcher classes are changed
+SNAPSHOT_VERSION = 2
+
+
+class MasterdataSnapshot(object):
+    """
+    Pickle file of master data(dict) which is valid only for the master
+    data fingerprint and the options(dict, ie: matcher type) it is built with.
+
+    Header is pickled before the data, so a stale snapshot is found
+    with out unpickling the data.
+
+    Compiled regexes are pickled as their pattern and recompiled on load,
+    they are used for every ingredient so they are not compiled lazily.
+    With 25000 ingredients this is about 0.14s of the 0.25s load, building
+    the matchers again takes 0.7s after reading all the records from db
+    """
+
+    def __init__(self, snapshot_file, fingerprint, options=None):
+        self.snapshot_file = snapshot_file
+        self.fingerprint = fingerprint
+        self.options = options or {}
+
+    def get_header(self):
+        return {
+            'version': SNAPSHOT_VERSION,
+            'fingerprint': self.fingerprint,
+            'options': self.options
+        }
+
+    def load(self):
+        """
+        Returns:
+            Master data(dict) or None if there is no snapshot
+            or it is built from different master data or options
+        """
+        if not os.path.isfile(self.snapshot_file):
+            return None
+
+        # Unpickling trie matchers creates lots of dicts, which triggers
+        # many gc collections making the load several times slower
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(self.snapshot_file, 'rb') as f:
+                if pickle.load(f) != self.get_header():
+                    return None
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Partially written or built by older code
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def save(self, data):
+        """Writes master data, replacing the old snapshot atomically"""
+        # Per process tmp file, workers reloading at once save concurrently
+        tmp_file = '%s.%s.tmp' % (self.snapshot_file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(self.get_header(), f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.snapshot_file)
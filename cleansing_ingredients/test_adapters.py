@@ -0,0 +1,47 @@
+"""
+Tests of writing documents with JsonlSink and JsonArraySink
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from adapters import JsonlSink, JsonArraySink
+
+
+class SinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'out.json')
+
+    def write(self, sink_class, documents):
+        sink = sink_class(self.path, batch_size=2)
+        for document in documents:
+            sink.add(document)
+            if sink.is_full():
+                sink.flush()
+        sink.close()
+        with open(self.path) as f:
+            return f.read()
+
+    def test_jsonl_sink_writes_lines(self):
+        documents = [{'_id': i, 'ingredient': 'salt'} for i in range(3)]
+        text = self.write(JsonlSink, documents)
+        self.assertEqual(
+            [json.loads(line) for line in text.splitlines()], documents)
+
+    def test_json_array_sink_writes_array(self):
+        for count in range(4):
+            documents = [{'_id': i, 'ingredient': 'salt'} for i in range(count)]
+            with self.subTest(count=count):
+                text = self.write(JsonArraySink, documents)
+                # Same as json.dumps of the documents list
+                self.assertEqual(text, json.dumps(documents))
+
+
+if __name__ == '__main__':
+    unittest.main()
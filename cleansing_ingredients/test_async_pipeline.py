@@ -0,0 +1,145 @@
+"""
+Tests of the asyncio reader -> parser -> writer pipeline
+"""
+
+import asyncio
+import itertools
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.pool import ThreadPool
+from unittest.mock import Mock
+
+from async_pipeline import AsyncPipeline, AsyncBulkWriter, pool_future
+from test_pipeline import read_batches, read_endless_batches, parse_batch, \
+    fail_batch
+
+
+class ListWriter(object):
+    """Writer collecting flushed documents, flush fails if fail is True"""
+
+    def __init__(self, flushed=None, fail=False):
+        self.documents = []
+        self.flushed = [] if flushed is None else flushed
+        self.fail = fail
+
+    def add(self, document):
+        self.documents.append(document)
+
+    def detach(self):
+        writer = ListWriter(self.flushed, self.fail)
+        writer.documents, self.documents = self.documents, []
+        return writer
+
+    def flush(self):
+        if self.fail:
+            raise IOError('flush failed')
+        self.flushed.append(self.documents)
+        return {'documents': len(self.documents)}
+
+
+class AsyncPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.io_executor = ThreadPoolExecutor(2)
+        self.parse_executor = ThreadPoolExecutor(1)
+        self.addCleanup(self.io_executor.shutdown)
+        self.addCleanup(self.parse_executor.shutdown)
+
+    def run_pipeline(self, reader=read_batches, parser=parse_batch,
+                     writer=None, pool=None, sink=None):
+        written = []
+
+        async def write(parsed_batch):
+            written.append(parsed_batch)
+
+        pipeline = AsyncPipeline(
+            reader, parser, writer or write, self.io_executor,
+            parse_executor=self.parse_executor, pool=pool, sink=sink,
+            prefetch=2, in_flight=3
+        )
+        pipeline.run()
+        return written
+
+    def test_batches_are_written_in_order(self):
+        written = self.run_pipeline()
+        self.assertEqual(written, [parse_batch(i) for i in read_batches()])
+
+    def test_batches_parsed_in_pool_are_written_in_order(self):
+        with ThreadPool(3) as pool:
+            written = self.run_pipeline(pool=pool)
+        self.assertEqual(written, [parse_batch(i) for i in read_batches()])
+
+    def test_reader_error_is_raised(self):
+        def reader():
+            yield [1]
+            raise IOError('read failed')
+
+        with self.assertRaisesRegex(IOError, 'read failed'):
+            self.run_pipeline(reader=reader)
+
+    def test_parser_error_is_raised(self):
+        with self.assertRaisesRegex(ValueError, 'parse failed'):
+            self.run_pipeline(parser=fail_batch)
+
+    def test_parser_error_in_pool_is_raised(self):
+        with ThreadPool(3) as pool:
+            with self.assertRaisesRegex(ValueError, 'parse failed'):
+                self.run_pipeline(parser=fail_batch, pool=pool)
+
+    def test_results_after_loop_is_closed_are_dropped(self):
+        pool = Mock()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            pool_future(pool, parse_batch, [1])
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+        # Callbacks are called in the result handler thread of the pool
+        _, kwargs = pool.apply_async.call_args
+        kwargs['callback']([1])
+        kwargs['error_callback'](ValueError('parse failed'))
+
+    def test_writer_error_stops_reader(self):
+        async def write(parsed_batch):
+            raise IOError('write failed')
+
+        with self.assertRaisesRegex(IOError, 'write failed'):
+            self.run_pipeline(reader=read_endless_batches, writer=write)
+
+    def test_flushes_are_reported_in_order(self):
+        reported = []
+        list_writer = ListWriter()
+        sink = AsyncBulkWriter(
+            list_writer, self.io_executor, in_flight=2,
+            on_flushed=lambda stats, context: reported.append(context)
+        )
+
+        async def write(parsed_batch):
+            for document in parsed_batch:
+                list_writer.add(document)
+            await sink.flush(parsed_batch[0])
+
+        self.run_pipeline(writer=write, sink=sink)
+        self.assertEqual(
+            list_writer.flushed, [parse_batch(i) for i in read_batches()])
+        self.assertEqual(reported, [0, 40, 80, 120, 160])
+
+    def test_flush_error_is_raised(self):
+        list_writer = ListWriter(fail=True)
+        sink = AsyncBulkWriter(list_writer, self.io_executor, in_flight=2)
+
+        async def write(parsed_batch):
+            for document in parsed_batch:
+                list_writer.add(document)
+            await sink.flush()
+
+        with self.assertRaisesRegex(IOError, 'flush failed'):
+            self.run_pipeline(
+                reader=lambda: itertools.islice(read_endless_batches(), 100),
+                writer=write, sink=sink
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
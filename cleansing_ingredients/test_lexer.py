@@ -0,0 +1,78 @@
+"""
+Tests of splitting ingredient text into tokens
+"""
+
+import unittest
+
+from lexer import lex_ingredient
+from matchers import TokenIndex
+
+BEFORE_CHAR_RE = r'[\s,:\(\d\*\/x\.\;\)]'
+AFTER_CHAR_RE = r'[\s,:\)\*\/\.\;\(]'
+
+
+class LexIngredientTest(unittest.TestCase):
+
+    def lex(self, ingredient, tokens_replaced=None):
+        if tokens_replaced is None:
+            tokens_replaced = {}
+        tokens = lex_ingredient(
+            ' %s ' % ingredient,
+            TokenIndex(BEFORE_CHAR_RE, AFTER_CHAR_RE),
+            tokens_replaced
+        )
+        return [(token.text, token.kind) for token in tokens]
+
+    def test_numbers(self):
+        self.assertEqual(self.lex('2 1/2 cups'), [
+            ('2 1/2', 'mixed'), ('cups', None)])
+        self.assertEqual(self.lex('1/2 cup'), [
+            ('1/2', 'fraction'), ('cup', None)])
+        self.assertEqual(self.lex('2.4 oz.'), [
+            ('2.4', 'decimal'), ('oz.', None)])
+        self.assertEqual(self.lex('.5 cup'), [
+            ('.5', 'decimal'), ('cup', None)])
+        self.assertEqual(self.lex('12 oz.'), [
+            ('12', 'whole'), ('oz.', None)])
+
+    def test_range_is_not_one_value(self):
+        # Same as the old numbers_re, '-2' is left as a word
+        self.assertEqual(self.lex('1-2 cups apple'), [
+            ('1', 'whole'), ('-2', None), ('cups', None), ('apple', None)])
+        self.assertEqual(self.lex('1.5-2 cups'), [
+            ('1.5', 'decimal'), ('-2', None), ('cups', None)])
+
+    def test_percent(self):
+        self.assertEqual(self.lex('2% milk'), [
+            ('2%', 'percent'), ('milk', None)])
+        self.assertEqual(self.lex('25% milk'), [
+            ('25', 'whole'), ('%', None), ('milk', None)])
+        self.assertEqual(self.lex('0.5% milk'), [
+            ('0.5', 'decimal'), ('%', None), ('milk', None)])
+
+    def test_missing_space_fraction(self):
+        tokens_replaced = {}
+        self.assertEqual(self.lex('11/2 cups', tokens_replaced), [
+            ('1 1/2', 'mixed'), ('cups', None)])
+        self.assertEqual(tokens_replaced, {'1 1/2': '11/2'})
+
+    def test_ocr_values(self):
+        self.assertEqual(self.lex('l/2 teaspoon paprika'), [
+            ('1/2', 'fraction'), ('teaspoon', None), ('paprika', None)])
+        self.assertEqual(self.lex('l creaml'), [
+            ('1', 'whole'), ('creaml', None)])
+
+    def test_dimensions_and_slash(self):
+        self.assertEqual(self.lex('18x13 pan'), [
+            ('18', 'whole'), ('x', 'dimension'), ('13', 'whole'), ('pan', None)])
+        self.assertEqual(self.lex('salt and/or pepper'), [
+            ('salt', None), ('and', None), ('/', None), ('or', None),
+            ('pepper', None)])
+
+    def test_words_with_digits(self):
+        self.assertEqual(self.lex('v8 juice'), [
+            ('v8', None), ('juice', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
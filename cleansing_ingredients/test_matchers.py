@@ -0,0 +1,203 @@
+"""
+Tests of matchers against the old regex based matching
+"""
+
+import random
+import re
+import unittest
+
+from matchers import RegexMatcher, TrieMatcher, TokenIndex, WildcardMatcher
+from random_corpus import BEFORE_CHAR_RE, AFTER_CHAR_RE, get_random_texts
+
+# Values in ingredientMaster order, plain texts, escaped texts and regexes
+VALUES = [
+    'sea salt', 'salt', 'salted butter', 'butter', 'bok choy \\(chinese\\)',
+    'bok choy', 'cup', 'cups', 'tbsp\\.?', 'cut into .* pieces', 'oz.',
+    'green onion', 'onion', 'salt', 'Garlic', 'to taste', '1/2'
+]
+
+TEXTS = [
+    ' 1 cup sea salt ',
+    ' 2 cups salted butter, softened ',
+    ' 1 bok choy (chinese) , cut into 1 inch pieces ',
+    ' 1 tbsp. butter ',
+    ' 1 Tbsp garlic ',
+    ' 8 oz. Green Onions ',
+    ' salt and pepper to taste ',
+    ' (salt) ',
+    ' 2x12 oz. cups ',
+    ' 1/2 cup butter ',
+    ' unsalted butter ',
+]
+
+WORDS = [
+    'sea', 'salt', 'salted', 'butter', 'bok', 'choy', '(chinese)', 'cup',
+    'cups', 'tbsp', 'tbsp.', 'cut', 'into', '1', '2x', 'pieces', 'oz.', 'oz',
+    'green', 'onion', 'GARLIC', 'to', 'taste', '1/2', 'Sea', 'x'
+]
+
+
+def get_padded_texts(count, seed=0):
+    """
+    Returns:
+        Random texts padded by spaces like the standardized ingredient texts
+    """
+    return [' %s ' % text for text in get_random_texts(WORDS, count, seed)]
+
+
+def check_token_matches(token, match):
+    """
+    TokenizeIngredients.check_token_matches used before TokenIndex
+
+    Returns:
+        True if token matches the word match
+    """
+    if len(token) == 1 and (not token.isdigit() and not token.isalpha()):
+        return False
+
+    match_re = re.compile(
+        r'^\s?{}({}){}\s?$'.format(BEFORE_CHAR_RE, match, AFTER_CHAR_RE),
+        re.IGNORECASE
+    )
+    return bool(match_re.search(' ' + token + ' '))
+
+
+def match_wildcard_type(values, text):
+    """
+    Wildcard value matching used before WildcardMatcher
+
+    Returns:
+        Type of the last matched value or None
+    """
+    value_type = None
+    for value in [k for k in values if '.*' in k]:
+        if re.search(value, text):
+            value_type = values[value]
+    return value_type
+
+
+class TrieMatcherTest(unittest.TestCase):
+
+    def assertSameMatches(self, values, texts):
+        regex_matcher = RegexMatcher(values, BEFORE_CHAR_RE, AFTER_CHAR_RE)
+        trie_matcher = TrieMatcher(values, BEFORE_CHAR_RE, AFTER_CHAR_RE)
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(
+                    trie_matcher.spans(text), regex_matcher.spans(text))
+                self.assertEqual(
+                    trie_matcher.findall(text), regex_matcher.findall(text))
+
+    def test_same_matches_as_regex(self):
+        self.assertSameMatches(VALUES, TEXTS)
+
+    def test_same_matches_as_regex_on_random_texts(self):
+        self.assertSameMatches(VALUES, get_padded_texts(500))
+
+    def test_same_matches_as_regex_in_longest_first_order(self):
+        values = sorted(VALUES, key=lambda x: len(x), reverse=True)
+        self.assertSameMatches(values, TEXTS + get_padded_texts(500, seed=1))
+
+    def test_first_value_wins(self):
+        # Like a regex alternation, not the longest value
+        trie_matcher = TrieMatcher(
+            ['sea', 'sea salt', 'salt'], BEFORE_CHAR_RE, AFTER_CHAR_RE)
+        self.assertEqual(trie_matcher.findall(' sea salt '), ['sea', 'salt'])
+        trie_matcher = TrieMatcher(
+            ['sea salt', 'sea', 'salt'], BEFORE_CHAR_RE, AFTER_CHAR_RE)
+        self.assertEqual(trie_matcher.findall(' sea salt '), ['sea salt'])
+
+    def test_values_are_matched_ignoring_case(self):
+        trie_matcher = TrieMatcher(VALUES, BEFORE_CHAR_RE, AFTER_CHAR_RE)
+        self.assertEqual(
+            trie_matcher.findall(' Bok Choy (Chinese) '), ['Bok Choy (Chinese)'])
+
+    def test_no_values(self):
+        trie_matcher = TrieMatcher([], BEFORE_CHAR_RE, AFTER_CHAR_RE)
+        self.assertEqual(trie_matcher.spans(' salt '), [])
+
+
+class TokenIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.token_index = TokenIndex(BEFORE_CHAR_RE, AFTER_CHAR_RE)
+
+    def assertSamePositions(self, tokens, words):
+        positions = self.token_index.build(tokens)
+        for word in words:
+            with self.subTest(tokens=tokens, word=word):
+                self.assertEqual(
+                    self.token_index.find(positions, word),
+                    [i for i, token in enumerate(tokens)
+                     if check_token_matches(token, word)]
+                )
+
+    def test_same_positions_as_check_token_matches(self):
+        tokens = [
+            'salt', '(salt', 'salt,', '(salt)', 'Salt.', '1salt', 'xsalt',
+            'salts', 'sea', 'salt;', '*salt*', '/salt/', '(', ',', 'x', '2',
+            '(chinese)', 'oz.', '.oz', '1/2', '2x', ''
+        ]
+        words = [
+            'salt', 'Salt', 'sea', '\\(chinese\\)', 'chinese', 'oz\\.',
+            'oz', '1/2', 'x', '2', 'pepper'
+        ]
+        self.assertSamePositions(tokens, words)
+
+    def test_same_positions_on_random_tokens(self):
+        rng = random.Random(0)
+        chars = ['', '', '(', ')', ',', '.', '*', '/', ';', ':', 'x', '1']
+        words = ['salt', 'sea', 'cup', 'cups', 'garlic', 'oz', '1', 'x']
+        for _ in range(100):
+            tokens = [
+                rng.choice(chars) + rng.choice(words) + rng.choice(chars)
+                for _ in range(rng.randint(1, 6))
+            ]
+            self.assertSamePositions(tokens, words)
+
+    def test_regex_words_are_not_looked_up(self):
+        positions = self.token_index.build(['1', 'inch'])
+        self.assertIsNone(self.token_index.find(positions, '.*'))
+
+
+class WildcardMatcherTest(unittest.TestCase):
+
+    VALUES = {
+        'cut into .* pieces': 'preparation',
+        'cut into .* inch pieces': 'size',
+        'salt': 'ingredient',
+        '.* to taste': 'as_needed',
+        'about .* cups?': 'unit_of_measure',
+        'cut into': 'preparation',
+        '(?:thinly )?sliced .* thick': 'preparation'
+    }
+
+    WORDS = [
+        'cut', 'into', '1', 'inch', 'pieces', 'salt', 'to', 'taste', 'about',
+        'cups', 'cup', 'thinly', 'sliced', 'thick'
+    ]
+
+    def test_same_type_as_search_loop(self):
+        wildcard_matcher = WildcardMatcher(self.VALUES)
+        texts = [
+            'cut into 1 inch pieces', 'cut into pieces', 'cut into 2 pieces',
+            'salt to taste', 'salt', 'about 2 cups', 'about 1 cup to taste',
+            'thinly sliced 1/4 inch thick', 'sliced thick', 'Cut into 2 pieces',
+            ' cut into 1 inch pieces, salt to taste', ''
+        ]
+        texts += get_random_texts(self.WORDS, 300, separators=[' '])
+
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(
+                    wildcard_matcher.match_type(text),
+                    match_wildcard_type(self.VALUES, text)
+                )
+
+    def test_no_wildcard_values(self):
+        wildcard_matcher = WildcardMatcher({'salt': 'ingredient'})
+        self.assertIsNone(wildcard_matcher.match_type('salt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
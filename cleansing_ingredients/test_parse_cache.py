@@ -0,0 +1,107 @@
+"""
+Tests of the parsed ingredient text cache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from parse_cache import ParseCache
+
+
+def get_cleansed_dict(ingredient):
+    return {
+        'actual_ingredient': ingredient,
+        'ingredient': 'salt',
+        'quantity': 1.0,
+        'tokenized_ingredients': [{'ingredient': ['salt']}]
+    }
+
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.cache_file = os.path.join(self.tmp_dir, 'parse_cache')
+
+    def test_cached_dict_is_returned_with_actual_ingredient(self):
+        parse_cache = ParseCache('fp1')
+        self.assertIsNone(parse_cache.get('1 tsp salt', '1 tsp salt'))
+        parse_cache.set('1 tsp salt', get_cleansed_dict('1 tsp salt'))
+
+        cleansed_dict = parse_cache.get('1 tsp salt', '1  tsp salt ')
+        self.assertEqual(cleansed_dict['actual_ingredient'], '1  tsp salt ')
+        self.assertEqual(cleansed_dict['ingredient'], 'salt')
+        self.assertEqual(parse_cache.stats(), {
+            'hits': 1, 'disk_hits': 0, 'misses': 1, 'size': 1,
+            'hit_rate': 50.0
+        })
+
+    def test_cached_dict_is_copied(self):
+        parse_cache = ParseCache('fp1')
+        cleansed_dict = get_cleansed_dict('1 tsp salt')
+        parse_cache.set('1 tsp salt', cleansed_dict)
+        cleansed_dict['tokenized_ingredients'][0]['ingredient'].append('sea')
+
+        cached = parse_cache.get('1 tsp salt', '1 tsp salt')
+        self.assertEqual(
+            cached['tokenized_ingredients'], [{'ingredient': ['salt']}])
+        cached['tokenized_ingredients'][0]['ingredient'].append('pepper')
+        self.assertEqual(
+            parse_cache.get('1 tsp salt', '1 tsp salt')['tokenized_ingredients'],
+            [{'ingredient': ['salt']}]
+        )
+
+    def test_least_recently_used_is_dropped(self):
+        parse_cache = ParseCache('fp1', maxsize=2)
+        parse_cache.set('salt', get_cleansed_dict('salt'))
+        parse_cache.set('pepper', get_cleansed_dict('pepper'))
+        parse_cache.get('salt', 'salt')
+        parse_cache.set('sugar', get_cleansed_dict('sugar'))
+
+        self.assertIsNotNone(parse_cache.get('salt', 'salt'))
+        self.assertIsNotNone(parse_cache.get('sugar', 'sugar'))
+        self.assertIsNone(parse_cache.get('pepper', 'pepper'))
+        self.assertEqual(parse_cache.stats()['size'], 2)
+
+    def test_cache_file_is_reused_by_next_run(self):
+        parse_cache = ParseCache('fp1', cache_file=self.cache_file)
+        parse_cache.set('1 tsp salt', get_cleansed_dict('1 tsp salt'))
+        parse_cache.close()
+
+        parse_cache = ParseCache('fp1', cache_file=self.cache_file)
+        self.addCleanup(parse_cache.close)
+        self.assertEqual(
+            parse_cache.get('1 tsp salt', '1 tsp salt')['ingredient'], 'salt')
+        parse_cache.get('1 tsp salt', '1 tsp salt')
+        stats = parse_cache.stats()
+        self.assertEqual((stats['disk_hits'], stats['hits']), (1, 1))
+
+    def test_other_fingerprint_does_not_find_cache_file_values(self):
+        parse_cache = ParseCache('fp1', cache_file=self.cache_file)
+        parse_cache.set('1 tsp salt', get_cleansed_dict('1 tsp salt'))
+        parse_cache.close()
+
+        parse_cache = ParseCache('fp2', cache_file=self.cache_file)
+        self.addCleanup(parse_cache.close)
+        self.assertIsNone(parse_cache.get('1 tsp salt', '1 tsp salt'))
+
+    def test_reset_drops_values_of_old_fingerprint(self):
+        parse_cache = ParseCache('fp1', cache_file=self.cache_file)
+        self.addCleanup(parse_cache.close)
+        parse_cache.set('1 tsp salt', get_cleansed_dict('1 tsp salt'))
+        parse_cache.reset('fp2')
+
+        self.assertEqual(parse_cache.stats()['size'], 0)
+        self.assertIsNone(parse_cache.get('1 tsp salt', '1 tsp salt'))
+        parse_cache.set('1 tsp salt', get_cleansed_dict('1 tsp salt'))
+        parse_cache.reset('fp1')
+        self.assertEqual(
+            parse_cache.get('1 tsp salt', '1 tsp salt')['ingredient'], 'salt')
+        self.assertEqual(parse_cache.stats()['disk_hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
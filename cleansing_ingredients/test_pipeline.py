@@ -0,0 +1,79 @@
+"""
+Tests of the reader -> parser -> writer pipeline
+"""
+
+import itertools
+import unittest
+from multiprocessing.pool import ThreadPool
+
+from pipeline import Pipeline
+
+
+def read_batches():
+    for i in range(0, 20, 4):
+        yield list(range(i, i + 4))
+
+
+def read_endless_batches():
+    for i in itertools.count():
+        yield [i]
+
+
+def parse_batch(batch):
+    return [i * 10 for i in batch]
+
+
+def fail_batch(batch):
+    if 8 in batch:
+        raise ValueError('parse failed')
+    return batch
+
+
+class PipelineTest(unittest.TestCase):
+
+    def run_pipeline(self, reader=read_batches, parser=parse_batch,
+                     writer=None, pool=None):
+        written = []
+        pipeline = Pipeline(
+            reader, parser, writer or written.append, queue_size=2,
+            pool=pool, in_flight=3
+        )
+        pipeline.run()
+        return written
+
+    def test_batches_are_written_in_order(self):
+        written = self.run_pipeline()
+        self.assertEqual(written, [parse_batch(i) for i in read_batches()])
+
+    def test_batches_parsed_in_pool_are_written_in_order(self):
+        with ThreadPool(3) as pool:
+            written = self.run_pipeline(pool=pool)
+        self.assertEqual(written, [parse_batch(i) for i in read_batches()])
+
+    def test_reader_error_is_raised(self):
+        def reader():
+            yield [1]
+            raise IOError('read failed')
+
+        with self.assertRaisesRegex(IOError, 'read failed'):
+            self.run_pipeline(reader=reader)
+
+    def test_parser_error_is_raised(self):
+        with self.assertRaisesRegex(ValueError, 'parse failed'):
+            self.run_pipeline(parser=fail_batch)
+
+    def test_parser_error_in_pool_is_raised(self):
+        with ThreadPool(3) as pool:
+            with self.assertRaisesRegex(ValueError, 'parse failed'):
+                self.run_pipeline(parser=fail_batch, pool=pool)
+
+    def test_writer_error_stops_reader(self):
+        def writer(batch):
+            raise IOError('write failed')
+
+        with self.assertRaisesRegex(IOError, 'write failed'):
+            self.run_pipeline(reader=read_endless_batches, writer=writer)
+
+
+if __name__ == '__main__':
+    unittest.main()
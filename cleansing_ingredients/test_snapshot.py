@@ -0,0 +1,91 @@
+"""
+Tests of the on disk master data snapshot
+"""
+
+import gc
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import snapshot
+from snapshot import MasterdataSnapshot
+
+DATA = {
+    'replace_strings': {'cups': 'cup', 'tbsp': 'tablespoon'},
+    'ing_master_dict': {'cup': 'unit_of_measure'},
+    'nonfood_re': re.compile(r'(?<=\s)(foil)(?=\s)', re.IGNORECASE)
+}
+OPTIONS = {'use_trie_matcher': True}
+
+
+class MasterdataSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.snapshot_file = os.path.join(self.tmp_dir, 'masterdata.pickle')
+
+    def save(self, fingerprint='fp1', options=OPTIONS):
+        MasterdataSnapshot(self.snapshot_file, fingerprint, options).save(DATA)
+
+    def test_saved_data_is_loaded(self):
+        self.save()
+        self.assertEqual(os.listdir(self.tmp_dir), ['masterdata.pickle'])
+        data = MasterdataSnapshot(self.snapshot_file, 'fp1', OPTIONS).load()
+        self.assertEqual(data, DATA)
+        self.assertEqual(data['nonfood_re'].findall(' 1 Foil '), ['Foil'])
+
+    def test_no_snapshot(self):
+        self.assertIsNone(
+            MasterdataSnapshot(self.snapshot_file, 'fp1', OPTIONS).load())
+
+    def test_other_fingerprint_is_not_loaded(self):
+        self.save()
+        self.assertIsNone(
+            MasterdataSnapshot(self.snapshot_file, 'fp2', OPTIONS).load())
+
+    def test_other_options_are_not_loaded(self):
+        self.save()
+        self.assertIsNone(MasterdataSnapshot(
+            self.snapshot_file, 'fp1', {'use_trie_matcher': False}).load())
+
+    def test_other_version_is_not_loaded(self):
+        with patch('snapshot.SNAPSHOT_VERSION', snapshot.SNAPSHOT_VERSION - 1):
+            self.save()
+        self.assertIsNone(
+            MasterdataSnapshot(self.snapshot_file, 'fp1', OPTIONS).load())
+
+    def test_partially_written_snapshot_is_not_loaded(self):
+        self.save()
+        with open(self.snapshot_file, 'rb') as f:
+            content = f.read()
+        with open(self.snapshot_file, 'wb') as f:
+            f.write(content[:len(content) // 2])
+        self.assertIsNone(
+            MasterdataSnapshot(self.snapshot_file, 'fp1', OPTIONS).load())
+
+    def test_gc_is_disabled_while_loading(self):
+        self.save()
+        load = snapshot.pickle.load
+        for gc_enabled in [True, False]:
+            gc_states = []
+
+            def load_mock(f):
+                gc_states.append(gc.isenabled())
+                return load(f)
+
+            with self.subTest(gc_enabled=gc_enabled):
+                if not gc_enabled:
+                    gc.disable()
+                    self.addCleanup(gc.enable)
+                with patch('snapshot.pickle.load', side_effect=load_mock):
+                    self.assertEqual(MasterdataSnapshot(
+                        self.snapshot_file, 'fp1', OPTIONS).load(), DATA)
+                self.assertEqual(gc_states, [False, False])
+                self.assertEqual(gc.isenabled(), gc_enabled)
+
+if __name__ == '__main__':
+    unittest.main()
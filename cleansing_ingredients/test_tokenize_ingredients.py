@@ -0,0 +1,320 @@
+"""
+Tests of tokenizing ingredient texts with fixture master data
+"""
+
+import multiprocessing
+import unittest
+from unittest.mock import patch
+
+import tokenize_ingredients
+from parse_cache import ParseCache
+from tokenize_ingredients import TokenizeIngredients, MASTERDATA_ATTRS, \
+    get_arg_parser, sum_cache_stats
+from utils import ConversionIndex, pattern_cache
+
+INGREDIENT = {
+    'category': 'produce', 'state': 'ground', 'group': None,
+    'notes': None, 'shelflife': None, 'finalspec': None
+}
+LIQUID = dict(INGREDIENT, category='dairy', state='liquid')
+
+# Same order as get_ingredientmaster_values
+MASTERDATA = (
+    {'cups': 'cup', 'tbsp': 'tablespoon', 'lbs': 'pound', 'ounces': 'oz.'},
+    {
+        'cup': 'unit_of_measure', 'tablespoon': 'unit_of_measure',
+        'teaspoon': 'unit_of_measure', 'oz.': 'unit_of_measure',
+        'pound': 'unit_of_measure', 'inch': 'unit_of_measure',
+        'clove': 'unit_type', 'diced': 'preparation',
+        'minced': 'preparation', 'cut into .* pieces': 'preparation',
+        'small': 'size', 'to taste': 'as_needed', 'can': 'container'
+    },
+    {
+        'apple': INGREDIENT, 'garlic': INGREDIENT, 'salt': INGREDIENT,
+        'sea salt': INGREDIENT, 'butter': INGREDIENT, 'paprika': INGREDIENT,
+        'onion': INGREDIENT, 'milk': LIQUID, '2% milk': LIQUID,
+        'v8 juice': LIQUID
+    },
+    ['vodka'],
+    ['foil'],
+    ['ingredient', 'value-unit_of_measure-ingredient'],
+    {'liquid': ['cup', 'ounce']},
+    {'salt_teaspoon': {0.5: '1/2', 1.0: '1'}}
+)
+
+
+def get_conversions():
+    conversions = ConversionIndex()
+    conversions.add('apple', '', 'medium', '1.5')
+    conversions.add('milk', '', 'medium', '1')
+    return conversions
+
+
+def build_tokenizer():
+    """
+    Returns:
+        TokenizeIngredients with fixture master data
+        with out connecting to db
+    """
+    args = get_arg_parser().parse_args(['-t', '--no-snapshot'])
+    with patch('tokenize_ingredients.get_master_mongo_conn'), \
+            patch('tokenize_ingredients.get_ing_mongo_conn'), \
+            patch('tokenize_ingredients.get_ingredientmaster_values',
+                  return_value=MASTERDATA), \
+            patch('tokenize_ingredients.get_conversions_data',
+                  return_value=get_conversions()):
+        tokenizer = TokenizeIngredients.__new__(TokenizeIngredients)
+        tokenizer.get_defaults(args)
+        tokenizer.build_masterdata()
+    return tokenizer
+
+
+# Ingredient text, (token, type) of tokens, unit_of_measure,
+# unit_of_measure_value, items and ingredient of the cleansed dict.
+# Outputs are same as before the lexer except the commented ones
+CORPUS = [
+    ('1 cup milk',
+     [('1', 'value'), ('cup', 'unit_of_measure'), ('milk', 'ingredient')],
+     'cup', '1', '1', 'milk'),
+    ('2 1/2 cups apple',
+     [('2 1/2', 'value'), ('cups', 'unit_of_measure'),
+      ('apple', 'ingredient')],
+     'cup', '2 1/2', '1.5', 'apple'),
+    ('11/2 cups apple',
+     [('11/2', 'value'), ('cups', 'unit_of_measure'), ('apple', 'ingredient')],
+     'cup', '1 1/2', '1', 'apple'),
+    # Ranges are not values, '-2' is left as unknown like the old code
+    ('1-2 cups apple',
+     [('1', 'value'), ('-2', 'unknown'), ('cups', 'unit_of_measure'),
+      ('apple', 'ingredient')],
+     None, None, None, 'apple'),
+    ('1.5-2 cups milk',
+     [('1.5', 'value'), ('-2', 'unknown'), ('cups', 'unit_of_measure'),
+      ('milk', 'ingredient')],
+     None, None, None, 'milk'),
+    ('25% milk',
+     [('25', 'value'), ('%', 'unknown'), ('milk', 'ingredient')],
+     None, None, None, 'milk'),
+    ('0.5% milk',
+     [('0.5', 'value'), ('%', 'unknown'), ('milk', 'ingredient')],
+     None, None, None, 'milk'),
+    # Values like '2%' are not converted, the old code failed
+    ('2% milk',
+     [('2%', 'value'), ('milk', 'ingredient')],
+     'item', '2%', None, 'milk'),
+    ('1 cup 2% milk',
+     [('1', 'value'), ('cup', 'unit_of_measure'), ('2%', 'value'),
+      ('milk', 'ingredient')],
+     'cup', '1', '1', 'milk'),
+    ('1 cup v8 juice',
+     [('1', 'value'), ('cup', 'unit_of_measure'), ('v8 juice', 'ingredient')],
+     'cup', '1', None, 'v8 juice'),
+    ('.5 cup milk',
+     [('.5', 'value'), ('cup', 'unit_of_measure'), ('milk', 'ingredient')],
+     'cup', '.5', '0.5', 'milk'),
+    ('l/2 teaspoon paprika',
+     [('1/2', 'value'), ('teaspoon', 'unit_of_measure'),
+      ('paprika', 'ingredient')],
+     'teaspoon', '1/2', None, 'paprika'),
+    ('l clove garlic, minced',
+     [('1', 'value'), ('clove', 'unit_type'), ('garlic', 'ingredient'),
+      (',', 'comma'), ('minced', 'preparation')],
+     None, None, None, 'garlic'),
+    ('1 tbsp sea salt to taste',
+     [('1', 'value'), ('tbsp', 'unit_of_measure'), ('sea salt', 'ingredient'),
+      ('to taste', 'as_needed')],
+     'tablespoon', '1', None, 'sea salt'),
+    ('2 lbs butter, cut into 1-inch pieces',
+     [('2', 'value'), ('lbs', 'unit_of_measure'), ('butter', 'ingredient'),
+      (',', 'comma'), ('cut into', 'unknown'), ('1', 'value'),
+      ('- inch pieces', 'unknown')],
+     'pound', '2', None, 'butter'),
+    ('1 (12 oz.) can milk',
+     [('1', 'value'), ('(', 'start_parenthesis'), ('12', 'value'),
+      ('oz.', 'unit_of_measure'), (')', 'end_parenthesis'),
+      ('can', 'container'), ('milk', 'ingredient')],
+     'oz.', '12', None, 'milk'),
+    # Dimensions are split into numbers, the old code left 'x13"'
+    ('4 oz. (18x13") butter',
+     [('4', 'value'), ('oz.', 'unit_of_measure'), ('(', 'start_parenthesis'),
+      ('18', 'value'), ('x', 'unknown'), ('13', 'value'), ('"', 'unknown'),
+      (')', 'end_parenthesis'), ('butter', 'ingredient')],
+     'oz.', '4', None, 'butter'),
+    # Values are typed where they are in the text, the old code typed
+    # the first ' 2' in the text, so '2%' was split into '2' and '%'
+    ('1-2 cups 2% milk',
+     [('1', 'value'), ('-2', 'unknown'), ('cups', 'unit_of_measure'),
+      ('2%', 'value'), ('milk', 'ingredient')],
+     'item', '2%', None, 'milk'),
+    ('1 1/2 cups apple and 1/2 cup milk',
+     [('1 1/2', 'value'), ('cups', 'unit_of_measure'), ('apple', 'ingredient'),
+      ('and', 'unknown'), ('1/2', 'value'), ('cups', 'unit_of_measure'),
+      ('milk', 'ingredient')],
+     'cup', '1 1/2', '1', 'apple'),
+    ('salt and/or paprika',
+     [('salt', 'ingredient'), ('and /', 'unknown'), ('or', 'or'),
+      ('paprika', 'ingredient')],
+     None, None, None, 'paprika'),
+    # Special charcter split off a value or parsed token keeps its kind
+    # and parsed flag, the value '2' was retyped and lost before
+    ('1 teaspoon. 2 teaspoon salt',
+     [('1', 'value'), ('teaspoon', 'unit_of_measure'), ('.', 'unknown'),
+      ('2', 'value'), ('teaspoon', 'unit_of_measure'),
+      ('teaspoon', 'unit_of_measure'), ('salt', 'ingredient')],
+     'teaspoon', '1', None, 'salt'),
+    ('ounces oz. 1 ounces onion',
+     [('ounces', 'unit_of_measure'), ('ounces', 'unit_of_measure'),
+      ('1', 'value'), ('ounces', 'unit_of_measure'),
+      ('onion', 'ingredient')],
+     'oz.', '1', None, 'onion'),
+    ('cup. garlic 2 1/2 2 cup',
+     [('cup', 'unit_of_measure'), ('.', 'unknown'), ('garlic', 'ingredient'),
+      ('2 1/2', 'value'), ('2', 'value'), ('cup', 'unit_of_measure'),
+      ('cup', 'unit_of_measure')],
+     'cup', '2', None, 'garlic'),
+    ('small oz cup. small cups',
+     [('small', 'size'), ('oz', 'unknown'), ('cups', 'unit_of_measure'),
+      ('. small', 'unknown'), ('cups', 'unit_of_measure'),
+      ('cups', 'unit_of_measure')],
+     None, None, None, ''),
+]
+
+
+class TokenizeIngredientsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tokenizer = build_tokenizer()
+
+    def parse(self, ingredient):
+        cleansed_ingredients, _, _ = self.tokenizer.parse_ingredients(
+            ingredient)
+        return cleansed_ingredients[0]
+
+    def test_corpus(self):
+        for ingredient, tokens, uom, uom_value, items, name in CORPUS:
+            with self.subTest(ingredient=ingredient):
+                cleansed_dict = self.parse(ingredient)
+                self.assertEqual(
+                    [(token['token'], token['type'])
+                     for token in cleansed_dict['tokens']],
+                    tokens
+                )
+                self.assertEqual(cleansed_dict['unit_of_measure'], uom)
+                self.assertEqual(
+                    cleansed_dict['unit_of_measure_value'], uom_value)
+                self.assertEqual(cleansed_dict['items'], items)
+                self.assertEqual(cleansed_dict['ingredient'], name)
+
+
+class MasterdataReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tokenizer = build_tokenizer()
+        self.tokenizer.reload_interval = 60
+        self.tokenizer.masterdata_revision = 1
+        self.tokenizer.masterdata_fingerprint = 'fp1'
+        masterdata = dict(
+            (name, getattr(self.tokenizer, name)) for name in MASTERDATA_ATTRS)
+        patcher = patch.object(
+            self.tokenizer, 'get_masterdata', return_value=masterdata)
+        self.get_masterdata = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_are_tagged_with_reloaded_revision(self):
+        with patch('tokenize_ingredients.get_masterdata_revision',
+                   return_value=2), \
+                patch('tokenize_ingredients.get_masterdata_fingerprint',
+                      return_value='fp2'):
+            tagged_batches = list(self.tokenizer.tag_batches([['a'], ['b']]))
+        self.assertEqual(
+            tagged_batches, [(2, 'fp2', ['a']), (2, 'fp2', ['b'])])
+        self.assertEqual(self.get_masterdata.call_count, 1)
+
+    def test_workers_follow_tagged_revision(self):
+        # Workers don't read the revision from db
+        with patch('tokenize_ingredients.get_masterdata_revision') as revision, \
+                patch('tokenize_ingredients.get_masterdata_fingerprint'):
+            self.tokenizer.follow_masterdata(1, 'fp1')
+            self.assertEqual(self.get_masterdata.call_count, 0)
+            self.tokenizer.follow_masterdata(2, 'fp2')
+            self.tokenizer.follow_masterdata(2, 'fp2')
+        self.assertEqual(self.get_masterdata.call_count, 1)
+        self.assertEqual(self.tokenizer.masterdata_revision, 2)
+        self.assertEqual(self.tokenizer.masterdata_fingerprint, 'fp2')
+        revision.assert_not_called()
+
+
+class WorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tokenizer = build_tokenizer()
+        self.tokenizer.masterdata_revision = 1
+        self.tokenizer.masterdata_fingerprint = 'fp1'
+        self.tokenizer.parse_cache = ParseCache('fp1', maxsize=10)
+        patcher = patch.object(
+            tokenize_ingredients, '_worker_tokenizer', self.tokenizer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def init_workers(self, count):
+        worker_counter = multiprocessing.Value('i', 0)
+        with patch('tokenize_ingredients.get_master_mongo_conn'), \
+                patch('tokenize_ingredients.ParseCache') as cache_mock:
+            for _ in range(count):
+                tokenize_ingredients._init_worker(worker_counter)
+        return [kwargs['cache_file'] for _, kwargs in cache_mock.call_args_list]
+
+    def test_workers_have_own_cache_files(self):
+        self.tokenizer.cache_file = 'parsed.cache'
+        self.assertEqual(
+            self.init_workers(2), ['parsed.cache.1', 'parsed.cache.2'])
+
+    def test_no_cache_file(self):
+        self.tokenizer.cache_file = None
+        self.assertEqual(self.init_workers(1), [None])
+
+    def test_worker_result_has_worker_stats(self):
+        self.tokenizer.parse_cache.get('1 cup milk', '1 cup milk')
+        result, _, cache_stats = tokenize_ingredients._parse_ingredients_batch(
+            (1, 'fp1', ['1 cup milk']))
+        self.assertEqual(len(result[0]), 1)
+        self.assertEqual(cache_stats['parse_cache']['misses'], 2)
+        self.assertEqual(
+            cache_stats['pattern_cache'], pattern_cache.stats())
+
+    def test_last_stats_of_each_worker_are_kept(self):
+        stats = [{'pattern_cache': {'hits': hits}} for hits in range(3)]
+        self.tokenizer.worker_stats = {}
+        self.assertEqual(
+            self.tokenizer.add_worker_stats(('batch', 10, stats[0])), 'batch')
+        self.tokenizer.add_worker_stats(('batch', 11, stats[1]))
+        self.tokenizer.add_worker_stats(('batch', 10, stats[2]))
+        self.assertEqual(
+            self.tokenizer.worker_stats, {10: stats[2], 11: stats[1]})
+
+    def test_worker_stats_are_summed(self):
+        worker_stats = [
+            {
+                'pattern_cache': {'hits': 3, 'misses': 1, 'evictions': 0,
+                                  'size': 1, 'hit_rate': 75.0},
+                'parse_cache': {'hits': 1, 'disk_hits': 1, 'misses': 2,
+                                'size': 3, 'hit_rate': 50.0}
+            },
+            {
+                'pattern_cache': {'hits': 5, 'misses': 3, 'evictions': 1,
+                                  'size': 2, 'hit_rate': 62.5},
+                'parse_cache': {'hits': 0, 'disk_hits': 0, 'misses': 4,
+                                'size': 4, 'hit_rate': 0.0}
+            }
+        ]
+        self.assertEqual(sum_cache_stats(worker_stats), {
+            'pattern_cache': {'hits': 8, 'misses': 4, 'evictions': 1,
+                              'size': 3, 'hit_rate': 66.67},
+            'parse_cache': {'hits': 1, 'disk_hits': 1, 'misses': 6,
+                            'size': 7, 'hit_rate': 25.0}
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,477 @@
+"""
+Tests of incremental runs, staging collection swap, shard runs
+and resuming runs from checkpoints with mocked collections
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, Mock, patch
+
+from bson import ObjectId
+
+from tokenize_ingredients import TokenizeIngredients, RUNS_COLLECTION, \
+    CLEANSED_INDEXES, pack_values, unpack_values
+
+CLEANSED_COLLECTION = 'cleansed_recipes'
+STAGING_COLLECTION = 'cleansed_recipes_staging'
+LAST_RUN_AT = datetime(2018, 5, 1)
+
+
+def get_tokenizer(collections):
+    """
+    Returns:
+        TokenizeIngredients with master_db returning
+        mocked collections(dict) by name
+    """
+    tokenizer = TokenizeIngredients.__new__(TokenizeIngredients)
+    tokenizer.master_db = MagicMock()
+    tokenizer.master_db.__getitem__.side_effect = collections.__getitem__
+    tokenizer.cleansed_col_name = CLEANSED_COLLECTION
+    tokenizer.collection_name = 'recipes'
+    tokenizer.source = None
+    tokenizer.incremental = True
+    tokenizer.incremental_ids = None
+    tokenizer.masterdata_values = set()
+    return tokenizer
+
+
+class IncrementalRunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.runs = Mock()
+        self.runs.find_one.return_value = {
+            '_id': CLEANSED_COLLECTION, 'last_run_at': LAST_RUN_AT,
+            'masterdata_values': pack_values(['salt', 'cup'])
+        }
+        self.recipes = Mock()
+        self.recipes.find.return_value = [{'_id': 3}, {'_id': 1}]
+        self.cleansed = Mock()
+        self.cleansed.find.return_value = [{'_id': 1}, {'_id': 2}]
+        self.tokenizer = get_tokenizer({
+            RUNS_COLLECTION: self.runs, 'recipes': self.recipes,
+            CLEANSED_COLLECTION: self.cleansed
+        })
+        self.tokenizer.query_params = {'source': 'chefd'}
+        self.tokenizer.masterdata_values = {'salt', 'cup'}
+
+    def get_ids(self, changed_values):
+        with patch('tokenize_ingredients.get_masterdata_values',
+                   return_value=set(changed_values)) as values_mock:
+            ids = self.tokenizer.get_incremental_ids()
+        if values_mock.called:
+            values_mock.assert_called_once_with(LAST_RUN_AT)
+        return ids
+
+    def get_changed_values(self):
+        return [
+            condition['$or'][0]['tokenized_ingredients.tokens.standard_token']['$in']
+            for (condition, _), _ in self.cleansed.find.call_args_list
+        ]
+
+    def test_no_successful_run(self):
+        self.runs.find_one.return_value = None
+        self.assertIsNone(self.get_ids(['salt']))
+        self.runs.find_one.assert_called_once_with({'_id': CLEANSED_COLLECTION})
+
+    def test_run_without_masterdata_values(self):
+        del self.runs.find_one.return_value['masterdata_values']
+        self.assertIsNone(self.get_ids(['salt']))
+        self.recipes.find.assert_not_called()
+
+    def test_recipes_updated_after_last_run(self):
+        self.assertEqual(self.get_ids([]), [1, 3])
+        self.recipes.find.assert_called_once_with(
+            {'source': 'chefd', 'updated_at': {'$gt': LAST_RUN_AT}}, {'_id': 1})
+        self.cleansed.find.assert_not_called()
+
+    def test_recipes_with_changed_values(self):
+        self.assertEqual(self.get_ids(['salt', 'cup']), [1, 2, 3])
+        self.cleansed.find.assert_called_once()
+        (condition, projection), _ = self.cleansed.find.call_args
+        self.assertEqual(projection, {'_id': 1})
+        self.assertEqual(condition['$or'][:2], [
+            {'tokenized_ingredients.tokens.standard_token':
+                {'$in': ['cup', 'salt']}},
+            {'tokenized_ingredients.tokens.token': {'$in': ['cup', 'salt']}}
+        ])
+        words_re = condition['$or'][2]['tokenized_ingredients.actual_ingredient']
+        self.assertEqual(
+            words_re.findall('2 Cups coarse sea salt, cupcake'), ['Cups', 'salt'])
+
+    def test_changed_values_are_matched_in_chunks(self):
+        with patch('tokenize_ingredients.CHANGED_VALUES_CHUNK', 2):
+            self.get_ids(['salt', 'cup', 'oz', 'sea salt', 'tbsp'])
+        self.assertEqual(self.get_changed_values(), [
+            ['cup', 'oz'], ['salt', 'sea salt'], ['tbsp']])
+        words_res = [
+            condition['$or'][2]['tokenized_ingredients.actual_ingredient']
+            for (condition, _), _ in self.cleansed.find.call_args_list
+        ]
+        self.assertEqual(
+            [i.findall('salt cup oz sea salt tbsp') for i in words_res],
+            [['cup', 'oz'], ['salt', 'sea salt'], ['tbsp']]
+        )
+
+    def test_removed_values_are_matched(self):
+        # 'scallion' is renamed to 'scallions' after the last run
+        self.runs.find_one.return_value['masterdata_values'] = pack_values(
+            ['salt', 'cup', 'scallion'])
+        self.tokenizer.masterdata_values = {'salt', 'cup', 'scallions'}
+        self.get_ids(['scallions'])
+        self.assertEqual(self.get_changed_values(), [['scallion', 'scallions']])
+
+    def test_incremental_ids_are_read_in_batches(self):
+        self.tokenizer.shards = 1
+        self.tokenizer.batch_size = 2
+        self.tokenizer.incremental_ids = [1, 5, 9]
+        self.assertEqual(
+            list(self.tokenizer.read_id_batches()),
+            [{'$in': [1, 5]}, {'$in': [9]}]
+        )
+        self.recipes.find.assert_not_called()
+
+    def test_save_run(self):
+        self.tokenizer.run_started_at = datetime(2018, 5, 2)
+        self.tokenizer.save_run()
+        self.runs.replace_one.assert_called_once()
+        (query, run), kwargs = self.runs.replace_one.call_args
+        self.assertEqual(query, {'_id': CLEANSED_COLLECTION})
+        self.assertEqual(kwargs, {'upsert': True})
+        self.assertEqual(unpack_values(run.pop('masterdata_values')),
+                         {'salt', 'cup'})
+        self.assertEqual(run, {
+            '_id': CLEANSED_COLLECTION,
+            'last_run_at': datetime(2018, 5, 2),
+            'collection_name': 'recipes',
+            'source': None,
+            'incremental': True
+        })
+
+
+class StagingSwapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cleansed = Mock()
+        self.cleansed.count.return_value = 3
+        self.cleansed.index_information.return_value = {
+            '_id_': {'v': 2, 'key': [('_id', 1)]},
+            'recipe_id_1': {
+                'v': 2, 'key': [('recipe_id', 1)], 'unique': True,
+                'ns': 'master.cleansed_recipes'
+            },
+            'token_1': {'v': 2, 'key': CLEANSED_INDEXES[1]}
+        }
+        self.staging = Mock()
+        self.tokenizer = get_tokenizer({
+            CLEANSED_COLLECTION: self.cleansed,
+            STAGING_COLLECTION: self.staging
+        })
+        self.tokenizer.incremental = False
+        self.tokenizer.staging_col_name = STAGING_COLLECTION
+        self.tokenizer.deleted_count = 0
+
+    def test_staging_is_renamed_over_cleansed_collection(self):
+        self.tokenizer.inserted_count = 2
+        self.tokenizer.swap_staging()
+        self.staging.rename.assert_called_once_with(
+            CLEANSED_COLLECTION, dropTarget=True)
+        self.tokenizer.master_db.drop_collection.assert_not_called()
+        self.assertEqual(self.tokenizer.deleted_count, 3)
+
+    def test_indexes_are_built_before_rename(self):
+        self.tokenizer.inserted_count = 2
+        self.tokenizer.swap_staging()
+        self.assertEqual(
+            [call[0] for call in self.staging.method_calls],
+            ['create_indexes', 'rename']
+        )
+        indexes = [index.document
+                   for index in self.staging.create_indexes.call_args[0][0]]
+        self.assertEqual(
+            [(index['name'], list(index['key'].items())) for index in indexes],
+            [('recipe_id_1', [('recipe_id', 1)]),
+             ('token_1', CLEANSED_INDEXES[1]),
+             ('tokenized_ingredients.tokens.standard_token_1',
+              CLEANSED_INDEXES[0])]
+        )
+        self.assertTrue(indexes[0]['unique'])
+
+    def test_nothing_parsed_keeps_cleansed_collection(self):
+        self.tokenizer.inserted_count = 0
+        self.tokenizer.swap_staging()
+        self.tokenizer.master_db.drop_collection.assert_called_once_with(
+            STAGING_COLLECTION)
+        self.staging.rename.assert_not_called()
+        self.staging.create_indexes.assert_not_called()
+
+
+def write_requests(requests, ordered=True):
+    return Mock(inserted_count=len(requests), upserted_count=0,
+                matched_count=0)
+
+
+class ShardTest(unittest.TestCase):
+
+    def get_tokenizer(self, collections, shard=0, shards=3, shard_key='_id'):
+        tokenizer = get_tokenizer(collections)
+        tokenizer.incremental = False
+        tokenizer.shard = shard
+        tokenizer.shards = shards
+        tokenizer.shard_key = shard_key
+        tokenizer.query_params = {}
+        tokenizer.inserted_count = 0
+        tokenizer.write_batch_size = 2
+        tokenizer.write_batch_bytes = 16 * 1024 * 1024
+        tokenizer.write_concern = None
+        tokenizer.write_retries = 0
+        return tokenizer
+
+    def get_shard_runs(self, shards=3, fingerprints=None):
+        fingerprints = fingerprints or ['fp1'] * shards
+        return {
+            '%s_staging_%s_of_%s' % (CLEANSED_COLLECTION, shard, shards): {
+                '_id': '%s_staging_%s_of_%s' % (CLEANSED_COLLECTION, shard, shards),
+                'last_run_at': datetime(2018, 5, 3 - shard),
+                'fingerprint': fingerprints[shard],
+                'masterdata_values': pack_values(['salt', 'cup %s' % shard])
+            }
+            for shard in range(shards)
+        }
+
+    def test_recipe_is_in_one_shard(self):
+        recipes = [{'_id': i, 'source': 'source%s' % (i % 4)} for i in range(60)]
+        tokenizers = [self.get_tokenizer({}, shard=shard)
+                      for shard in range(3)]
+        shard_ids = [[i['_id'] for i in recipes if tokenizer.in_shard(i)]
+                     for tokenizer in tokenizers]
+        self.assertEqual(sorted(sum(shard_ids, [])), list(range(60)))
+        self.assertTrue(all(shard_ids))
+
+    def test_recipes_of_source_are_in_same_shard(self):
+        tokenizers = [self.get_tokenizer({}, shard=shard, shard_key='source')
+                      for shard in range(3)]
+        for source in ['allrecipes', 'chefd', 'food']:
+            recipes = [{'_id': i, 'source': source} for i in range(10)]
+            with self.subTest(source=source):
+                self.assertEqual(
+                    sorted(len([i for i in recipes if tokenizer.in_shard(i)])
+                           for tokenizer in tokenizers),
+                    [0, 0, 10]
+                )
+
+    def test_single_shard_has_all_recipes(self):
+        tokenizer = self.get_tokenizer({}, shards=1)
+        self.assertTrue(tokenizer.in_shard({'_id': 'abc'}))
+
+    def test_read_shard_ids(self):
+        recipes = Mock()
+        recipes.find.return_value.sort.return_value = [
+            {'_id': i} for i in range(30)]
+        tokenizer = self.get_tokenizer({'recipes': recipes}, shard=1)
+        tokenizer.query_params = {'source': 'chefd'}
+
+        self.assertEqual(
+            list(tokenizer.read_shard_ids()),
+            [i for i in range(30) if tokenizer.in_shard({'_id': i})]
+        )
+        recipes.find.assert_called_once_with(
+            {'source': 'chefd'}, {'_id': 1, 'source': 1})
+        recipes.find.return_value.sort.assert_called_once_with('_id', 1)
+
+    def finalize(self, shard_runs):
+        runs = Mock()
+        runs.find_one.side_effect = lambda query: shard_runs.get(query['_id'])
+        staging = Mock()
+        staging.bulk_write.side_effect = write_requests
+        collections = {
+            RUNS_COLLECTION: runs, STAGING_COLLECTION: staging,
+            CLEANSED_COLLECTION: Mock()
+        }
+        for i, shard_col_name in enumerate(shard_runs):
+            collections[shard_col_name] = Mock()
+            collections[shard_col_name].find.return_value = [
+                {'_id': '%s-%s' % (i, j)} for j in range(3)]
+
+        tokenizer = self.get_tokenizer(collections)
+        with patch.object(tokenizer, 'swap_staging') as swap_mock, \
+                patch.object(tokenizer, 'save_run') as save_run_mock:
+            tokenizer.finalize_shards()
+        return tokenizer, runs, staging, swap_mock, save_run_mock
+
+    def test_finalize_merges_shards(self):
+        shard_runs = self.get_shard_runs()
+        tokenizer, runs, staging, swap_mock, save_run_mock = \
+            self.finalize(shard_runs)
+
+        self.assertEqual(tokenizer.inserted_count, 9)
+        self.assertEqual(
+            sorted(request._doc['_id']
+                   for call in staging.bulk_write.call_args_list
+                   for request in call[0][0]),
+            ['%s-%s' % (i, j) for i in range(3) for j in range(3)]
+        )
+        swap_mock.assert_called_once_with()
+        save_run_mock.assert_called_once_with()
+        # Master data values of the first shard run are saved
+        self.assertEqual(tokenizer.run_started_at, datetime(2018, 5, 1))
+        self.assertEqual(tokenizer.masterdata_values, {'salt', 'cup 2'})
+        drop_collection = tokenizer.master_db.drop_collection
+        self.assertEqual(
+            [call[0][0] for call in drop_collection.call_args_list],
+            [STAGING_COLLECTION] + list(shard_runs)
+        )
+        self.assertEqual(
+            [call[0][0] for call in runs.delete_one.call_args_list],
+            [{'_id': i} for i in shard_runs]
+        )
+
+    def test_finalize_needs_all_shards(self):
+        shard_runs = self.get_shard_runs()
+        shard_runs.pop('%s_staging_1_of_3' % CLEANSED_COLLECTION)
+        tokenizer, runs, staging, swap_mock, save_run_mock = \
+            self.finalize(shard_runs)
+
+        staging.bulk_write.assert_not_called()
+        swap_mock.assert_not_called()
+        save_run_mock.assert_not_called()
+        tokenizer.master_db.drop_collection.assert_not_called()
+
+    def test_finalize_needs_same_master_data(self):
+        shard_runs = self.get_shard_runs(fingerprints=['fp1', 'fp2', 'fp1'])
+        tokenizer, runs, staging, swap_mock, save_run_mock = \
+            self.finalize(shard_runs)
+
+        staging.bulk_write.assert_not_called()
+        swap_mock.assert_not_called()
+        tokenizer.master_db.drop_collection.assert_not_called()
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        datadir_patch = patch('tokenize_ingredients.DATADIR', self.tmp_dir)
+        datadir_patch.start()
+        self.addCleanup(datadir_patch.stop)
+
+        self.recipes = Mock()
+        self.recipes.find.return_value.count.return_value = 5
+        self.staging = Mock()
+        self.tokenizer = self.get_tokenizer()
+
+    def get_tokenizer(self):
+        tokenizer = get_tokenizer({
+            'recipes': self.recipes, STAGING_COLLECTION: self.staging,
+            CLEANSED_COLLECTION: Mock()
+        })
+        tokenizer.incremental = False
+        tokenizer.shard = 0
+        tokenizer.shards = 1
+        tokenizer.shard_key = '_id'
+        tokenizer.staging_col_name = STAGING_COLLECTION
+        tokenizer.masterdata_fingerprint = 'fp1'
+        return tokenizer
+
+    def save_checkpoint(self, last_id):
+        self.tokenizer.last_flushed_id = last_id
+        self.tokenizer.flushed_fingerprint = 'fp1'
+        self.tokenizer.run_started_at = datetime(2018, 5, 1, 10, 30)
+        self.tokenizer.total_records_count = 10
+        self.tokenizer.records_to_parse = 6
+        self.tokenizer.inserted_count = 4
+        self.tokenizer.total_ingredients = 40
+        self.tokenizer.save_checkpoint()
+
+    def test_checkpoint_is_loaded(self):
+        last_id = ObjectId()
+        self.save_checkpoint(last_id)
+        self.assertFalse(os.path.isfile(
+            self.tokenizer.get_checkpoint_file() + '.tmp'))
+
+        checkpoint = self.get_tokenizer().load_checkpoint()
+        self.assertEqual(checkpoint['last_id'], last_id)
+        self.assertEqual(checkpoint['run_started_at'], datetime(2018, 5, 1, 10, 30))
+        self.assertEqual(checkpoint['records_parsed'], 4)
+        self.assertEqual(checkpoint['inserted_count'], 4)
+        self.assertEqual(checkpoint['total_ingredients'], 40)
+
+    def test_no_checkpoint(self):
+        self.assertIsNone(self.tokenizer.load_checkpoint())
+
+    def test_changed_master_data_is_not_resumed(self):
+        self.save_checkpoint(ObjectId())
+        tokenizer = self.get_tokenizer()
+        tokenizer.masterdata_fingerprint = 'fp2'
+        self.assertIsNone(tokenizer.load_checkpoint())
+
+    def test_checkpoint_has_fingerprint_of_written_recipes(self):
+        # Master data is reloaded after the last flushed batch
+        self.tokenizer.masterdata_fingerprint = 'fp2'
+        self.save_checkpoint(ObjectId())
+        self.assertIsNotNone(self.get_tokenizer().load_checkpoint())
+
+    def test_changed_options_are_not_resumed(self):
+        self.save_checkpoint(ObjectId())
+        tokenizer = self.get_tokenizer()
+        tokenizer.source = 'chefd'
+        self.assertIsNone(tokenizer.load_checkpoint())
+
+    def resume(self, tokenizer):
+        tokenizer.start_time = datetime.now()
+        tokenizer.testrun = False
+        tokenizer.workers = 1
+        tokenizer.finalize = False
+        tokenizer.resume = True
+        tokenizer.input_file = None
+        tokenizer.output_file = None
+        tokenizer.parse_cache = None
+        tokenizer.worker_stats = {}
+        tokenizer.write_batch_size = 2
+        tokenizer.write_batch_bytes = 16 * 1024 * 1024
+        tokenizer.write_concern = None
+        tokenizer.write_retries = 0
+        tokenizer.ing_db = Mock()
+
+        with patch.object(tokenizer, 'load_masterdata'), \
+                patch('tokenize_ingredients.get_masterdata_values'), \
+                patch.object(tokenizer, 'flush_pending'), \
+                patch.object(tokenizer, 'parse_recipes') as parse_mock, \
+                patch.object(tokenizer, 'swap_staging'), \
+                patch.object(tokenizer, 'save_run'):
+            tokenizer.clean_ingredients()
+        parse_mock.assert_called_once_with()
+
+    def test_resume_removes_documents_after_checkpoint(self):
+        last_id = ObjectId()
+        self.save_checkpoint(last_id)
+        tokenizer = self.get_tokenizer()
+        self.resume(tokenizer)
+
+        self.staging.delete_many.assert_called_once_with(
+            {'_id': {'$gt': last_id}})
+        tokenizer.master_db.drop_collection.assert_not_called()
+        self.assertEqual(tokenizer.query_params, {'_id': {'$gt': last_id}})
+        self.assertEqual(tokenizer.run_started_at, datetime(2018, 5, 1, 10, 30))
+        self.assertEqual(tokenizer.total_records_count, 9)
+        self.assertEqual(tokenizer.inserted_count, 4)
+        self.assertEqual(tokenizer.total_ingredients, 40)
+        self.assertFalse(os.path.isfile(tokenizer.get_checkpoint_file()))
+
+    def test_resumed_incremental_run_skips_parsed_ids(self):
+        ids = sorted(ObjectId() for _ in range(4))
+        self.tokenizer.incremental = True
+        self.save_checkpoint(ids[1])
+        tokenizer = self.get_tokenizer()
+        tokenizer.incremental = True
+        with patch.object(tokenizer, 'get_incremental_ids', return_value=ids):
+            self.resume(tokenizer)
+
+        self.assertEqual(tokenizer.incremental_ids, ids[2:])
+        self.assertEqual(tokenizer.total_records_count, 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+"""
+Tests of utils against the old implementations they replaced
+"""
+
+import itertools
+import re
+import unittest
+
+from random_corpus import BEFORE_CHAR_RE, AFTER_CHAR_RE, get_random_texts
+from utils import StringReplacer, ConversionIndex, standardize_ingredient, \
+    convert_to_float
+
+# Alternative values with their standard values, none of the
+# standard values is an alternative value
+REPLACE_STRINGS = {
+    'tbsp': 'tablespoon', 'tbs': 'tablespoon', 'tsp': 'teaspoon',
+    'cups': 'cup', 'c': 'cup', 'lbs': 'pound', 'lb': 'pound',
+    'oz': 'ounce', 'evoo': 'extra virgin olive oil',
+    'scallions': 'green onion', 'spring onions': 'green onion',
+    'bok choy \\(chinese\\)': 'bok choy'
+}
+
+WORDS = [
+    'tbsp', 'Tbsp', 'tbs', 'tsp', 'cups', 'c', 'lbs', 'LB', 'oz', 'evoo',
+    'scallions', 'spring', 'onions', 'bok', 'choy', '(chinese)', 'salt',
+    '1', '2x', '1/2', 'ounce', 'cup', 'tablespoon'
+]
+
+
+def clean_text(ingredient, replace_special_chars=False):
+    """Removes extra spaces like TokenizeIngredients.basic_cleaning"""
+    return re.sub(' +', ' ', ingredient).strip()
+
+
+def old_standardize_ingredient(ingredient, replace_strings, before_char_re,
+                               after_char_re, cleaning_func):
+    """
+    standardize_ingredient used before StringReplacer, replaced
+    matched values one by one
+
+    Returns:
+        Standardized text and replaced values(dict) for reference
+    """
+    tokens_replaced = {}
+    ingredient = cleaning_func(ingredient, replace_special_chars=True)
+    ingredient = ' ' + ingredient.strip() + ' '
+
+    stnd_values = sorted(
+        replace_strings.keys(),
+        key=lambda x: len(x),
+        reverse=True
+    )
+    replace_re = re.compile(
+        r'(?<={})({})(?={})'.format(
+            before_char_re, "|".join(stnd_values), after_char_re),
+        re.IGNORECASE
+    )
+    for replace_str in replace_re.findall(ingredient):
+        replace_str = replace_str.strip()
+        stnd_str = replace_strings.get(replace_str, None)
+        if not stnd_str:
+            stnd_str = replace_strings.get(replace_str.lower(), None)
+            if not stnd_str:
+                continue
+
+        ingredient = ' ' + ingredient.strip() + ' '
+        replace_re = re.compile(
+            r'(?<={})({})(?={})'.format(
+                before_char_re, replace_str, after_char_re),
+            re.IGNORECASE
+        )
+        if replace_re.search(ingredient):
+            ingredient = replace_re.sub(stnd_str, ingredient)
+            tokens_replaced[stnd_str] = replace_str
+        ingredient = cleaning_func(ingredient)
+    return ingredient, tokens_replaced
+
+
+# (ingredient, preparations, size, cup_per_unit) like IngredientConversion
+CONVERSIONS = [
+    ('apple', ['', 'diced'], 'medium', '1.5'),
+    ('apple', ['diced'], 'large', '2'),
+    ('apple', ['sliced'], 'small', '0.75'),
+    ('onion', [''], 'medium', '1'),
+    ('onion', ['chopped', 'minced'], 'medium', '0.667'),
+    ('garlic', ['minced'], 'small', '0.0104'),
+]
+
+
+def get_nested_conversions():
+    """
+    Conversions in the nested dict used before ConversionIndex
+
+    Returns:
+        ing_conversion(dict): ingredient -> preparation -> size
+    """
+    ing_conversion = {}
+    for ing, preps, size, cup_per_unit in CONVERSIONS:
+        for prep in preps:
+            ing_dict = ing_conversion.setdefault(ing, {})
+            ing_prep = ing_dict.setdefault(prep, {})
+            ing_size = ing_prep.setdefault(size, {})
+            ing_size['cup_per_unit'] = cup_per_unit
+    return ing_conversion
+
+
+def get_nested_cup_per_unit(ing_conversion, ingredient, prep, form, size):
+    """
+    Lookup of TokenizeIngredients.get_items_value before ConversionIndex
+
+    Returns:
+        Cup per unit(float) or None
+    """
+    if ingredient not in ing_conversion:
+        return None
+
+    prep_dict = ing_conversion[ingredient]
+    sizes_dict = prep_dict.get(prep, {})
+    if not sizes_dict:
+        sizes_dict = prep_dict.get(form, {})
+
+    ing_conv_dict = sizes_dict.get(size, {})
+    if not ing_conv_dict:
+        return None
+    return convert_to_float(ing_conv_dict['cup_per_unit'], digits=3)
+
+
+class StringReplacerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.replacer = StringReplacer(
+            REPLACE_STRINGS, BEFORE_CHAR_RE, AFTER_CHAR_RE)
+
+    def standardize(self, ingredient):
+        return standardize_ingredient(
+            ingredient, cleaning_func=clean_text, replacer=self.replacer)
+
+    def test_same_as_old_standardize_ingredient(self):
+        texts = [
+            '1 Tbsp evoo', '2 cups scallions, chopped', '1 c. milk',
+            '1 lb bok choy (chinese)', '2 tbsp tbs tbsp', 'spring onions',
+            '8 oz (1/2 lb) salt', 'salt'
+        ]
+        for text in texts + get_random_texts(WORDS, 500):
+            with self.subTest(text=text):
+                self.assertEqual(
+                    self.standardize(text),
+                    old_standardize_ingredient(
+                        text, REPLACE_STRINGS, BEFORE_CHAR_RE,
+                        AFTER_CHAR_RE, clean_text)
+                )
+
+    def test_matcher_options_give_same_texts(self):
+        regex_replacer = StringReplacer(
+            REPLACE_STRINGS, BEFORE_CHAR_RE, AFTER_CHAR_RE, use_trie=False)
+        for text in get_random_texts(WORDS, 200, seed=1):
+            text = ' %s ' % text
+            with self.subTest(text=text):
+                self.assertEqual(
+                    self.replacer.replace(text), regex_replacer.replace(text))
+
+    def test_standard_values_are_not_replaced_again(self):
+        # Old standardize_ingredient chained 'cups' to 'cup' to 'measuring cup'
+        replacer = StringReplacer(
+            {'cups': 'cup', 'cup': 'measuring cup'},
+            BEFORE_CHAR_RE, AFTER_CHAR_RE)
+        self.assertEqual(
+            replacer.replace(' 1 cups flour '),
+            (' 1 cup flour ', {'cup': 'cups'})
+        )
+
+    def test_first_occurrence_is_kept_for_reference(self):
+        self.assertEqual(
+            self.standardize('1 Tbsp sugar and 1 tbsp salt'),
+            ('1 tablespoon sugar and 1 tablespoon salt',
+             {'tablespoon': 'Tbsp'})
+        )
+
+
+class ConversionIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conversions = ConversionIndex()
+        for ing, preps, size, cup_per_unit in CONVERSIONS:
+            for prep in preps:
+                self.conversions.add(ing, prep, size, cup_per_unit)
+
+    def test_same_as_nested_dict(self):
+        ing_conversion = get_nested_conversions()
+        ingredients = ['apple', 'onion', 'garlic', 'salt']
+        preps = ['', 'diced', 'sliced', 'chopped', 'minced', 'grated']
+        sizes = ['medium', 'large', 'small']
+        for ingredient, prep, form, size in itertools.product(
+                ingredients, preps, preps, sizes):
+            with self.subTest(ingredient=ingredient, prep=prep,
+                              form=form, size=size):
+                self.assertEqual(
+                    ingredient in self.conversions,
+                    ingredient in ing_conversion
+                )
+                self.assertEqual(
+                    self.conversions.get(ingredient, prep, form, size),
+                    get_nested_cup_per_unit(
+                        ing_conversion, ingredient, prep, form, size)
+                )
+
+    def test_form_is_used_for_unknown_preparation(self):
+        self.assertEqual(
+            self.conversions.get('apple', 'grated', 'sliced', 'small'), 0.75)
+        self.assertIsNone(
+            self.conversions.get('apple', 'diced', 'sliced', 'small'))
+
+    def test_match_re_prefers_longer_ingredients(self):
+        self.conversions.add('green apple', '', 'medium', '1')
+        self.assertEqual(
+            self.conversions.match_re.findall('1 Green Apple, onion'),
+            ['Green Apple', 'onion']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Tests of writing cleansed documents with BulkWriter
+"""
+
+import unittest
+from unittest.mock import Mock
+
+from pymongo.errors import AutoReconnect, BulkWriteError, WTimeoutError
+
+from writers import BulkWriter, DUPLICATE_KEY_ERROR, WTIMEOUT_ERROR
+
+
+def get_result(inserted_count=0, upserted_count=0, matched_count=0,
+               acknowledged=True):
+    return Mock(
+        inserted_count=inserted_count,
+        upserted_count=upserted_count,
+        matched_count=matched_count,
+        acknowledged=acknowledged
+    )
+
+
+def get_bulk_write_error(n_inserted=0, write_errors=(), concern_errors=()):
+    return BulkWriteError({
+        'nInserted': n_inserted,
+        'nUpserted': 0,
+        'nMatched': 0,
+        'writeErrors': list(write_errors),
+        'writeConcernErrors': list(concern_errors)
+    })
+
+
+DUPLICATE_KEY = {'index': 0, 'code': DUPLICATE_KEY_ERROR, 'errmsg': 'E11000'}
+WTIMEOUT = {
+    'code': WTIMEOUT_ERROR,
+    'errInfo': {'wtimeout': True},
+    'errmsg': 'waiting for replication timed out'
+}
+
+
+class BulkWriterTest(unittest.TestCase):
+
+    def get_writer(self, side_effect, documents=2, **kwargs):
+        collection = Mock()
+        collection.bulk_write.side_effect = side_effect
+        writer = BulkWriter(collection, backoff=0, **kwargs)
+        for i in range(documents):
+            writer.add({'_id': i, 'ingredient': 'salt'})
+        return writer
+
+    def test_flush(self):
+        writer = self.get_writer([get_result(inserted_count=2)])
+        stats = writer.flush()
+        self.assertEqual(stats['documents'], 2)
+        self.assertEqual(stats['written'], 2)
+        self.assertEqual(stats['retries'], 0)
+        self.assertEqual(len(writer), 0)
+
+    def test_is_full(self):
+        writer = self.get_writer([], documents=2, batch_size=2)
+        self.assertTrue(writer.is_full())
+        writer = self.get_writer([], documents=1, batch_size=2)
+        self.assertFalse(writer.is_full())
+        writer = self.get_writer([], documents=1, batch_bytes=1)
+        self.assertTrue(writer.is_full())
+
+    def test_retries_transient_errors(self):
+        writer = self.get_writer(
+            [AutoReconnect('reconnecting'), get_result(inserted_count=2)])
+        stats = writer.flush()
+        self.assertEqual(stats['written'], 2)
+        self.assertEqual(stats['retries'], 1)
+
+    def test_retries_are_limited(self):
+        writer = self.get_writer(AutoReconnect('reconnecting'), retries=2)
+        with self.assertRaises(AutoReconnect):
+            writer.flush()
+        self.assertEqual(writer.collection.bulk_write.call_count, 3)
+
+    def test_duplicate_keys_of_retry_are_written(self):
+        # First document is inserted by the failed attempt
+        writer = self.get_writer([
+            AutoReconnect('reconnecting'),
+            get_bulk_write_error(n_inserted=1, write_errors=[DUPLICATE_KEY])
+        ])
+        stats = writer.flush()
+        self.assertEqual(stats['written'], 2)
+        self.assertEqual(stats['retries'], 1)
+
+    def test_duplicate_keys_of_first_attempt_are_raised(self):
+        writer = self.get_writer([
+            get_bulk_write_error(n_inserted=1, write_errors=[DUPLICATE_KEY])
+        ])
+        with self.assertRaises(BulkWriteError):
+            writer.flush()
+
+    def test_retries_write_concern_timeouts(self):
+        writer = self.get_writer([
+            get_bulk_write_error(n_inserted=2, concern_errors=[WTIMEOUT]),
+            get_bulk_write_error(
+                write_errors=[DUPLICATE_KEY, dict(DUPLICATE_KEY, index=1)])
+        ])
+        stats = writer.flush()
+        self.assertEqual(stats['written'], 2)
+        self.assertEqual(stats['retries'], 1)
+
+    def test_write_concern_timeouts_are_raised_after_retries(self):
+        writer = self.get_writer(
+            get_bulk_write_error(n_inserted=2, concern_errors=[WTIMEOUT]),
+            retries=1
+        )
+        with self.assertRaises(WTimeoutError):
+            writer.flush()
+
+    def test_other_write_concern_errors_are_raised(self):
+        writer = self.get_writer([
+            get_bulk_write_error(n_inserted=2, concern_errors=[
+                {'code': 79, 'errmsg': 'unrecognized write concern mode'}])
+        ])
+        with self.assertRaises(BulkWriteError):
+            writer.flush()
+
+    def test_unacknowledged_writes(self):
+        writer = self.get_writer([get_result(acknowledged=False)])
+        self.assertEqual(writer.flush()['written'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Token stream holding ingredient text tokens and their types while tokenizing
+"""
+
+# Kinds of numeric tokens emitted by the lexer
+VALUE_KINDS = ('mixed', 'fraction', 'percent', 'decimal', 'whole')
+
+
+class Token(object):
+    """Ingredient text token"""
+    __slots__ = ('text', 'type', 'parsed', 'kind')
+
+    def __init__(self, text, token_type='', parsed=False, kind=None):
+        self.text = text
+        self.type = token_type
+        # parsed is True once the token is matched with a master value
+        self.parsed = parsed
+        # kind is set by the lexer, ie: 'fraction', 'whole', 'dimension'
+        self.kind = kind
+
+    @property
+    def is_value(self):
+        return self.kind in VALUE_KINDS
+
+    def __repr__(self):
+        return 'Token(%r, %r)' % (self.text, self.type)
+
+
+class TokenStream(object):
+    """
+    Tokens of an ingredient text with their types.
+
+    The type signature(ie: 'value-unit_of_measure-ingredient') and
+    the token index used for matching words are rebuilt only after
+    the tokens are changed
+    """
+
+    def __init__(self, token_index, texts=()):
+        self.token_index = token_index
+        self.tokens = [Token(text) for text in texts]
+        self._signature = None
+        self._positions = None
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __getitem__(self, index):
+        return self.tokens[index]
+
+    def _changed(self):
+        self._signature = None
+        self._positions = None
+
+    def texts(self):
+        return [token.text for token in self.tokens]
+
+    def append(self, text, token_type='', kind=None):
+        self.tokens.append(Token(text, token_type, kind=kind))
+        self._changed()
+
+    def insert(self, index, text, token_type='', parsed=False, kind=None):
+        self.tokens.insert(index, Token(text, token_type, parsed, kind))
+        self._changed()
+
+    def set_text(self, index, text, kind=None):
+        """
+        Replaces text of the token, kind set by the lexer is
+        for the old text so it is replaced with kind
+        """
+        token = self.tokens[index]
+        token.text = text
+        token.kind = kind
+        self._positions = None
+
+    def set_type(self, index, token_type, parsed=False):
+        token = self.tokens[index]
+        token.type = token_type
+        if parsed:
+            token.parsed = True
+            self._positions = None
+        self._signature = None
+
+    def merge(self, start, end, text=None, token_type=None):
+        """
+        Replaces tokens from start to end(inclusive) with one token,
+        text defaults to the token texts joined by space and
+        type defaults to the type of start token
+        """
+        first = self.tokens[start]
+        if text is None:
+            text = " ".join(token.text for token in self.tokens[start:end + 1])
+        if token_type is None:
+            token_type = first.type
+        self.tokens[start:end + 1] = [Token(text, token_type, first.parsed)]
+        self._changed()
+
+    @property
+    def signature(self):
+        """
+        Returns:
+            Token types joined by '-'
+        """
+        if self._signature is None:
+            self._signature = "-".join(token.type for token in self.tokens)
+        return self._signature
+
+    def signature_at(self, start, end):
+        """
+        Returns:
+            Types of tokens from start to end(exclusive) joined by '-'
+        """
+        return "-".join(token.type for token in self.tokens[start:end])
+
+    def count_type(self, token_type):
+        return sum(1 for token in self.tokens if token.type == token_type)
+
+    def find(self, word):
+        """
+        Gets the positions of not parsed tokens matching word,
+        value tokens never match words
+
+        Returns:
+            Positions(list) or None if the word can't be looked up
+        """
+        if self._positions is None:
+            self._positions = self.token_index.build(
+                ['' if token.parsed or token.is_value else token.text
+                 for token in self.tokens])
+        return self.token_index.find(self._positions, word)
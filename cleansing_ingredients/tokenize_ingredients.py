@@ -4,25 +4,42 @@ Tokenizes actual ingredient text, using ingredientMaster db collections
 
 import os
 import re
-import json
 import argparse
-from copy import deepcopy
+import multiprocessing
+import time
+import zlib
+from copy import copy, deepcopy
 from collections import OrderedDict
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from itertools import groupby
 from operator import itemgetter
 
+from bson import Binary, json_util
+from pymongo import IndexModel, ASCENDING
 from unidecode import unidecode
 
 from converters import OunceConverter, find_chefd_category
+from matchers import build_matcher, TokenIndex, WildcardMatcher, \
+    PhraseIndex
+from lexer import lex_ingredient
+from parse_cache import ParseCache
+from snapshot import MasterdataSnapshot
+from pipeline import Pipeline
+from async_pipeline import AsyncPipeline, AsyncBulkWriter
+from adapters import STDIO_PATH, TextSource, JsonlSource, MongoSource, \
+    JsonlSink, JsonArraySink, iter_batches
+from writers import BulkWriter, get_write_concern
 from utils import get_master_mongo_conn, \
     get_ing_mongo_conn, \
-    xencode, _print_array, \
+    xencode, \
     get_ingredientmaster_values, \
-    standardize_ingredient, \
+    standardize_ingredient, StringReplacer, \
     convert_to_float, convert_datatype, \
     get_conversions_data, \
-    get_logger
+    get_logger, pattern_cache, get_masterdata_fingerprint, \
+    get_masterdata_values, get_words_re, get_peak_rss, \
+    get_masterdata_revision, close_db_connections
 
 BASEDIR = os.path.dirname(os.path.realpath(__file__))
 DATADIR = os.path.join(BASEDIR, 'data')
@@ -31,6 +48,41 @@ if not os.path.isdir(DATADIR):
 
 logger = get_logger('tokenize_ingredients.log')
 
+# Recipe fields not copied to cleansed documents
+IGNORE_FIELDS = [
+    'ingredients',
+    'cleaned_ingredients',
+    'tokenized_ingredients',
+    'created_at',
+    'updated_at'
+]
+
+# Collection keeping the last successful run of each cleansed collection
+RUNS_COLLECTION = 'tokenize_runs'
+
+# Number of changed master values matched in ingredient texts
+# with one regex by incremental runs
+CHANGED_VALUES_CHUNK = 500
+
+# Indexes of cleansed collection used by incremental runs
+CLEANSED_INDEXES = [
+    [('tokenized_ingredients.tokens.standard_token', ASCENDING)],
+    [('tokenized_ingredients.tokens.token', ASCENDING)]
+]
+
+# Attributes set by build_masterdata, kept in master data snapshot
+MASTERDATA_ATTRS = [
+    'replace_strings', 'ingmaster_values', 'ingredient_dict',
+    'alcoholic_beverages', 'nonfood_goods', 'ingredient_patterns',
+    'valid_skus', 'state_uom_chart', 'is_ingredient_re', 'ingmaster_vals',
+    'wildcard_matcher', 'match_re', 'ing_values', 'ing_match_re',
+    'phrase_index', 'replacer', 'alc_match_re', 'nonfood_match_re',
+    'ing_conversion'
+]
+
+# Tokenizer shared with forked worker processes
+_worker_tokenizer = None
+
 
 class TokenizeIngredients(object):
     """Tokenizes ingredient text"""
@@ -50,13 +102,69 @@ class TokenizeIngredients(object):
         self.cleansed_col_name = cmd_options.cleansed_collection_name
         self.testrun = cmd_options.testrun
         self.test_ingredients_file = cmd_options.test_file
+        # Recipes are read from input file and cleansed documents are
+        # written to output file instead of db collections if given
+        self.input_file = cmd_options.input_file
+        self.output_file = cmd_options.output_file
+        # Trie matcher is used by default, regex matcher is for parity testing
+        self.use_trie_matcher = cmd_options.matcher == 'trie'
+        # Parsed ingredient texts are cached only if cache_size is given
+        self.cache_size = cmd_options.cache_size
+        self.cache_file = cmd_options.cache_file
+        # Master data and matchers are loaded from snapshot file
+        # till master data is changed
+        self.use_snapshot = cmd_options.use_snapshot
+        # Master data is reloaded while parsing if it is changed,
+        # revision is checked every reload_interval seconds
+        self.reload_interval = cmd_options.reload_interval
+        self.next_reload_check = 0
+        self.parse_cache = None
+        # Cache stats of worker processes keyed by pid
+        self.worker_stats = {}
         self.master_db = get_master_mongo_conn()
         self.ing_db = get_ing_mongo_conn()
         self.before_char_re = r'[\s,:\(\d\*\/x\.\;\)]'
         self.after_char_re = r'[\s,:\)\*\/\.\;\(]'
-        # Re to match Decimal, fraction, Whole and Mixed numbers
-        # Ex '2.4', '1/2', '2', '2 1/2', '2%'
-        self.numbers_re = r'\d+\s\d+\/\d+|\d+\/\d+|\d+\.?\d+|\d+\.?\d+%|\d+%|\d+'
+        self.token_index = TokenIndex(self.before_char_re, self.after_char_re)
+        # Patterns used in basic_cleaning
+        self.spaces_re = re.compile(' +')
+        self.special_chars_re = re.compile(r'(\*+|:+|,+|\(|\))')
+        self.hyphen_re = re.compile(
+            r'(?<=\d)(-)(?=[a-z])|([a-z])(-)(?=\d)', re.IGNORECASE)
+        self.edge_chars_re = re.compile(
+            r'(\*+)$|(:+)$|(,+)$|(\.+)$|(\-+)$|^(\*+)|^(:+)|^(,+)|^(\.+)|^(\-+)')
+        self.batch_size = cmd_options.batch_size
+        self.workers = cmd_options.workers
+        self.queue_size = cmd_options.queue_size
+        # Mongo reads and bulk writes are run in io_threads threads
+        # overlapping with parsing if async_io is given
+        self.async_io = cmd_options.async_io
+        self.io_threads = cmd_options.io_threads
+        self.write_in_flight = cmd_options.write_in_flight
+        self.shard = cmd_options.shard
+        self.shards = cmd_options.shards
+        self.shard_key = cmd_options.shard_key
+        self.finalize = cmd_options.finalize
+        self.resume = cmd_options.resume
+        self.incremental = cmd_options.incremental
+        # _id of recipes parsed in incremental run, see get_incremental_ids
+        self.incremental_ids = None
+        # Master data values saved with the run
+        self.masterdata_values = set()
+        self.write_batch_size = cmd_options.write_batch_size
+        self.write_batch_bytes = cmd_options.write_batch_bytes
+        self.write_retries = cmd_options.write_retries
+        self.write_concern = get_write_concern(
+            cmd_options.write_concern, cmd_options.write_timeout)
+        # Counters of documents collected in writer after the last flush
+        self.pending_ingredients = 0
+        self.pending_last_id = None
+        self.pending_fingerprint = None
+        # Master data fingerprint of the last written recipe
+        self.flushed_fingerprint = None
+        self.pending_stnd_time = timedelta(0)
+        self.pending_ext_time = timedelta(0)
+        self.load_start_time = datetime.now()
         self.ounce_converter = OunceConverter()
         self.convert_states = ["liquid", "small solids", "ground"]
 
@@ -69,34 +177,26 @@ class TokenizeIngredients(object):
             Cleaned text
         """
         # Removing extra spaces from ingredient text
-        ingredient = re.sub(' +', ' ', ingredient).strip()
+        ingredient = self.spaces_re.sub(' ', ingredient).strip()
 
         if replace_special_chars:
             # Replacing special characters with a space before and after
-            sp_re_pattern = r'(\*+|:+|,+|\(|\))'
-            sp_re = re.compile(sp_re_pattern, re.IGNORECASE)
-            for _v in sp_re.findall(ingredient):
+            for _v in self.special_chars_re.findall(ingredient):
                 ingredient = ingredient.replace(_v, ' %s ' % _v)
 
             # Adding space around hyphen if there is a number before or after hyphen
-            hyphen_re = re.compile(
-                r'(?<=\d)(-)(?=[a-z])|([a-z])(-)(?=\d)', re.IGNORECASE)
-            if hyphen_re.search(ingredient):
-                ingredient = hyphen_re.sub(' - ', ingredient)
+            if self.hyphen_re.search(ingredient):
+                ingredient = self.hyphen_re.sub(' - ', ingredient)
 
             # Removing extra spaces from ingredient text
-            ingredient = re.sub(' +', ' ', ingredient).strip()
+            ingredient = self.spaces_re.sub(' ', ingredient).strip()
 
         if remove_special_chars:
             # Removing Special characters from end and start of ing text
-            end_re_pattern = r'(\*+)$|(:+)$|(,+)$|(\.+)$|(\-+)$'
-            start_re_pattern = r'^(\*+)|^(:+)|^(,+)|^(\.+)|^(\-+)'
-            sp_re = re.compile(end_re_pattern + '|' +
-                               start_re_pattern, re.IGNORECASE)
-            while sp_re.search(ingredient):
-                ingredient = sp_re.sub('', ingredient).strip()
+            while self.edge_chars_re.search(ingredient):
+                ingredient = self.edge_chars_re.sub('', ingredient).strip()
             # Removing extra spaces from ingredient text
-            ingredient = re.sub(' +', ' ', ingredient).strip()
+            ingredient = self.spaces_re.sub(' ', ingredient).strip()
 
         return ingredient
 
@@ -120,17 +220,17 @@ class TokenizeIngredients(object):
 
         return continous_numbers_lst
 
-    def combine_ingredient_text(self, ing_tokens, token_types):
+    def combine_ingredient_text(self, tokens):
         """
         Groups continuous unknown token types as one
         ie  ["value", "uom", "", "", "", "part", "", "", "form"] to
             ["value", "uom", "", "part", "", "form"]
 
         Returns:
-            Cleaned ing_tokens and token_types
+            Cleaned tokens(TokenStream)
         """
         ungrouped_tokens_index = [
-            i for i, v in enumerate(token_types) if not v]
+            i for i, token in enumerate(tokens) if not token.type]
 
         # Getting continuos index number for combining text
         continous_indexes = []
@@ -138,71 +238,67 @@ class TokenizeIngredients(object):
             if len(_indexes) > 1:
                 continous_indexes.append(_indexes)
             else:
-                token_types[_indexes[0]] = 'unknown'
-
-        if not continous_indexes:
-            return ing_tokens, token_types
-
-        remove_indexes = []
-        for index_list in continous_indexes:
-            start_index = index_list[0]
-            combined_val = " ".join(ing_tokens[i] for i in index_list)
-            ing_tokens[start_index] = combined_val.replace(' - ', '-').strip()
-            token_types[start_index] = 'unknown'
-            remove_indexes.extend(index_list[1:])
-
-        for index in sorted(remove_indexes, reverse=True):
-            ing_tokens.pop(index)
-            token_types.pop(index)
+                tokens.set_type(_indexes[0], 'unknown')
+
+        # Merging from the end, so that indexes of the
+        # groups before are not changed
+        for index_list in reversed(continous_indexes):
+            start_index, end_index = index_list[0], index_list[-1]
+            combined_val = " ".join(tokens[i].text for i in index_list)
+            tokens.merge(
+                start_index, end_index,
+                text=combined_val.replace(' - ', '-').strip(),
+                token_type='unknown'
+            )
 
-        return ing_tokens, token_types
+        return tokens
 
-    def tokenize_matched_values(self, match_value, ing_tokens, token_types):
+    def tokenize_matched_values(self, match_value, tokens):
         """
         Tokenizes the matched property from the ingredient text
 
         Returns:
-            Cleaned ing_tokens(lst) and token_types(lst)
+            Cleaned tokens(TokenStream)
         """
         try:
             value_type = self.ingmaster_values[match_value]
-        except:
-            value_type = None
-            special_keys = [k for k in self.ingmaster_values if '.*' in k]
-            for special_key in special_keys:
-                if re.search(special_key, match_value):
-                    value_type = self.ingmaster_values[special_key]
+        except KeyError:
+            # Checking values with wildcards(ie: 'cut into .* pieces')
+            value_type = self.wildcard_matcher.match_type(match_value)
             if not value_type:
-                return ing_tokens, token_types
+                return tokens
 
-        ing_tokens, token_types = self.clean_matched_tokens(
-            match_value, value_type, ing_tokens, token_types
-        )
-        return ing_tokens, token_types
+        return self.clean_matched_tokens(match_value, value_type, tokens)
 
-    def clean_tokens(self, ing_tokens, token_types, values):
+    def clean_tokens(self, tokens):
         """
         Removed unwanted text from tokens used for extractions
 
         Returns:
-            Cleaned ing_tokens and token_types
+            Cleaned tokens(TokenStream)
         """
-        for i, v in enumerate(ing_tokens):
-            if v == '(':
-                token_types[i] = 'start_parenthesis'
+        for i, token in enumerate(tokens):
+            v = token.text
+            if token.is_value:
+                if token.type == '':
+                    tokens.set_type(i, 'value')
+            elif token.parsed:
+                continue
+            elif v == '(':
+                tokens.set_type(i, 'start_parenthesis')
             elif v == ')':
-                token_types[i] = 'end_parenthesis'
+                tokens.set_type(i, 'end_parenthesis')
             elif v == ',':
-                token_types[i] = 'comma'
+                tokens.set_type(i, 'comma')
             elif v == 'or':
-                token_types[i] = 'or'
+                tokens.set_type(i, 'or')
             elif v == '-' or v == 'and':
                 is_before_token = True
-                if (i - 1) >= 0 and token_types[i - 1] == '':
+                if (i - 1) >= 0 and tokens[i - 1].type == '':
                     is_before_token = False
 
                 try:
-                    if token_types[i + 1] == '':
+                    if tokens[i + 1].type == '':
                         is_after_token = False
                     else:
                         is_after_token = True
@@ -211,19 +307,10 @@ class TokenizeIngredients(object):
 
                 if is_before_token and is_after_token:
                     if v == 'and':
-                        token_types[i] = 'ignore'
+                        tokens.set_type(i, 'ignore')
                     else:
-                        token_types[i] = 'hyphen'
-            elif '##value##' in v or '##parsed##' in v:
-                v = v.replace('##parsed##', '').strip()
-                if '##value##' in v:
-                    for _v in re.findall(r'##value##\d+', v):
-                        val_index = int(_v.replace('##value##', '').strip())
-                        v = v.replace(_v, values[val_index])
-                    if token_types[i] == '':
-                        token_types[i] = 'value'
-                ing_tokens[i] = v
-        return ing_tokens, token_types
+                        tokens.set_type(i, 'hyphen')
+        return tokens
 
     def convert_plural_tokens(self, ingredient, ing_tokens, tokens_replaced):
         """
@@ -234,21 +321,13 @@ class TokenizeIngredients(object):
         for token_index, plural_token in plural_tokens:
             # Removing plurals by removing 's' if the subtext exists in ingredients
             converted_token = re_plural.sub('', plural_token).strip()
-            previous_tokens = ing_tokens[:token_index+1]
-            previous_tokens_len = len(previous_tokens)
-            prev_tokens_combinations = [" ".join(previous_tokens[previous_tokens_len-i:])
-                                        for i in range(2, previous_tokens_len+1)]
-
-            if any([i in self.ing_values or i in self.ingmaster_vals
-                    or i in self.replace_strings for i in prev_tokens_combinations]):
+            if self.phrase_index.has_phrase_ending_at(ing_tokens, token_index):
                 # Not converting as there is an entry with combination of words before
                 # plural token in self.ing_values or self.ing_values
                 # or self.replace_strings
                 return ingredient, ing_tokens
 
-            if converted_token in self.ing_values or \
-                    converted_token in self.ingmaster_vals or \
-                    converted_token in self.replace_strings:
+            if converted_token in self.phrase_index:
                 tokens_replaced[converted_token] = plural_token
                 ing_tokens[token_index] = converted_token
                 ingredient = ingredient.replace(plural_token, converted_token)
@@ -264,80 +343,86 @@ class TokenizeIngredients(object):
         for token_index, plural_token in plural_tokens:
             # Removing plurals by removing 's' if the subtext exists in ingredients
             converted_token = re_plural.sub('', plural_token).strip()
-            previous_tokens = ing_tokens[:token_index+1]
-            previous_tokens_len = len(previous_tokens)
-            prev_tokens_combinations = [" ".join(previous_tokens[previous_tokens_len-i:])
-                                        for i in range(2, previous_tokens_len+1)]
-
-            if any([i in self.ing_values or i in self.ingmaster_vals
-                    or i in self.replace_strings for i in prev_tokens_combinations]):
+            if self.phrase_index.has_phrase_ending_at(ing_tokens, token_index):
                 # Not converting as there is an entry with combination of words before
                 # plural token in self.ing_values or self.ing_values
                 # or self.replace_strings
                 return ingredient
 
-            if converted_token in self.ing_values or \
-                    converted_token in self.ingmaster_vals or \
-                    converted_token in self.replace_strings:
+            if converted_token in self.phrase_index:
                 tokens_replaced[converted_token] = plural_token
                 ingredient = ingredient.replace(plural_token, converted_token)
         return ingredient
 
-    def check_special_charc(self, match_value, value_type, _index,
-                            ing_tokens, token_types):
+    def check_special_charc(self, match_value, value_type, _index, tokens):
         """
         This function checks for the special charcter in macthed value.
         If exists, adds it as a new token
         """
-        new_value = ing_tokens[_index]
-        if new_value != match_value:
+        token = tokens[_index]
+        new_value = token.text
+        # Special charcter is the rest of the token text, so it keeps the
+        # kind and parsed flag of the token(ie: value token matched by an
+        # index found before the tokens are changed). Parsed token matched
+        # again leaves an empty parsed token
+        if new_value != match_value or token.parsed:
             special_char = new_value.replace(match_value, '').strip()
             if new_value.startswith(special_char):
-                ing_tokens.insert(_index, special_char)
-                token_types.insert(_index, '')
+                tokens.insert(_index, special_char, parsed=token.parsed,
+                              kind=token.kind)
                 # Incrementing _index value as special charcter is inserted in _index
                 # and actual value is moved to _inxed + 1 postion
                 _index += 1
             else:
-                ing_tokens.insert(_index + 1, special_char)
-                token_types.insert(_index + 1, "")
-            ing_tokens[_index] = match_value
-        token_types[_index] = value_type
-        ing_tokens[_index] = '##parsed##' + ing_tokens[_index]
-        return ing_tokens, token_types
+                tokens.insert(_index + 1, special_char, parsed=token.parsed,
+                              kind=token.kind)
+            tokens.set_text(_index, match_value)
+        tokens.set_type(_index, value_type, parsed=True)
+        return tokens
 
     def check_token_matches(self, token, match):
         if len(token) == 1 and (not token.isdigit() and not token.isalpha()):
             # Skipping re characters like ( . etc
             return False
 
-        match_re = re.compile(
-            r'^\s?{}({}){}\s?$'.format(
-                self.before_char_re,
-                match,
-                self.after_char_re
-            ),
-            re.IGNORECASE
-        )
+        match_re = pattern_cache.token_re(
+            match, self.before_char_re, self.after_char_re)
         return bool(match_re.search(' '+token+' '))
 
-    def clean_matched_tokens(self, match_value, value_type, ing_tokens,
-                             token_types):
+    def get_matched_indexes(self, tokens, match_value_list):
+        """
+        Gets indexes of the tokens matching any word of the matched value,
+        using token index lookups instead of check_token_matches per token
+
+        Returns:
+            Sorted list of token indexes
+        """
+        matched_indexes = set()
+        for word in match_value_list:
+            indexes = tokens.find(word)
+            if indexes is None:
+                # Word has regex syntax, checking all the tokens
+                indexes = [i for i, token in enumerate(tokens)
+                           if not token.parsed and not token.is_value and
+                           self.check_token_matches(token.text, word)]
+            matched_indexes.update(indexes)
+        return sorted(matched_indexes)
+
+    def clean_matched_tokens(self, match_value, value_type, tokens):
         """
-        This function cleanes the ing_tokens(combines)
+        This function cleanes the tokens(combines)
         and populates resp token_type
 
         Returns:
-            Cleaned ing_tokens(lst) and token_types(lst)
+            Cleaned tokens(TokenStream)
         """
         match_value_list = match_value.split()
         if len(match_value_list) > 1:
             is_matched = False
             iter_count = 0
-            while not is_matched and iter_count < len(ing_tokens):
-                match_val_ind = [i for i, x in enumerate(ing_tokens)
-                                 if any(self.check_token_matches(x, thing)
-                                        for thing in match_value_list)]
+            while not is_matched and iter_count < len(tokens):
+                match_val_ind = self.get_matched_indexes(
+                    tokens, match_value_list)
                 continous_indexes = self.get_continous_numbers(
                     match_val_ind, multi=True)
                 matched_indexes_lst = [i for i in continous_indexes
@@ -347,45 +432,32 @@ class TokenizeIngredients(object):
                     break
 
                 matched_indexes = matched_indexes_lst[0]
-                index_val_list = ing_tokens[matched_indexes[0]
-                    :matched_indexes[-1]+1]
                 start_index = matched_indexes[0]
-                end_index = matched_indexes[-1]
-                ing_tokens[start_index] = " ".join(index_val_list)
-                while end_index > start_index:
-                    ing_tokens.pop(end_index)
-                    token_types.pop(end_index)
-                    end_index -= 1
-                ing_tokens, token_types = self.check_special_charc(
-                    match_value, value_type,
-                    start_index, ing_tokens, token_types
-                )
+                tokens.merge(start_index, matched_indexes[-1])
+                tokens = self.check_special_charc(
+                    match_value, value_type, start_index, tokens)
                 iter_count += 1
         else:
             try:
-                match_val_ind = [i for i, x in enumerate(ing_tokens)
-                                 if any(self.check_token_matches(x, thing)
-                                        for thing in match_value_list)]
+                match_val_ind = self.get_matched_indexes(
+                    tokens, match_value_list)
                 for start_index in match_val_ind:
-                    ing_tokens, token_types = self.check_special_charc(
-                        match_value, value_type,
-                        start_index, ing_tokens, token_types
-                    )
+                    tokens = self.check_special_charc(
+                        match_value, value_type, start_index, tokens)
             except ValueError:
                 msg = "Value missing, ing_tokens: %s, matched_value: %s"
                 logger.error(
-                    msg, ing_tokens, match_value_list[0]
+                    msg, tokens.texts(), match_value_list[0]
                 )
-        return ing_tokens, token_types
+        return tokens
 
-    def tokenize_ingredients(self, ingredient, ing_tokens,
-                             token_types, tokens_replaced):
+    def tokenize_ingredients(self, ingredient, tokens, tokens_replaced):
         """
         Tokenizes the matched ingredient from the ingredient text
 
         Returns:
             Cleaned ingredient text
-            Cleaned ing_tokens(lst) and token_types(lst)
+            Cleaned tokens(TokenStream)
         """
         ingredient = ' ' + self.basic_cleaning(ingredient) + ' '
         ing_matches = self.ing_match_re.findall(ingredient)
@@ -395,23 +467,19 @@ class TokenizeIngredients(object):
             reverse=True
         )):
             ing_match = ing_match.strip()
-            match_re = re.compile(r'(?<={})({})(?={})'.format(
-                self.before_char_re,
-                ing_match,
-                self.after_char_re
-            ), re.IGNORECASE)
+            match_re = pattern_cache.boundary_re(
+                ing_match, self.before_char_re, self.after_char_re)
             if not match_re.findall(ingredient):
                 # Skipping as, substring is matched
                 continue
 
             ing_key = '##ingredient##%s' % _index
             ingredient = ingredient.replace(ing_match, ing_key, 1)
-            ing_tokens, token_types = self.clean_matched_tokens(
-                ing_match, 'ingredient', ing_tokens, token_types
-            )
+            tokens = self.clean_matched_tokens(
+                ing_match, 'ingredient', tokens)
 
         ingredient = self.basic_cleaning(ingredient)
-        return ingredient, ing_tokens, token_types
+        return ingredient, tokens
 
     def standardize_value(self, cleansed_dict, ingredient_texts):
         uom_indxs = [i for i, v in enumerate(cleansed_dict['tokens'])
@@ -478,32 +546,20 @@ class TokenizeIngredients(object):
                 if sizes:
                     size = sizes[0]
 
-                prep_dict = self.ing_conversion[cleansed_dict['ingredient']]
-                sizes_dict = prep_dict.get(prep, {})
-                if not sizes_dict:
-                    sizes_dict = prep_dict.get(form, {})
-
-                ing_conv_dict = sizes_dict.get(size, {})
-                if ing_conv_dict:
-                    cup_per_unit = convert_to_float(
-                        ing_conv_dict['cup_per_unit'],
-                        digits=3
-                    )
+                cup_per_unit = self.ing_conversion.get(
+                    cleansed_dict['ingredient'], prep, form, size)
+                # Values like '2%' are not converted
+                uom_value = convert_to_float(
+                    cleansed_dict['unit_of_measure_value'],
+                    digits=3
+                )
+                if cup_per_unit is not None and uom_value is not None:
                     if cleansed_dict['unit_of_measure'] == 'cup':
-                        number_of_cups = convert_to_float(
-                            cleansed_dict['unit_of_measure_value'],
-                            digits=3
-                        )
                         no_items = round(
-                            (number_of_cups/cup_per_unit)/0.5) * 0.5
+                            (uom_value/cup_per_unit)/0.5) * 0.5
                         cleansed_dict['items'] = convert_datatype(no_items)
                     else:
-                        number_of_items = convert_to_float(
-                            cleansed_dict['unit_of_measure_value'],
-                            digits=3
-                        )
-                        number_of_cups = round(
-                            number_of_items * cup_per_unit, 2)
+                        number_of_cups = round(uom_value * cup_per_unit, 2)
                         cleansed_dict['items'] = cleansed_dict['unit_of_measure_value']
                         cleansed_dict['unit_of_measure'] = 'cup'
                         cleansed_dict['unit_of_measure_value'] = convert_datatype(
@@ -553,93 +609,30 @@ class TokenizeIngredients(object):
         ingredient = xencode(ingredient).strip()
         # ingredient = ingredient.replace('-', ' ')
         ingredient = ' ' + self.basic_cleaning(ingredient) + ' '
-        values = re.findall(self.numbers_re, ingredient)
-        for _ind, _value in enumerate(values):
-            if re.search(r'\d\d\/\d', _value):
-                # To handle cases like 11/2 etc
-                # This will add space between 1 and 1/2
-                _old_value = _value
-                _value_lst = [v for v in _value]
-                _value_lst.insert(1, ' ')
-                _value = "".join(_value_lst)
-                ingredient = ingredient.replace(_old_value, _value, 1)
-                values[_ind] = _value
-                tokens_replaced[_value] = _old_value
-
-            if re.search(r'\s(%s)' % _value, ingredient):
-                ingredient = re.sub(r'\s(%s)' % _value,
-                                    ' ##value##%s ' % _ind, ingredient, 1)
-            else:
-                replace_re = re.compile(
-                    r'(?<={})({})(?={})'.format(
-                        self.before_char_re,
-                        _value, self.after_char_re
-                    ),
-                    re.IGNORECASE
-                )
-                ingredient = replace_re.sub(
-                    r'##value##%s' % _ind, ingredient, 1)
+        tokens = lex_ingredient(
+            ingredient, self.token_index, tokens_replaced)
+        # Ingredient text matched with master values is rendered from
+        # the tokens, so '/' and 'x' are spaced same as in tokens.
+        # Values are rendered as ##value##N placeholders, so master
+        # values with digits(ie: '2% milk') don't match values
+        ingredient = " ".join(
+            '##value##%s' % i if token.is_value else token.text
+            for i, token in enumerate(tokens))
 
-        ing_tokens = []
-        ingredient = self.basic_cleaning(ingredient)
-        for ing_token in ingredient.split():
-            if not ing_token:
-                continue
-
-            copy_ing_token = ing_token
-            ing_token = self.basic_cleaning(ing_token)
-            if copy_ing_token != ing_token:
-                ingredient = ingredient.replace(copy_ing_token, ing_token, 1)
-
-            if '/' in ing_token and not re.search(r'(##value##\d+\/##value##\d+)', ing_token):
-                if 'l/##value##' in ing_token:
-                    # handeling cases like l/2 teaspoon paprika
-                    _value, value_txt = ing_token.split('/')
-                    value_index = int(value_txt.replace(
-                        '##value##', '').strip())
-                    values[value_index] = '1/%s' % values[value_index]
-                    ingredient = ingredient.replace(
-                        ing_token, ing_token.replace('l/', '1/'))
-                    ing_tokens.append(value_txt)
-                else:
-                    _ing_token = ing_token.strip().replace('/', ' / ')
-                    ingredient = ingredient.replace(ing_token, _ing_token, 1)
-                    ing_tokens.extend([self.basic_cleaning(i)
-                                       for i in _ing_token.split(' ') if i])
-            elif re.search(r'x(##value##)', ing_token, re.IGNORECASE):
-                # Special cases like 2 (18x13") rimmed baking sheets
-                # in this case ing_token will be x13
-                _ing_token = ing_token.replace('x', 'x ')
-                ingredient = ingredient.replace(ing_token, _ing_token)
-                ing_tokens.extend([self.basic_cleaning(i)
-                                   for i in _ing_token.split(' ') if i])
-            elif ing_token == 'l':
-                # handeling cases like l creaml whipping plusl l milk
-                values.append('1')
-                ing_tokens.append('##value##%s' % (len(values) - 1))
-            else:
-                ing_tokens.append(ing_token)
-
-        token_types = [''] * len(ing_tokens)
         """
         ingredient, ing_tokens = self.convert_plural_tokens(
             ingredient, ing_tokens, tokens_replaced
         )
         """
-        ingredient, ing_tokens, token_types = self.tokenize_ingredients(
-            ingredient, ing_tokens, token_types, tokens_replaced
+        ingredient, tokens = self.tokenize_ingredients(
+            ingredient, tokens, tokens_replaced
         )
         ingredient = ' ' + self.basic_cleaning(ingredient) + ' '
         matched_values = self.match_re.findall(ingredient)
         for match_value in matched_values:
             match_value = match_value.strip()
-            macth_re = re.compile(
-                r'(?<={})({})(?={})'.format(
-                    self.before_char_re,
-                    match_value, self.after_char_re
-                ),
-                re.IGNORECASE
-            )
+            macth_re = pattern_cache.boundary_re(
+                match_value, self.before_char_re, self.after_char_re)
             if not macth_re.search(ingredient):
                 # Skipping as, substring is matched
                 logger.info(
@@ -649,52 +642,48 @@ class TokenizeIngredients(object):
                 continue
 
             match_value = match_value.strip()
-            ing_tokens, token_types = self.tokenize_matched_values(match_value,
-                                                                   ing_tokens, token_types)
+            tokens = self.tokenize_matched_values(match_value, tokens)
             ingredient = ingredient.replace(match_value, ' ', 1)
             ingredient = ' ' + self.basic_cleaning(ingredient) + ' '
 
-        ing_tokens, token_types = self.clean_tokens(
-            ing_tokens, token_types, values)
-        ing_tokens, token_types = self.combine_ingredient_text(
-            ing_tokens, token_types)
+        tokens = self.clean_tokens(tokens)
+        tokens = self.combine_ingredient_text(tokens)
 
         # Handeling mixed scenario or cases like 1 tsp. coarse or sea salt
-        if "unknown-or-ingredient" in "-".join(token_types):
-            ing_tokens, token_types = self.parse_mixed_ingredients(
-                ing_tokens, token_types, tokens_replaced
-            )
+        if "unknown-or-ingredient" in tokens.signature:
+            tokens = self.parse_mixed_ingredients(tokens, tokens_replaced)
 
-        for i, _type in enumerate(token_types):
+        for i, token in enumerate(tokens):
+            _type = token.type
             if _type == 'unit_of_measure':
                 if i >= 1:
                     value_index = i - 1
-                    if token_types[value_index] in special_tokens:
+                    if tokens[value_index].type in special_tokens:
                         # If the token is special cases checking
                         # for the before token to get the value
                         value_index -= 1
 
-                    if value_index >= 0 and token_types[value_index] == 'value' \
-                            and ing_tokens[value_index]:
+                    if value_index >= 0 and tokens[value_index].type == 'value' \
+                            and tokens[value_index].text:
                         if not cleansed_dict.get('unit_of_measure', None):
-                            cleansed_dict['unit_of_measure'] = ing_tokens[i]
-                            cleansed_dict['unit_of_measure_value'] = ing_tokens[value_index]
+                            cleansed_dict['unit_of_measure'] = token.text
+                            cleansed_dict['unit_of_measure_value'] = tokens[value_index].text
             if _type == 'ingredient':
-                if ing_tokens[i]:
-                    ingredient_texts.append(ing_tokens[i])
+                if token.text:
+                    ingredient_texts.append(token.text)
             elif _type in ing_long.keys() and not ing_long.get(_type, None):
-                ing_long[_type] = ing_tokens[i]
+                ing_long[_type] = token.text
             elif _type == 'unknown':
                 unknown_val = self.basic_cleaning(
-                    ing_tokens[i], remove_special_chars=True)
+                    token.text, remove_special_chars=True)
                 if unknown_val in prep_unknown_tokens:
                     try:
-                        bef_type = token_types[i-1]
+                        bef_type = tokens[i-1].type
                     except IndexError:
                         bef_type = ''
 
                     try:
-                        aft_type = token_types[i+1]
+                        aft_type = tokens[i+1].type
                     except IndexError:
                         aft_type = ''
                     if bef_type != 'preparation' and aft_type != 'preparation':
@@ -703,8 +692,8 @@ class TokenizeIngredients(object):
                     unkown_texts.append(unknown_val)
 
         if not cleansed_dict['unit_of_measure']:
-            values_lst = [(ing_tokens[i], i) for i, v in enumerate(token_types)
-                          if v == 'value']
+            values_lst = [(token.text, i) for i, token in enumerate(tokens)
+                          if token.type == 'value']
             got_value = False
             for value_lst in values_lst:
                 if got_value:
@@ -712,22 +701,22 @@ class TokenizeIngredients(object):
 
                 unit_value, _index = value_lst
                 is_item = False
-                next_type = "-".join(token_types[_index+1:_index+3])
+                next_type = tokens.signature_at(_index+1, _index+3)
                 if next_type in ['size-ingredient', 'state-ingredient', 'form-ingredient']:
                     is_item = True
-                elif len(token_types) > _index+1 and token_types[_index+1] == 'ingredient':
+                elif len(tokens) > _index+1 and tokens[_index+1].type == 'ingredient':
                     is_item = True
                 if is_item:
                     cleansed_dict['unit_of_measure'] = 'item'
                     cleansed_dict['unit_of_measure_value'] = unit_value
                     got_value = True
                 elif len(values_lst) == 1 and next_type.startswith('container'):
-                    cleansed_dict['unit_of_measure'] = ing_tokens[_index+1]
+                    cleansed_dict['unit_of_measure'] = tokens[_index+1].text
                     cleansed_dict['unit_of_measure_value'] = unit_value
                     got_value = True
 
         is_or_pattern = False
-        if "ingredient-or-ingredient" in "-".join(token_types):
+        if "ingredient-or-ingredient" in tokens.signature:
             is_or_pattern = True
 
         ingredient_long_texts = OrderedDict()
@@ -752,15 +741,14 @@ class TokenizeIngredients(object):
         ing_long['ingredient'] = cleansed_dict['ingredient']
         cleansed_dict["unknown"] = "|".join(unkown_texts)
 
-        tokens_extracted = "-".join(token_types)
-        if self.is_ingredient_re.search(tokens_extracted):
+        if self.is_ingredient_re.search(tokens.signature):
             cleansed_dict['is_ingredient'] = True
 
         inlong_check = True
         if self.nonfood_match_re.search(cleansed_dict['actual_ingredient']):
             cleansed_dict['is_ingredient'] = False
             inlong_check = False
-        elif len([i for i in token_types if i == 'ingredient']) > 1 \
+        elif tokens.count_type('ingredient') > 1 \
                 and not is_or_pattern:
             cleansed_dict['is_ingredient'] = False
             inlong_check = False
@@ -774,7 +762,8 @@ class TokenizeIngredients(object):
         else:
             cleansed_dict['ingredient_long'] = ""
 
-        for ind, v in enumerate(ing_tokens):
+        for token in tokens:
+            v = token.text
             org_v = v
             for rpd_token, org_token in tokens_replaced.items():
                 if rpd_token in v:
@@ -782,7 +771,7 @@ class TokenizeIngredients(object):
 
             v = v.replace('\\', '')
             tokens_dict = {"token": org_v,
-                           "standard_token": v, "type": token_types[ind]}
+                           "standard_token": v, "type": token.type}
             cleansed_dict['tokens'].append(tokens_dict)
 
         cleansed_dict = self.standardize_value(cleansed_dict, ingredient_texts)
@@ -840,12 +829,27 @@ class TokenizeIngredients(object):
         cleansed_dict['size'] = ";".join(size)
         if len(size) == 0:
             cleansed_dict['size'] = 'medium'
-        _print_array(cleansed_dict)
-        import pdb
-        pdb.set_trace()
-
         return cleansed_dict
 
+    def normalize_ingredient(self, ingredient):
+        """
+        Cheap normalization done before standardizing ingredient text
+        ie: unidecode, removing (r) and extra spaces
+
+        Returns:
+            Normalized text
+        """
+        if isinstance(ingredient, bytes):
+            ingredient = unidecode(
+                ingredient.decode('utf-8', 'ignore')).strip()
+        else:
+            ingredient = unidecode(ingredient).strip()
+
+        # Removing special char \xc2\xae
+        # which will be replaced to (r) by unidecode
+        ingredient = ingredient.replace('(r)', '')
+        return self.basic_cleaning(ingredient)
+
     def parse_ingredients(self, ingredients):
         """
         Iterates through all the ingredient texts
@@ -856,26 +860,49 @@ class TokenizeIngredients(object):
         """
         if not isinstance(ingredients, list):
             ingredients = [ingredients]
+        return self.parse_ingredients_batch(ingredients)
 
+    def parse_ingredients_batch(self, ingredients):
+        """
+        Parses a batch of ingredient texts.
+        All the texts are normalized first and
+        texts repeated in the batch are extracted only once
+
+        Returns:
+            cleansed ing dicts, standardizing time and extraction time
+        """
+        # Master data is reloaded only between batches
+        self.reload_masterdata()
+        start_time = datetime.now()
+        normalized_ingredients = [self.normalize_ingredient(ingredient)
+                                  for ingredient in ingredients]
+        basic_cleaning_time = datetime.now() - start_time
+        extracting_time = timedelta(0)
+
+        parsed = {}
         cleansed_ingredients = []
-        basic_cleaning_time = None
-        extracting_time = None
-        for ingredient in ingredients:
-            actual_ingredient = ingredient
-            if isinstance(ingredient, bytes):
-                ingredient = unidecode(
-                    ingredient.decode('utf-8', 'ignore')).strip()
-            else:
-                ingredient = unidecode(ingredient).strip()
+        for actual_ingredient, ingredient in zip(ingredients, normalized_ingredients):
+            # Nonfood goods are checked in actual ingredient text
+            # so the check is also part of the key
+            parse_key = '%s\x00%s' % (ingredient, bool(
+                self.nonfood_match_re.search(actual_ingredient)))
+            if parse_key in parsed:
+                cleansed_dict = deepcopy(parsed[parse_key])
+                cleansed_dict['actual_ingredient'] = actual_ingredient
+                cleansed_ingredients.append(cleansed_dict)
+                continue
+
+            if self.parse_cache is not None:
+                cleansed_dict = self.parse_cache.get(
+                    parse_key, actual_ingredient)
+                if cleansed_dict is not None:
+                    parsed[parse_key] = cleansed_dict
+                    cleansed_ingredients.append(cleansed_dict)
+                    continue
 
             start_time = datetime.now()
             tokens_replaced = {}
 
-            # Removing special char \xc2\xae
-            # which will be replaced to (r) by unidecode
-            ingredient = ingredient.replace('(r)', '')
-            ingredient = self.basic_cleaning(ingredient)
-
             # Converting plurals
             ingredient = self.convert_plurals(ingredient, tokens_replaced)
 
@@ -884,25 +911,22 @@ class TokenizeIngredients(object):
                 replace_strings=self.replace_strings,
                 before_char_re=self.before_char_re,
                 after_char_re=self.after_char_re,
-                cleaning_func=self.basic_cleaning
+                cleaning_func=self.basic_cleaning,
+                replacer=self.replacer
             )
             tokens_replaced.update(_tokens_replaced)
-
-            if not basic_cleaning_time:
-                basic_cleaning_time = datetime.now() - start_time
-            else:
-                basic_cleaning_time += datetime.now() - start_time
+            basic_cleaning_time += datetime.now() - start_time
 
             start_time = datetime.now()
             ingredient = self.basic_cleaning(ingredient).lower()
             cleansed_dict = self.extract_details(
                 ingredient, actual_ingredient, tokens_replaced
             )
+            parsed[parse_key] = cleansed_dict
             cleansed_ingredients.append(cleansed_dict)
-            if not extracting_time:
-                extracting_time = datetime.now() - start_time
-            else:
-                extracting_time += datetime.now() - start_time
+            if self.parse_cache is not None:
+                self.parse_cache.set(parse_key, cleansed_dict)
+            extracting_time += datetime.now() - start_time
         return cleansed_ingredients, basic_cleaning_time, extracting_time
 
     def get_categories(self, recp_catg, cleansed_ingredients):
@@ -934,7 +958,7 @@ class TokenizeIngredients(object):
         """
         return any([i.get('two_ingredients', False) for i in cleansed_ingredients])
 
-    def parse_mixed_ingredients(self, ing_tokens, token_types, tokens_replaced):
+    def parse_mixed_ingredients(self, tokens, tokens_replaced):
         """
         This function is to handle special mixed ingredient scenario
         Ex: 1 tsp. coarse or sea salt
@@ -945,43 +969,163 @@ class TokenizeIngredients(object):
             this function helps extracting ingredients data of such cases
 
         Returns:
-            Cleaned ing_tokens and token_types
+            Cleaned tokens(TokenStream)
         """
-        or_tokens_index = [i for i, v in enumerate(token_types) if v == 'or']
+        or_tokens_index = [i for i, token in enumerate(tokens)
+                           if token.type == 'or']
         for or_token_index in or_tokens_index:
             try:
                 unknow_index = or_token_index - 1
                 ing_index = or_token_index + 1
-                if token_types[unknow_index] != 'unknown' or \
-                        token_types[ing_index] != 'ingredient':
+                if tokens[unknow_index].type != 'unknown' or \
+                        tokens[ing_index].type != 'ingredient':
                     continue
-                if len(ing_tokens[unknow_index]) <= 1:
+                if len(tokens[unknow_index].text) <= 1:
                     continue
 
-                _unknown_val = ing_tokens[unknow_index]
-                _ing_val = ing_tokens[ing_index]
+                _unknown_val = tokens[unknow_index].text
+                _ing_val = tokens[ing_index].text
                 if not _ing_val:
                     continue
                 new_unknown_val = _unknown_val + ' ' + \
                     " ".join(_ing_val.split(' ')[1:]).strip()
                 if new_unknown_val in self.ingredient_dict:
-                    token_types[unknow_index] = 'ingredient'
-                    ing_tokens[unknow_index] = new_unknown_val
+                    tokens.set_type(unknow_index, 'ingredient')
+                    tokens.set_text(unknow_index, new_unknown_val)
                     tokens_replaced[new_unknown_val] = _unknown_val
             except IndexError:
                 continue
-        return ing_tokens, token_types
+        return tokens
 
-    def clean_ingredients(self):
+    def load_masterdata(self, revision=None, fingerprint=None):
         """
-        This is the main function where the tokenization starts
+        Loads ingredientMaster data and the matchers used for tokenizing.
+        Master data attributes are replaced only after the new master data
+        is completely loaded, so it is also used for reloading.
+        Revision and fingerprint are read from db if they are not given
+        """
+        if revision is None:
+            # Revision is read first, so changes made while loading are reloaded
+            revision = get_masterdata_revision()
+            fingerprint = get_masterdata_fingerprint()
+        self.masterdata_revision = revision
+        self.masterdata_fingerprint = fingerprint
+        masterdata = self.get_masterdata()
+        for name in MASTERDATA_ATTRS:
+            setattr(self, name, masterdata[name])
+        self.next_reload_check = time.time() + self.reload_interval
+
+        if self.parse_cache is not None:
+            self.parse_cache.reset(self.masterdata_fingerprint)
+        elif self.cache_size > 0:
+            self.parse_cache = ParseCache(
+                self.masterdata_fingerprint,
+                maxsize=self.cache_size,
+                cache_file=self.cache_file
+            )
+
+    def get_masterdata(self):
+        """
+        Loads master data and matchers from master data snapshot,
+        snapshot is rebuilt from db if master data is changed after it is saved
+
+        Returns:
+            Master data(dict) keyed by MASTERDATA_ATTRS
         """
+        snapshot = None
+        if self.use_snapshot:
+            snapshot_time = datetime.now()
+            snapshot = MasterdataSnapshot(
+                os.path.join(DATADIR, 'masterdata_tokenize_ingredients.pickle'),
+                self.masterdata_fingerprint,
+                options={
+                    'use_trie_matcher': self.use_trie_matcher,
+                    'before_char_re': self.before_char_re,
+                    'after_char_re': self.after_char_re
+                }
+            )
+            masterdata = snapshot.load()
+            if masterdata is not None:
+                logger.info(
+                    "Loaded master data snapshot: %s, Timetaken: %s",
+                    snapshot.snapshot_file,
+                    str(datetime.now() - snapshot_time)[:-3]
+                )
+                return masterdata
+
+        # Building on a copy, master data in use is not changed while building
+        builder = copy(self)
+        builder.build_masterdata()
+        masterdata = dict(
+            (name, getattr(builder, name)) for name in MASTERDATA_ATTRS)
+        if snapshot is not None:
+            snapshot_time = datetime.now()
+            snapshot.save(masterdata)
+            logger.info(
+                "Saved master data snapshot: %s, Timetaken: %s",
+                snapshot.snapshot_file,
+                str(datetime.now() - snapshot_time)[:-3]
+            )
+        return masterdata
+
+    def reload_masterdata(self):
+        """
+        Reloads master data if master data revision is changed,
+        revision is read at most once in reload_interval seconds
+        """
+        if not self.reload_interval or time.time() < self.next_reload_check:
+            return
+
+        self.next_reload_check = time.time() + self.reload_interval
+        old_revision = self.masterdata_revision
+        if get_masterdata_revision() == old_revision:
+            return
+
+        reload_time = datetime.now()
+        self.load_masterdata()
         logger.info(
-            "Started cleansing process, Starttime: %s, IsTestrun: %s",
-            str(self.start_time), self.testrun
+            "Reloaded master data, Revision: %s to %s, Pid: %s, Timetaken: %s",
+            old_revision, self.masterdata_revision, os.getpid(),
+            str(datetime.now() - reload_time)[:-3]
         )
-        query_params = {}
 
+    def follow_masterdata(self, revision, fingerprint):
+        """
+        Loads master data of the revision used by parent process in
+        worker process. Workers don't read the revision from db,
+        parent process reloads master data between batches
+        and passes its revision with every batch, see tag_batches
+        """
+        if revision == self.masterdata_revision and \
+                fingerprint == self.masterdata_fingerprint:
+            return
+
+        reload_time = datetime.now()
+        old_revision = self.masterdata_revision
+        self.load_masterdata(revision, fingerprint)
+        logger.info(
+            "Reloaded master data, Revision: %s to %s, Pid: %s, Timetaken: %s",
+            old_revision, self.masterdata_revision, os.getpid(),
+            str(datetime.now() - reload_time)[:-3]
+        )
+
+    def tag_batches(self, batches):
+        """
+        Reloads master data between batches parsed in worker processes,
+        so all the workers parse a batch with the same master data
+
+        Returns:
+            Generator of (revision, fingerprint, batch)
+        """
+        for batch in batches:
+            self.reload_masterdata()
+            yield self.masterdata_revision, self.masterdata_fingerprint, batch
+
+    def build_masterdata(self):
+        """
+        Loads ingredientMaster data from db and builds the matchers
+        used for tokenizing
+        """
         ing_time = datetime.now()
         ing_data = get_ingredientmaster_values()
         self.replace_strings, self.ingmaster_values, \
@@ -989,10 +1133,11 @@ class TokenizeIngredients(object):
             self.nonfood_goods, self.ingredient_patterns, \
             self.valid_skus, self.state_uom_chart = ing_data
         logger.info(
-            "Time taken to get Ingredients data from db: %s",
-            str(datetime.now() - ing_time)[:-3]
+            "Time taken to get Ingredients data from db: %s, PeakRSS: %sMB",
+            str(datetime.now() - ing_time)[:-3], get_peak_rss()
         )
 
+        matchers_time = datetime.now()
         self.is_ingredient_re = re.compile(
             '{}'.format("|".join(self.ingredient_patterns)),
             re.IGNORECASE
@@ -1003,22 +1148,30 @@ class TokenizeIngredients(object):
             key=lambda x: len(x),
             reverse=True
         )
-        matched_str = "|".join(self.ingmaster_vals)
-        self.match_re = re.compile(r'(?<={})({})(?={})'.format(
-            self.before_char_re, matched_str,
-            self.after_char_re
-        ), re.IGNORECASE)
+        self.wildcard_matcher = WildcardMatcher(self.ingmaster_values)
+        self.match_re = build_matcher(
+            self.ingmaster_vals, self.before_char_re,
+            self.after_char_re, use_trie=self.use_trie_matcher
+        )
 
         self.ing_values = sorted(
             self.ingredient_dict.keys(),
             key=lambda x: len(x),
             reverse=True
         )
-        match_string = "|".join(self.ing_values)
-        self.ing_match_re = re.compile(r'(?<={})({})(?={})'.format(
-            self.before_char_re, match_string,
-            self.after_char_re
-        ), re.IGNORECASE)
+        self.ing_match_re = build_matcher(
+            self.ing_values, self.before_char_re,
+            self.after_char_re, use_trie=self.use_trie_matcher
+        )
+
+        # Index of all the phrases checked while converting plurals
+        self.phrase_index = PhraseIndex(
+            self.ing_values, self.ingmaster_vals, self.replace_strings)
+
+        self.replacer = StringReplacer(
+            self.replace_strings, self.before_char_re,
+            self.after_char_re, use_trie=self.use_trie_matcher
+        )
 
         alcoholic_values = sorted(
             self.alcoholic_beverages,
@@ -1038,158 +1191,1071 @@ class TokenizeIngredients(object):
         self.nonfood_match_re = re.compile(
             r'{}'.format(match_string), re.IGNORECASE)
 
-        self.conv_match_re, self.ing_conversion = get_conversions_data(
-            self.ing_db)
-        if self.source:
-            query_params["source"] = self.source.strip()
+        logger.info(
+            "Time taken to build matchers: %s, Matcher: %s",
+            str(datetime.now() - matchers_time)[:-3],
+            'trie' if self.use_trie_matcher else 'regex'
+        )
 
-        recipes = []
-        total_records_count = 0
-        db_start_time = datetime.now()
-        if self.testrun and os.path.isfile(self.test_ingredients_file):
-            with open(self.test_ingredients_file) as f:
-                recipes = f.read().splitlines()
-            total_records_count = len(recipes)
+        self.ing_conversion = get_conversions_data(self.ing_db)
+
+    def build_recipe_document(self, recipe):
+        """
+        Parses ingredients of a recipe
+
+        Returns:
+            Recipe document with tokenized ingredients, ingredients count,
+            standardizing time, extraction time and master data fingerprint
+        """
+        pstart_time = datetime.now()
+        # Recipes are read with find_recipes, so the recipe is updated
+        # in place and cleaned_ingredients is list of actual_ingredient
+        copy_recipe = recipe
+        ingredients = copy_recipe.pop('cleaned_ingredients', [])
+        for ignore_field in IGNORE_FIELDS:
+            if ignore_field in copy_recipe:
+                copy_recipe.pop(ignore_field)
+
+        logger.info(
+            "Parsing Recipe: %s, Source: %s, Url: %s, IngCounr: %s",
+            recipe['_id'], recipe['source'], recipe['url'], len(
+                ingredients)
+        )
+        parsed_data = self.parse_ingredients(ingredients)
+        cleansed_ingredients, basic_cleaning_time, extracting_time = parsed_data
+        copy_recipe['chefd_category'] = self.get_categories(
+            copy_recipe.get('category', ''),
+            cleansed_ingredients
+        )
+        copy_recipe['two_ingredients'] = self.is_two_ingredients(
+            cleansed_ingredients)
+        copy_recipe['tokenized_ingredients'] = cleansed_ingredients
+        msg = "Completed Parsing Recipe: %s, IngCounr: %s, "
+        msg += "ParseTime: %s, StandardizingTime: %s, ExtartionTime: %s"
+        logger.info(
+            msg, recipe['_id'], len(ingredients),
+            str(datetime.now() - pstart_time)[:-3],
+            str(basic_cleaning_time)[:-3], str(extracting_time)[:-3]
+        )
+        return copy_recipe, len(ingredients), basic_cleaning_time, \
+            extracting_time, self.masterdata_fingerprint
+
+    def build_test_document(self, cleansed_dict):
+        """
+        Returns:
+            Test run document of a parsed ingredient text
+        """
+        copy_recipe = {}
+        cleansed_ingredients = [cleansed_dict]
+        copy_recipe['tokenized_ingredients'] = cleansed_ingredients
+        copy_recipe['chefd_category'] = self.get_categories(
+            copy_recipe.get('category', ''),
+            cleansed_ingredients
+        )
+        copy_recipe['two_ingredients'] = self.is_two_ingredients(
+            cleansed_ingredients)
+        return copy_recipe
+
+    def in_shard(self, recipe):
+        """
+        Checks if recipe is in the shard of this run,
+        recipes are partitioned by crc32 of shard key
+
+        Returns:
+            Boolean
+        """
+        if self.shards <= 1:
+            return True
+        if self.shard_key == 'source':
+            key = recipe.get('source', '')
+        else:
+            key = recipe['_id']
+        return zlib.crc32(str(key).encode('utf-8')) % self.shards == self.shard
+
+    def read_shard_ids(self):
+        """
+        Reads _id of recipes to be parsed in the shard of this run
+
+        Returns:
+            Generator of _id
+        """
+        if self.incremental_ids is not None:
+            # Incremental run is not sharded, see get_incremental_ids
+            recipes = ({'_id': _id} for _id in self.incremental_ids)
         else:
             recipes = self.master_db[self.collection_name].find(
-                query_params,
-                no_cursor_timeout=True
+                self.query_params, {'_id': 1, 'source': 1}).sort('_id', 1)
+        for recipe in recipes:
+            if self.in_shard(recipe):
+                yield recipe['_id']
+
+    def read_id_batches(self):
+        """
+        Reads _id of recipes to be parsed and splits them into batches
+        of batch_size recipes. Batch is an _id range or
+        list of _id in sharded and incremental runs
+
+        Returns:
+            Generator of _id query conditions
+        """
+        ids = []
+        for _id in self.read_shard_ids():
+            ids.append(_id)
+            if len(ids) == self.batch_size:
+                yield self.get_id_condition(ids)
+                ids = []
+        if ids:
+            yield self.get_id_condition(ids)
+
+    def get_id_condition(self, ids):
+        """
+        Returns:
+            _id query condition of sorted ids
+        """
+        if self.shards > 1 or self.incremental_ids is not None:
+            return {'$in': ids}
+        return {'$gte': ids[0], '$lte': ids[-1]}
+
+    def get_recipes_pipeline(self, query_params):
+        """
+        Builds aggregation pipeline reading recipes sorted by _id with
+        only the fields kept in cleansed documents, cleaned_ingredients
+        is read as list of actual_ingredient
+
+        Returns:
+            Pipeline(list)
+        """
+        return [
+            {'$match': query_params},
+            {'$sort': {'_id': 1}},
+            {'$project': dict(
+                (field, 0) for field in IGNORE_FIELDS
+                if field != 'cleaned_ingredients'
+            )},
+            {'$addFields': {
+                'cleaned_ingredients': '$cleaned_ingredients.actual_ingredient'
+            }}
+        ]
+
+    def find_recipes(self, query_params, **kwargs):
+        """
+        Returns:
+            Cursor of recipes read with get_recipes_pipeline
+        """
+        return self.master_db[self.collection_name].aggregate(
+            self.get_recipes_pipeline(query_params), allowDiskUse=True, **kwargs)
+
+    def read_file_recipes(self):
+        """
+        Reads recipes of input file in the shard of this run,
+        cleaned_ingredients is read as list of actual_ingredient
+        same as get_recipes_pipeline
+
+        Returns:
+            Generator of recipes
+        """
+        source = self.query_params.get('source')
+        for recipe in JsonlSource(self.input_file):
+            if source and recipe.get('source') != source:
+                continue
+            if not self.in_shard(recipe):
+                continue
+            if 'cleaned_ingredients' in recipe:
+                recipe['cleaned_ingredients'] = [
+                    i['actual_ingredient'] for i in recipe['cleaned_ingredients']
+                    if 'actual_ingredient' in i
+                ]
+            yield recipe
+
+    def read_recipes(self):
+        """
+        Reads recipes to be parsed in batches of batch_size recipes
+
+        Returns:
+            Generator of recipe lists
+        """
+        if self.input_file:
+            recipes = self.read_file_recipes()
+        elif self.shards > 1 or self.incremental_ids is not None:
+            # Recipes of the shard or incremental run are selected
+            # by reading _id first
+            for id_condition in self.read_id_batches():
+                query_params = dict(self.query_params)
+                query_params['_id'] = id_condition
+                yield list(self.find_recipes(query_params))
+            return
+        else:
+            recipes = MongoSource(
+                self.master_db[self.collection_name],
+                self.get_recipes_pipeline(self.query_params),
+                batch_size=self.batch_size
             )
-            total_records_count = recipes.count()
 
-        logger.info(
-            "Time taken to get recipes from db: %s, TotalRecord: %s",
-            str(datetime.now() - db_start_time)[:-3], total_records_count
+        for batch in iter_batches(recipes, self.batch_size):
+            yield batch
+
+    def parse_recipe_batch(self, recipes):
+        """
+        Returns:
+            List of build_recipe_document results
+        """
+        return [self.build_recipe_document(recipe) for recipe in recipes]
+
+    def parse_recipe_ids(self, id_condition):
+        """
+        Parses recipes matching _id query condition
+
+        Returns:
+            List of build_recipe_document results
+        """
+        query_params = dict(self.query_params)
+        query_params['_id'] = id_condition
+        recipes = self.find_recipes(query_params)
+        return [self.build_recipe_document(recipe) for recipe in recipes]
+
+    def get_worker_pool(self):
+        """
+        Forks worker processes, master data and matchers loaded
+        in this process are shared with the workers
+
+        Returns:
+            multiprocessing Pool
+        """
+        global _worker_tokenizer
+        _worker_tokenizer = self
+        # Workers open their own postgresql connections for reloading
+        close_db_connections()
+        context = multiprocessing.get_context('fork')
+        return context.Pool(
+            self.workers, initializer=_init_worker,
+            initargs=(context.Value('i', 0),)
         )
 
-        load_start_time = datetime.now()
-        records_to_parse = total_records_count
-        deleted_count = 0
-        inserted_count = 0
-        total_ingredients = 0
-        total_ingredients_iter = 0
-        ing_stnd_time = None
-        ing_ext_time = None
-        extracted_data = []
-        ignore_fields = [
-            'ingredients',
-            'cleaned_ingredients',
-            'tokenized_ingredients',
-            'created_at',
-            'updated_at'
-        ]
-        for recipe in recipes:
-            if self.testrun:
-                copy_recipe = {}
-                total_ingredients_iter += 1
-                parsed_data = self.parse_ingredients(recipe)
-                cleansed_ingredients, basic_cleaning_time, extracting_time = parsed_data
-                copy_recipe['tokenized_ingredients'] = cleansed_ingredients
-                copy_recipe['chefd_category'] = self.get_categories(
-                    copy_recipe.get('category', ''),
-                    cleansed_ingredients
-                )
-                copy_recipe['two_ingredients'] = self.is_two_ingredients(
-                    cleansed_ingredients)
-                extracted_data.append(copy_recipe)
-            else:
-                pstart_time = datetime.now()
-                copy_recipe = deepcopy(recipe)
-                for ignore_field in ignore_fields:
-                    if ignore_field in copy_recipe:
-                        copy_recipe.pop(ignore_field)
-
-                ingredients = [i['actual_ingredient']
-                               for i in recipe['cleaned_ingredients']]
-                logger.info(
-                    "Parsing Recipe: %s, Source: %s, Url: %s, IngCounr: %s",
-                    recipe['_id'], recipe['source'], recipe['url'], len(
-                        ingredients)
+    def add_worker_stats(self, worker_result):
+        """
+        Keeps the cache stats of worker process which parsed the batch,
+        stats of the last batch of each worker are summed up in the summary
+
+        Returns:
+            Parsed batch of the worker result
+        """
+        result, pid, cache_stats = worker_result
+        self.worker_stats[pid] = cache_stats
+        return result
+
+    def write_worker_documents(self, worker_result):
+        """Same as write_documents for batches parsed in worker processes"""
+        self.write_documents(self.add_worker_stats(worker_result))
+
+    async def write_worker_documents_async(self, worker_result):
+        """Same as write_documents_async for batches parsed in worker processes"""
+        await self.write_documents_async(self.add_worker_stats(worker_result))
+
+    def parse_recipes(self):
+        """
+        Runs the reader -> parser -> writer pipeline over recipes in db.
+        Parsing is done in worker processes if workers are given,
+        in that case workers read the recipes of _id batches.
+        Recipes of input file are read only in this process
+        """
+        if self.async_io:
+            pipeline = self.parse_recipes_async()
+        elif self.workers > 1 and self.input_file:
+            logger.info("Parsing recipes using %s workers", self.workers)
+            with self.get_worker_pool() as pool:
+                pipeline = Pipeline(
+                    lambda: self.tag_batches(self.read_recipes()),
+                    _parse_recipe_batch,
+                    self.write_worker_documents, queue_size=self.queue_size,
+                    pool=pool, in_flight=self.workers * 2
                 )
-                total_ingredients_iter += len(ingredients)
-                parsed_data = self.parse_ingredients(ingredients)
-                cleansed_ingredients, basic_cleaning_time, extracting_time = parsed_data
-                copy_recipe['chefd_category'] = self.get_categories(
-                    copy_recipe.get('category', ''),
-                    cleansed_ingredients
+                pipeline.run()
+        elif self.workers <= 1:
+            pipeline = Pipeline(
+                self.read_recipes, self.parse_recipe_batch,
+                self.write_documents, queue_size=self.queue_size
+            )
+            pipeline.run()
+        else:
+            logger.info("Parsing recipes using %s workers", self.workers)
+            with self.get_worker_pool() as pool:
+                pipeline = Pipeline(
+                    lambda: self.tag_batches(self.read_id_batches()),
+                    _parse_recipe_ids,
+                    self.write_worker_documents, queue_size=self.queue_size,
+                    pool=pool, in_flight=self.workers * 2
                 )
-                copy_recipe['two_ingredients'] = self.is_two_ingredients(
-                    cleansed_ingredients)
+                pipeline.run()
+
+        for stats in pipeline.stats():
+            logger.info(
+                "PipelineQueue: %s, Depth: %s, MaxDepth: %s, "
+                "PutStall: %ss, GetStall: %ss",
+                stats['name'], stats['depth'], stats['max_depth'],
+                stats['put_stall'], stats['get_stall']
+            )
 
-                if not ing_stnd_time:
-                    ing_stnd_time = basic_cleaning_time
-                else:
-                    ing_stnd_time += basic_cleaning_time
+    def parse_recipes_async(self):
+        """
+        Runs the reader -> parser -> writer pipeline in an event loop.
+        Reading recipes and bulk writes are run in io_threads threads and
+        parsing in worker processes or a thread, so cursor prefetch and
+        write_in_flight bulk writes overlap with parsing
 
-                if not ing_ext_time:
-                    ing_ext_time = extracting_time
+        Returns:
+            Completed AsyncPipeline
+        """
+        io_executor = ThreadPoolExecutor(self.io_threads)
+        # Lines of output file are written in order
+        in_flight = 1 if self.output_file else self.write_in_flight
+        self.async_writer = AsyncBulkWriter(
+            self.writer, io_executor, in_flight=in_flight,
+            on_flushed=self.flush
+        )
+        try:
+            if self.workers <= 1:
+                with ThreadPoolExecutor(1) as parse_executor:
+                    pipeline = AsyncPipeline(
+                        self.read_recipes, self.parse_recipe_batch,
+                        self.write_documents_async, io_executor,
+                        parse_executor=parse_executor, sink=self.async_writer,
+                        prefetch=self.queue_size
+                    )
+                    pipeline.run()
+            else:
+                logger.info("Parsing recipes using %s workers", self.workers)
+                if self.input_file:
+                    reader, parser = self.read_recipes, _parse_recipe_batch
                 else:
-                    ing_ext_time += extracting_time
-                copy_recipe['tokenized_ingredients'] = cleansed_ingredients
-                extracted_data.append(copy_recipe)
-                msg = "Completed Parsing Recipe: %s, IngCounr: %s, ParsedCOunt: %s, "
-                msg += "ParseTime: %s, StandardizingTime: %s, ExtartionTime: %s"
-                logger.info(
-                    msg, recipe['_id'], len(ingredients), len(extracted_data),
-                    str(datetime.now() - pstart_time)[:-3],
-                    str(basic_cleaning_time)[:-3], str(extracting_time)[:-3]
+                    reader, parser = self.read_id_batches, _parse_recipe_ids
+                with self.get_worker_pool() as pool:
+                    pipeline = AsyncPipeline(
+                        lambda: self.tag_batches(reader()), parser,
+                        self.write_worker_documents_async, io_executor,
+                        pool=pool, sink=self.async_writer,
+                        prefetch=self.queue_size, in_flight=self.workers * 2
+                    )
+                    pipeline.run()
+        finally:
+            io_executor.shutdown()
+        return pipeline
+
+    def add_document(self, parsed_data):
+        """
+        Collects parsed recipe document in writer
+
+        Returns:
+            True if write batch size or bytes are reached
+        """
+        copy_recipe, ingredients_count, basic_cleaning_time, extracting_time, \
+            fingerprint = parsed_data
+        self.writer.add(copy_recipe)
+        self.pending_ingredients += ingredients_count
+        self.pending_last_id = copy_recipe['_id']
+        self.pending_fingerprint = fingerprint
+        self.pending_stnd_time += basic_cleaning_time
+        self.pending_ext_time += extracting_time
+        return self.writer.is_full()
+
+    def write_documents(self, parsed_documents):
+        """
+        Collects parsed recipe documents in writer and flushes them
+        when write batch size or bytes are reached
+        """
+        for parsed_data in parsed_documents:
+            if self.add_document(parsed_data):
+                self.flush_pending()
+
+    async def write_documents_async(self, parsed_documents):
+        """
+        Same as write_documents, but flushes are started in async_writer
+        and next documents are collected while they are running
+        """
+        for parsed_data in parsed_documents:
+            if self.add_document(parsed_data):
+                await self.async_writer.flush(self.take_pending())
+
+    def take_pending(self):
+        """
+        Resets the batch counters
+
+        Returns:
+            Batch counters(dict) of documents collected after the last flush
+        """
+        pending = {
+            'ingredients': self.pending_ingredients,
+            'last_id': self.pending_last_id,
+            'fingerprint': self.pending_fingerprint,
+            'load_time': datetime.now() - self.load_start_time,
+            'stnd_time': self.pending_stnd_time,
+            'ext_time': self.pending_ext_time
+        }
+        self.pending_ingredients = 0
+        self.pending_stnd_time = timedelta(0)
+        self.pending_ext_time = timedelta(0)
+        self.load_start_time = datetime.now()
+        return pending
+
+    def flush_pending(self):
+        """Flushes collected documents and resets the batch counters"""
+        pending = self.take_pending()
+        if len(self.writer):
+            self.flush(self.writer.flush(), pending)
+
+    def parse_test_file(self):
+        """
+        Parses test file ingredient texts in batches of batch_size,
+        in worker processes if workers are given.
+        Test run documents are written into writer batch by batch
+        """
+        batches = iter_batches(
+            TextSource(self.test_ingredients_file), self.batch_size)
+        if self.workers <= 1:
+            self.write_test_batches(
+                self.parse_ingredients_batch(batch) for batch in batches)
+        else:
+            with self.get_worker_pool() as pool:
+                self.write_test_batches(
+                    self.add_worker_stats(worker_result)
+                    for worker_result in pool.imap(
+                        _parse_ingredients_batch, self.tag_batches(batches)))
+        self.writer.flush()
+
+    def write_test_batches(self, parsed_batches):
+        """Writes test run documents of parsed ingredient batches"""
+        for batch_no, parsed_data in enumerate(parsed_batches, 1):
+            _cleansed_ingredients, basic_cleaning_time, extracting_time = parsed_data
+            for cleansed_dict in _cleansed_ingredients:
+                self.writer.add(self.build_test_document(cleansed_dict))
+                if self.writer.is_full():
+                    self.writer.flush()
+            self.total_records_count += len(_cleansed_ingredients)
+            logger.info(
+                "Parsed Batch: %s, IngCount: %s, StandardizingTime: %s, ExtractionTime: %s",
+                batch_no, len(_cleansed_ingredients),
+                str(basic_cleaning_time)[:-3], str(extracting_time)[:-3]
+            )
+
+    def flush(self, stats, pending):
+        """
+        Updates counters and checkpoint after a batch of parsed recipes
+        is written, stats is the writer flush stats and pending is
+        the batch counters of take_pending
+        """
+        self.inserted_count += stats['written']
+        self.total_ingredients += pending['ingredients']
+        if self.input_file:
+            # Recipes of input file are counted while parsing
+            self.total_records_count += stats['documents']
+        else:
+            self.records_to_parse -= stats['documents']
+        self.last_flushed_id = pending['last_id']
+        # Master data may be reloaded after the written recipes are parsed
+        self.flushed_fingerprint = pending['fingerprint']
+        if not self.output_file:
+            self.save_checkpoint()
+        msg = "BulkInserted %s records. Total Records: %s, Records to Prase: %s, "
+        msg += "TotalInsertedCount: %s, ParsedIngredients: %s, ParsingTime: %s, "
+        msg += "InsertTime: %s, Bytes: %s, DocsPerSec: %s, BytesPerSec: %s, Retries: %s, "
+        msg += "StandardizingTime: %s, ExtractionTime: %s TimeLapsed: %s"
+        logger.info(
+            msg, stats['documents'], self.total_records_count,
+            self.records_to_parse, self.inserted_count, pending['ingredients'],
+            str(pending['load_time'])[:-3],
+            str(timedelta(seconds=stats['seconds']))[:-3],
+            stats['bytes'],
+            stats['docs_per_sec'], stats['bytes_per_sec'], stats['retries'],
+            str(pending['stnd_time'])[:-3], str(pending['ext_time'])[:-3],
+            str(datetime.now() - self.start_time)[:-3]
+        )
+
+    def build_staging_indexes(self):
+        """
+        Builds indexes of cleansed collection on staging collection
+        after all the records are inserted
+        """
+        index_time = datetime.now()
+        live_collection = self.master_db[self.cleansed_col_name]
+        indexes = []
+        index_keys = []
+        for name, index_info in live_collection.index_information().items():
+            if name == '_id_':
+                continue
+            keys = index_info.pop('key')
+            for option in ('v', 'ns'):
+                index_info.pop(option, None)
+            indexes.append(IndexModel(keys, name=name, **index_info))
+            index_keys.append(keys)
+
+        for keys in CLEANSED_INDEXES:
+            if keys not in index_keys:
+                indexes.append(IndexModel(keys))
+
+        self.master_db[self.staging_col_name].create_indexes(indexes)
+        logger.info(
+            "Built %s indexes on staging collection: %s, Timetaken: %s",
+            len(indexes), self.staging_col_name,
+            str(datetime.now() - index_time)[:-3]
+        )
+
+    def swap_staging(self):
+        """
+        Replaces cleansed collection with staging collection
+        using renameCollection, so readers never see partial data
+        """
+        if not self.inserted_count:
+            logger.info("No records parsed, keeping old records")
+            self.master_db.drop_collection(self.staging_col_name)
+            return
+
+        self.build_staging_indexes()
+        swap_time = datetime.now()
+        self.deleted_count = self.master_db[self.cleansed_col_name].count()
+        self.master_db[self.staging_col_name].rename(
+            self.cleansed_col_name, dropTarget=True)
+        logger.info(
+            "Swapped staging collection: %s to: %s, Replaced : %s Records, Timetaken: %s",
+            self.staging_col_name, self.cleansed_col_name,
+            self.deleted_count, str(datetime.now() - swap_time)[:-3]
+        )
+
+    def get_incremental_ids(self):
+        """
+        Reads _id of recipes updated after the last successful run
+        and recipes having tokens or texts of master data values changed
+        after it. Values deleted or renamed after it are found by comparing
+        with the master data values saved with the run.
+        Values are matched in chunks of CHANGED_VALUES_CHUNK, so queries
+        are kept under the document size limit
+
+        Returns:
+            Sorted list of _id or None if the recipes can't be selected
+        """
+        last_run = self.master_db[RUNS_COLLECTION].find_one(
+            {'_id': self.cleansed_col_name})
+        if not last_run:
+            logger.info("No successful run found, parsing all the recipes")
+            return None
+        if 'masterdata_values' not in last_run:
+            logger.info(
+                "No master data values saved with the last run, "
+                "parsing all the recipes")
+            return None
+
+        last_run_at = last_run['last_run_at']
+        query = dict(self.query_params)
+        query['updated_at'] = {'$gt': last_run_at}
+        ids = set(i['_id'] for i in self.master_db[self.collection_name].find(
+            query, {'_id': 1}))
+        updated_count = len(ids)
+
+        changed_values = get_masterdata_values(last_run_at)
+        removed_values = unpack_values(last_run['masterdata_values']) - \
+            self.masterdata_values
+        changed_values = sorted(changed_values | removed_values)
+        cleansed_collection = self.master_db[self.cleansed_col_name]
+        for i in range(0, len(changed_values), CHANGED_VALUES_CHUNK):
+            values = changed_values[i:i + CHANGED_VALUES_CHUNK]
+            conditions = [
+                {'tokenized_ingredients.tokens.standard_token': {'$in': values}},
+                {'tokenized_ingredients.tokens.token': {'$in': values}},
+                # New values inside texts which are not tokens(ie: 'sea salt'
+                # in unknown token 'coarse sea salt') are found in actual texts
+                {'tokenized_ingredients.actual_ingredient': get_words_re(values)}
+            ]
+            ids.update(i['_id'] for i in cleansed_collection.find(
+                {'$or': conditions}, {'_id': 1}))
+        logger.info(
+            "Incremental run since: %s, ChangedMasterValues: %s, "
+            "RemovedMasterValues: %s, UpdatedRecipes: %s, AffectedRecipes: %s",
+            last_run_at, len(changed_values), len(removed_values),
+            updated_count, len(ids) - updated_count
+        )
+        return sorted(ids)
+
+    def save_run(self):
+        """Saves start time of this run as the last successful run"""
+        self.master_db[RUNS_COLLECTION].replace_one(
+            {'_id': self.cleansed_col_name},
+            {
+                '_id': self.cleansed_col_name,
+                'last_run_at': self.run_started_at,
+                'collection_name': self.collection_name,
+                'source': self.source,
+                'incremental': self.incremental,
+                'masterdata_values': pack_values(self.masterdata_values)
+            },
+            upsert=True
+        )
+
+    def get_shard_col_name(self, shard):
+        """
+        Returns:
+            Staging collection name of shard
+        """
+        return '%s_staging_%s_of_%s' % (self.cleansed_col_name, shard, self.shards)
+
+    def save_shard_run(self):
+        """
+        Marks shard of this run as completed, finalize merges
+        only when all the shards are completed
+        """
+        self.master_db[RUNS_COLLECTION].replace_one(
+            {'_id': self.staging_col_name},
+            {
+                '_id': self.staging_col_name,
+                'last_run_at': self.run_started_at,
+                'shard': self.shard,
+                'shards': self.shards,
+                'shard_key': self.shard_key,
+                'fingerprint': self.flushed_fingerprint,
+                'masterdata_values': pack_values(self.masterdata_values),
+                'inserted_count': self.inserted_count
+            },
+            upsert=True
+        )
+        logger.info(
+            "Completed Shard: %s of %s, InsertedCount: %s, "
+            "run with --finalize after all the shards are completed",
+            self.shard, self.shards, self.inserted_count
+        )
+
+    def finalize_shards(self):
+        """
+        Merges staging collections of all the shards into one staging
+        collection and swaps it with cleansed collection
+        """
+        runs_collection = self.master_db[RUNS_COLLECTION]
+        shard_runs = []
+        for shard in range(self.shards):
+            shard_run = runs_collection.find_one(
+                {'_id': self.get_shard_col_name(shard)})
+            if not shard_run:
+                logger.error(
+                    "Shard: %s of %s is not completed, not finalizing",
+                    shard, self.shards
                 )
+                return
+            shard_runs.append(shard_run)
+
+        if len(set(i['fingerprint'] for i in shard_runs)) > 1:
+            logger.error(
+                "Shards are parsed with different master data, not finalizing")
+            return
+
+        merge_time = datetime.now()
+        self.staging_col_name = self.cleansed_col_name + '_staging'
+        self.master_db.drop_collection(self.staging_col_name)
+        writer = BulkWriter(
+            self.master_db[self.staging_col_name],
+            batch_size=self.write_batch_size,
+            batch_bytes=self.write_batch_bytes,
+            write_concern=self.write_concern,
+            retries=self.write_retries,
+            logger=logger
+        )
+        for shard_run in shard_runs:
+            for document in self.master_db[shard_run['_id']].find():
+                writer.add(document)
+                if writer.is_full():
+                    self.inserted_count += writer.flush()['written']
+        self.inserted_count += writer.flush()['written']
+        logger.info(
+            "Merged %s shards into staging collection: %s, Records: %s, Timetaken: %s",
+            self.shards, self.staging_col_name, self.inserted_count,
+            str(datetime.now() - merge_time)[:-3]
+        )
 
-            records_to_parse -= 1
-            if (len(extracted_data) == 1000 or records_to_parse == 0) and not self.testrun:
-                load_time = datetime.now() - load_start_time
-                insert_start_time = datetime.now()
-                if deleted_count == 0:
-                    delete_time = datetime.now()
-                    logger.info("Started Deleting old records")
-                    del_obj = self.master_db[self.cleansed_col_name].delete_many({
-                    })
-                    deleted_count = del_obj.deleted_count
-                    logger.info(
-                        "Completed Deleting old records. Deleted : %s Records, Timetaken: %s",
-                        deleted_count, str(datetime.now() - delete_time)[:-3]
-                    )
+        self.swap_staging()
+        for shard_run in shard_runs:
+            self.master_db.drop_collection(shard_run['_id'])
+            runs_collection.delete_one({'_id': shard_run['_id']})
 
-                ins_obj = self.master_db[self.cleansed_col_name].insert_many(
-                    extracted_data)
-                inserted_count += len(ins_obj.inserted_ids)
-                total_ingredients += total_ingredients_iter
-                msg = "BulkInserted %s records. Total Records: %s, Records to Prase: %s, "
-                msg += "TotalInsertedCount: %s, ParsedIngredients: %s, ParsingTime: %s, "
-                msg += "InsertTime: %s, StandardizingTime: %s, ExtractionTime: %s "
-                msg += "TimeLapsed: %s"
-                logger.info(
-                    msg, len(extracted_data), total_records_count,
-                    records_to_parse, inserted_count, total_ingredients_iter,
-                    str(load_time)[:-3], str(datetime.now() -
-                                             insert_start_time)[:-3],
-                    str(ing_stnd_time)[:-3], str(ing_ext_time)[:-3],
-                    str(datetime.now() - self.start_time)[:-3]
+        # Changes made while the first shard was running
+        # are parsed in the next incremental run
+        first_run = min(shard_runs, key=itemgetter('last_run_at'))
+        self.run_started_at = first_run['last_run_at']
+        self.masterdata_values = unpack_values(first_run['masterdata_values'])
+        self.save_run()
+
+    def get_checkpoint_file(self):
+        return os.path.join(
+            DATADIR, 'checkpoint_%s.json' % self.staging_col_name)
+
+    def get_run_config(self):
+        """
+        Returns:
+            Options(dict) which should be same for resuming a run
+        """
+        return {
+            'collection_name': self.collection_name,
+            'cleansed_collection_name': self.cleansed_col_name,
+            'source': self.source,
+            'incremental': self.incremental,
+            'shard': self.shard,
+            'shards': self.shards,
+            'shard_key': self.shard_key
+        }
+
+    def save_checkpoint(self):
+        """
+        Saves last flushed _id and counters of this run,
+        so the run can be resumed after a crash
+        """
+        checkpoint = {
+            'last_id': self.last_flushed_id,
+            'run_started_at': self.run_started_at,
+            'saved_at': datetime.utcnow(),
+            'fingerprint': self.flushed_fingerprint,
+            'config': self.get_run_config(),
+            'records_parsed': self.total_records_count - self.records_to_parse,
+            'inserted_count': self.inserted_count,
+            'total_ingredients': self.total_ingredients
+        }
+        checkpoint_file = self.get_checkpoint_file()
+        with open(checkpoint_file + '.tmp', 'w') as f:
+            f.write(json_util.dumps(checkpoint))
+        os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+    def load_checkpoint(self):
+        """
+        Loads checkpoint of the run to be resumed
+
+        Returns:
+            Checkpoint(dict) or None if the run can't be resumed
+        """
+        checkpoint_file = self.get_checkpoint_file()
+        if not os.path.isfile(checkpoint_file):
+            logger.error("No checkpoint found: %s", checkpoint_file)
+            return None
+
+        with open(checkpoint_file) as f:
+            checkpoint = json_util.loads(f.read())
+
+        if checkpoint['fingerprint'] != self.masterdata_fingerprint:
+            logger.error(
+                "Master data changed after checkpoint saved at: %s, "
+                "not resuming. Rerun with out --resume",
+                checkpoint['saved_at']
+            )
+            return None
+
+        if checkpoint['config'] != self.get_run_config():
+            logger.error(
+                "Checkpoint is saved with different options: %s, not resuming",
+                checkpoint['config']
+            )
+            return None
+        return checkpoint
+
+    def clean_ingredients(self):
+        """
+        This is the main function where the tokenization starts
+        """
+        logger.info(
+            "Started cleansing process, Starttime: %s, IsTestrun: %s, Workers: %s, "
+            "Shard: %s of %s",
+            str(self.start_time), self.testrun, self.workers,
+            self.shard, self.shards
+        )
+        self.deleted_count = 0
+        self.inserted_count = 0
+        if self.finalize:
+            self.finalize_shards()
+            self.master_db.client.close()
+            self.ing_db.client.close()
+            logger.info("Time taken for script to complete: %s",
+                        str(datetime.now() - self.start_time))
+            return
+
+        self.load_masterdata()
+        self.flushed_fingerprint = self.masterdata_fingerprint
+
+        # Master data and recipes changed while running are parsed again
+        # in the next incremental run, so start time is saved for the run
+        self.run_started_at = datetime.utcnow()
+        self.query_params = {}
+        if self.source:
+            self.query_params["source"] = self.source.strip()
+
+        if not self.testrun and not self.output_file:
+            # Values are saved with the run, so values deleted or renamed
+            # before the next incremental run are found
+            self.masterdata_values = get_masterdata_values()
+        if self.incremental and not self.testrun:
+            self.incremental_ids = self.get_incremental_ids()
+            if self.incremental_ids is None:
+                self.incremental = False
+
+        self.total_records_count = 0
+        self.total_ingredients = 0
+        # Full run is loaded into staging collection and swapped at the end,
+        # sharded run is loaded into staging collection of the shard
+        if self.shards > 1:
+            self.staging_col_name = self.get_shard_col_name(self.shard)
+        else:
+            self.staging_col_name = self.cleansed_col_name + '_staging'
+        checkpoint = None
+        if self.resume and not self.testrun:
+            checkpoint = self.load_checkpoint()
+            if checkpoint is None:
+                self.master_db.client.close()
+                self.ing_db.client.close()
+                return
+
+            # Continuing with recipes after the last flushed recipe
+            self.last_flushed_id = checkpoint['last_id']
+            self.run_started_at = checkpoint['run_started_at']
+            self.inserted_count = checkpoint['inserted_count']
+            self.total_ingredients = checkpoint['total_ingredients']
+            self.query_params['_id'] = {'$gt': self.last_flushed_id}
+            if self.incremental_ids is not None:
+                self.incremental_ids = [
+                    i for i in self.incremental_ids if i > self.last_flushed_id]
+            logger.info(
+                "Resuming from checkpoint saved at: %s, LastId: %s, ParsedRecords: %s",
+                checkpoint['saved_at'], self.last_flushed_id,
+                checkpoint['records_parsed']
+            )
+
+        db_start_time = datetime.now()
+        if self.testrun or self.input_file:
+            # Records of files are counted while parsing
+            pass
+        elif self.shards > 1 or self.incremental_ids is not None:
+            self.total_records_count = sum(1 for _ in self.read_shard_ids())
+        else:
+            self.total_records_count = self.master_db[self.collection_name].find(
+                self.query_params).count()
+
+        logger.info(
+            "Time taken to get recipes from db: %s, TotalRecord: %s",
+            str(datetime.now() - db_start_time)[:-3], self.total_records_count
+        )
+
+        if self.testrun:
+            if self.test_ingredients_file == STDIO_PATH or \
+                    os.path.isfile(self.test_ingredients_file):
+                if self.output_file:
+                    writer_class, output_file = JsonlSink, self.output_file
+                else:
+                    writer_class, output_file = JsonArraySink, os.path.join(
+                        DATADIR, 'tokenizeIngredients.json')
+                self.writer = writer_class(
+                    output_file,
+                    batch_size=self.write_batch_size,
+                    batch_bytes=self.write_batch_bytes
+                )
+                self.parse_test_file()
+                self.writer.close()
+                self.total_ingredients = self.total_records_count
+        else:
+            self.records_to_parse = self.total_records_count
+            if checkpoint:
+                self.total_records_count += checkpoint['records_parsed']
+
+            if self.output_file:
+                self.writer = JsonlSink(
+                    self.output_file,
+                    batch_size=self.write_batch_size,
+                    batch_bytes=self.write_batch_bytes
                 )
-                extracted_data, total_ingredients_iter = [], 0
-                ing_stnd_time, ing_ext_time = None, None
-                load_start_time = datetime.now()
+            elif self.incremental:
+                # Replacing only parsed recipes in incremental run
+                write_col_name = self.cleansed_col_name
+            elif checkpoint:
+                # Removing recipes written after the checkpoint is saved
+                write_col_name = self.staging_col_name
+                self.master_db[write_col_name].delete_many(
+                    {'_id': {'$gt': self.last_flushed_id}})
+            else:
+                self.master_db[RUNS_COLLECTION].delete_one(
+                    {'_id': self.staging_col_name})
+                self.master_db.drop_collection(self.staging_col_name)
+                write_col_name = self.staging_col_name
+            if not self.output_file:
+                self.writer = BulkWriter(
+                    self.master_db[write_col_name],
+                    batch_size=self.write_batch_size,
+                    batch_bytes=self.write_batch_bytes,
+                    upsert=self.incremental,
+                    write_concern=self.write_concern,
+                    retries=self.write_retries,
+                    logger=logger
+                )
+
+            # flush_pending also resets the batch counters
+            self.flush_pending()
+            self.parse_recipes()
+            self.flush_pending()
+            if self.output_file:
+                self.writer.close()
+            elif self.incremental:
+                self.save_run()
+            elif self.shards > 1:
+                self.save_shard_run()
+            else:
+                self.swap_staging()
+                self.save_run()
+
+            if os.path.isfile(self.get_checkpoint_file()):
+                os.remove(self.get_checkpoint_file())
 
         self.master_db.client.close()
         self.ing_db.client.close()
         logger.info(
             "Total Recipes: %s, Total Ingredients: %s, DeletedCount: %s, InsertedCount: %s",
-            total_records_count,
-            total_ingredients,
-            deleted_count,
-            inserted_count
+            self.total_records_count,
+            self.total_ingredients,
+            self.deleted_count,
+            self.inserted_count
         )
-
-        if extracted_data and self.testrun:
-            outfile = os.path.join(DATADIR, 'tokenizeIngredients.json')
-            with open(outfile, 'w') as f:
-                f.write(json.dumps(extracted_data))
+        # Caches of this process are not used if recipes are parsed in workers
+        if self.worker_stats:
+            cache_stats = sum_cache_stats(self.worker_stats.values())
+        else:
+            cache_stats = get_cache_stats(self.parse_cache)
+        stats = cache_stats['pattern_cache']
+        logger.info(
+            "PatternCache Hits: %s, Misses: %s, Evictions: %s, Size: %s, HitRate: %s%%",
+            stats['hits'], stats['misses'], stats['evictions'],
+            stats['size'], stats['hit_rate']
+        )
+        if 'parse_cache' in cache_stats:
+            stats = cache_stats['parse_cache']
+            logger.info(
+                "ParseCache Hits: %s, DiskHits: %s, Misses: %s, Size: %s, HitRate: %s%%",
+                stats['hits'], stats['disk_hits'],
+                stats['misses'], stats['size'], stats['hit_rate']
+            )
+        if self.parse_cache is not None:
+            self.parse_cache.close()
 
         logger.info("Time taken for script to complete: %s",
                     str(datetime.now() - self.start_time))
 
 
-if __name__ == '__main__':
+def pack_values(values):
+    """
+    Returns:
+        Compressed values(Binary) to be saved in run documents
+    """
+    return Binary(zlib.compress('\n'.join(sorted(values)).encode('utf-8')))
+
+
+def unpack_values(data):
+    """
+    Returns:
+        Values(set) of pack_values data
+    """
+    values = set(zlib.decompress(data).decode('utf-8').split('\n'))
+    values.discard('')
+    return values
+
+
+def get_cache_stats(parse_cache):
+    """
+    Returns:
+        Stats(dict) of pattern cache and of parse_cache if it is given
+    """
+    cache_stats = {'pattern_cache': pattern_cache.stats()}
+    if parse_cache is not None:
+        cache_stats['parse_cache'] = parse_cache.stats()
+    return cache_stats
+
+
+def sum_cache_stats(worker_stats):
+    """
+    Sums up cache stats of worker processes, sizes are summed as
+    each worker has its own caches
+
+    Returns:
+        Stats(dict) in the get_cache_stats format
+    """
+    total_stats = {}
+    for cache_stats in worker_stats:
+        for name, stats in cache_stats.items():
+            total = total_stats.setdefault(name, {})
+            for key, value in stats.items():
+                if key != 'hit_rate':
+                    total[key] = total.get(key, 0) + value
+    for total in total_stats.values():
+        hits = total['hits'] + total.get('disk_hits', 0)
+        lookups = hits + total['misses']
+        total['hit_rate'] = round(hits * 100.0 / lookups, 2) if lookups else 0.0
+    return total_stats
+
+
+def _init_worker(worker_counter):
+    """
+    Initializes forked worker process, mongo connection and
+    cache file are not shared with the parent process.
+    Shelve file can't be written by many processes, so each worker
+    has its own cache file suffixed with its worker number
+    (ie: parsed.cache.1), which is reused by the same worker of next runs
+    """
+    with worker_counter.get_lock():
+        worker_counter.value += 1
+        worker_no = worker_counter.value
+    tokenizer = _worker_tokenizer
+    tokenizer.master_db = get_master_mongo_conn()
+    # Master data is reloaded by the parent process, see tag_batches
+    tokenizer.reload_interval = 0
+    # Workers count their own cache stats, see _worker_result
+    pattern_cache.reset_stats()
+    if tokenizer.parse_cache is not None:
+        cache_file = None
+        if tokenizer.cache_file:
+            cache_file = '%s.%s' % (tokenizer.cache_file, worker_no)
+        tokenizer.parse_cache = ParseCache(
+            tokenizer.parse_cache.fingerprint,
+            maxsize=tokenizer.parse_cache.maxsize,
+            cache_file=cache_file
+        )
+
+
+def _worker_result(result):
+    """
+    Returns:
+        Tuple of result, worker pid and cache stats of the worker process,
+        see TokenizeIngredients.add_worker_stats
+    """
+    return result, os.getpid(), get_cache_stats(_worker_tokenizer.parse_cache)
+
+
+def _follow_masterdata(tagged_batch):
+    """
+    Loads master data revision which the batch is tagged with
+
+    Returns:
+        Batch to be parsed
+    """
+    revision, fingerprint, batch = tagged_batch
+    _worker_tokenizer.follow_masterdata(revision, fingerprint)
+    return batch
+
+
+def _parse_recipe_ids(tagged_batch):
+    return _worker_result(
+        _worker_tokenizer.parse_recipe_ids(_follow_masterdata(tagged_batch)))
+
+
+def _parse_recipe_batch(tagged_batch):
+    return _worker_result(
+        _worker_tokenizer.parse_recipe_batch(_follow_masterdata(tagged_batch)))
+
+
+def _parse_ingredients_batch(tagged_batch):
+    return _worker_result(
+        _worker_tokenizer.parse_ingredients_batch(
+            _follow_masterdata(tagged_batch)))
+
+
+def get_arg_parser():
+    """
+    Returns:
+        ArgumentParser of the command line options
+    """
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
@@ -1216,8 +2282,165 @@ if __name__ == '__main__':
         "-f", "--test-file", dest="test_file",
         metavar="FILE",
         default="test_ingredients_file.txt",
-        help="Test Ingredients file"
+        help="Test Ingredients file, - reads stdin"
+    )
+    parser.add_argument(
+        "--input", dest="input_file",
+        metavar="FILE", default=None,
+        help="JSON lines file of recipes(ie: mongoexport output) "
+             "read instead of the collection, - reads stdin"
+    )
+    parser.add_argument(
+        "--output", dest="output_file",
+        metavar="FILE", default=None,
+        help="JSON lines file cleansed documents are written to instead of "
+             "the cleansed collection, - writes stdout. "
+             "Test run writes JSON array to data/tokenizeIngredients.json "
+             "by default"
+    )
+    parser.add_argument(
+        "--matcher", dest="matcher",
+        choices=["trie", "regex"], default="trie",
+        help="Matcher used for finding ingredientMaster values, "
+             "regex is the old alternation regex kept for parity testing"
+    )
+    parser.add_argument(
+        "--batch-size", dest="batch_size",
+        type=int, default=1000,
+        help="Number of recipes or test file ingredient texts parsed in a batch"
+    )
+    parser.add_argument(
+        "-w", "--workers", dest="workers",
+        type=int, default=1,
+        help="Number of worker processes used for parsing, "
+             "recipes are given to workers in _id ranges of batch size"
+    )
+    parser.add_argument(
+        "--queue-size", dest="queue_size",
+        type=int, default=4,
+        help="Number of batches buffered between reading, "
+             "parsing and writing recipes"
+    )
+    parser.add_argument(
+        "--async-io", dest="async_io",
+        action="store_true", default=False,
+        help="Run mongo reads and bulk writes in threads driven by an "
+             "event loop, overlapping them with parsing"
+    )
+    parser.add_argument(
+        "--io-threads", dest="io_threads",
+        type=int, default=4,
+        help="Number of threads running mongo reads and bulk writes, "
+             "used only with --async-io"
+    )
+    parser.add_argument(
+        "--write-in-flight", dest="write_in_flight",
+        type=int, default=2,
+        help="Max number of bulk writes running at a time, "
+             "used only with --async-io"
+    )
+    parser.add_argument(
+        "--shard", dest="shard",
+        type=int, default=0,
+        help="Shard of recipes parsed by this run, from 0 to shards - 1"
+    )
+    parser.add_argument(
+        "--shards", dest="shards",
+        type=int, default=1,
+        help="Number of shards recipes are partitioned into by crc32 of "
+             "shard key, each shard is loaded into its own staging collection"
+    )
+    parser.add_argument(
+        "--shard-key", dest="shard_key",
+        choices=["_id", "source"], default="_id",
+        help="Recipe field used for partitioning recipes into shards"
+    )
+    parser.add_argument(
+        "--finalize", dest="finalize",
+        action="store_true", default=False,
+        help="Merge staging collections of all the shards "
+             "and swap them with cleansed collection"
+    )
+    parser.add_argument(
+        "--resume", dest="resume",
+        action="store_true", default=False,
+        help="Resume the run from its last checkpoint, "
+             "refused if master data is changed after the checkpoint"
     )
+    parser.add_argument(
+        "-i", "--incremental", dest="incremental",
+        action="store_true", default=False,
+        help="Parse only recipes updated after the last successful run "
+             "and recipes having ingredient and characteristic values "
+             "added, changed, renamed or deleted after it in their tokens "
+             "or ingredient texts. Values found in texts only after "
+             "standardizing(ie: irregular plurals) and changes of sizes and "
+             "patterns are not detected, full run is needed for them"
+    )
+    parser.add_argument(
+        "--write-batch-size", dest="write_batch_size",
+        type=int, default=1000,
+        help="Max number of documents written in a bulk write"
+    )
+    parser.add_argument(
+        "--write-batch-bytes", dest="write_batch_bytes",
+        type=int, default=16 * 1024 * 1024,
+        help="Max approximate BSON bytes of documents written in a bulk write"
+    )
+    parser.add_argument(
+        "--write-concern", dest="write_concern",
+        default=None,
+        help="Write concern w of bulk writes, ie: 1 or majority. "
+             "Server default is used if not given"
+    )
+    parser.add_argument(
+        "--write-timeout", dest="write_timeout",
+        type=int, default=None,
+        help="Write concern wtimeout of bulk writes in milliseconds"
+    )
+    parser.add_argument(
+        "--write-retries", dest="write_retries",
+        type=int, default=3,
+        help="Number of times a bulk write failed with "
+             "transient error is retried"
+    )
+    parser.add_argument(
+        "--no-snapshot", dest="use_snapshot",
+        action="store_false", default=True,
+        help="Load master data from db and build the matchers "
+             "with out using or saving the master data snapshot"
+    )
+    parser.add_argument(
+        "--reload-interval", dest="reload_interval",
+        type=float, default=0,
+        help="Seconds between checks of master data revision, master data "
+             "is reloaded while parsing if it is changed. 0 disables reloading"
+    )
+    parser.add_argument(
+        "--cache-size", dest="cache_size",
+        type=int, default=0,
+        help="Number of parsed ingredient texts cached in memory, "
+             "repeated texts are parsed only once. 0 disables the cache"
+    )
+    parser.add_argument(
+        "--cache-file", dest="cache_file",
+        metavar="FILE", default=None,
+        help="Shelve file to keep parsed ingredient texts across runs, "
+             "used only with --cache-size. Each worker process has its own "
+             "file suffixed with its worker number(ie: FILE.1)"
+    )
+    return parser
 
+
+if __name__ == '__main__':
+    parser = get_arg_parser()
     args = parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard should be from 0 to --shards - 1")
+    if args.shards > 1 and args.incremental:
+        parser.error("--incremental can't be used with --shards")
+    if (args.input_file or args.output_file) and \
+            (args.incremental or args.resume or args.finalize):
+        parser.error("--incremental, --resume and --finalize "
+                     "can't be used with --input or --output")
     TokenizeIngredients(args)
@@ -2,10 +2,12 @@
 Common methods used in Ingredients research
 """
 
+import hashlib
 import logging
 import os
 import sys
 import re
+import resource
 import time
 import pymongo
 from collections import OrderedDict
@@ -22,8 +24,14 @@ PROJECT = os.path.split(BASEDIR)[-1]
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "%s.settings" % PROJECT)
 django.setup()
 
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max
+from django.utils import timezone
 from masterdata.models import Characteristic, CharacteristicType, \
-    Ingredient, State, Category, Group, IngredientConversion
+    Ingredient, State, Category, Group, Size, IngredientConversion, \
+    Pattern, MasterdataRevision, MASTERDATA_REVISION_ID
+from matchers import build_matcher
 
 
 def _print_array(data):
@@ -101,6 +109,96 @@ def get_logger(name):
     return logger
 
 
+class PatternCache(object):
+    """
+    Bounded cache of compiled regex patterns.
+
+    re module caches only few hundred patterns, per value patterns
+    built while tokenizing overflows it and every pattern gets recompiled.
+    """
+
+    def __init__(self, maxsize=20000):
+        self.maxsize = maxsize
+        self.patterns = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, pattern, flags=0):
+        """
+        Gets compiled pattern from cache, compiles and caches it if missing
+
+        Returns:
+            Compiled pattern
+        """
+        try:
+            compiled = self.patterns[key]
+        except KeyError:
+            self.misses += 1
+            compiled = re.compile(pattern(), flags)
+            self.patterns[key] = compiled
+            if len(self.patterns) > self.maxsize:
+                self.patterns.popitem(last=False)
+                self.evictions += 1
+            return compiled
+
+        self.hits += 1
+        self.patterns.move_to_end(key)
+        return compiled
+
+    def compile(self, pattern, flags=0):
+        """Cached re.compile"""
+        return self.get((pattern, flags), lambda: pattern, flags)
+
+    def boundary_re(self, value, before_char_re, after_char_re):
+        """
+        Pattern to match value in between before_char_re and after_char_re
+        ie: (?<=[\\s,])(value)(?=[\\s,])
+        """
+        return self.get(
+            ('boundary', value, before_char_re, after_char_re),
+            lambda: r'(?<={})({})(?={})'.format(
+                before_char_re, value, after_char_re),
+            re.IGNORECASE
+        )
+
+    def token_re(self, value, before_char_re, after_char_re):
+        """
+        Pattern to match a token which is value with optional
+        before_char_re and after_char_re characters
+        """
+        return self.get(
+            ('token', value, before_char_re, after_char_re),
+            lambda: r'^\s?{}({}){}\s?$'.format(
+                before_char_re, value, after_char_re),
+            re.IGNORECASE
+        )
+
+    def reset_stats(self):
+        """Resets the counters, compiled patterns are kept"""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns:
+            Cache counters(dict) for logging
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.patterns),
+            'hit_rate': round(self.hits * 100.0 / lookups, 2) if lookups else 0.0
+        }
+
+
+# Shared cache used by the tokenizer
+pattern_cache = PatternCache()
+
+
 def convert_to_float(value, digits=2):
     """
     Converts int or string of fractions to float
@@ -125,114 +223,168 @@ def convert_datatype(val):
     return val
 
 
+class StringReplacer(object):
+    """
+    Replaces alternative values in ingredient text with their standard values
+    in a single pass over the text
+    """
+
+    def __init__(self, replace_strings, before_char_re, after_char_re,
+                 use_trie=True):
+        self.replace_strings = replace_strings
+        stnd_values = sorted(
+            replace_strings.keys(),
+            key=lambda x: len(x),
+            reverse=True
+        )
+        self.matcher = build_matcher(
+            stnd_values, before_char_re, after_char_re, use_trie=use_trie)
+
+    def replace(self, ingredient):
+        """
+        Replaces all the matched alternative values in ingredient text
+
+        Returns:
+            Replaced text and replaced values(dict)
+        """
+        tokens_replaced = {}
+        replaced_strs = set()
+        parts = []
+        last_end = 0
+        for start, end in self.matcher.spans(ingredient):
+            matched_str = ingredient[start:end]
+            replace_str = matched_str.strip()
+            # Regex values(ie: 'tbsp.') can match surrounding spaces,
+            # keeping them as only replace_str is replaced
+            start += len(matched_str) - len(matched_str.lstrip())
+            end -= len(matched_str) - len(matched_str.rstrip())
+            stnd_str = self.replace_strings.get(replace_str, None)
+            if not stnd_str:
+                stnd_str = self.replace_strings.get(replace_str.lower(), None)
+                if not stnd_str:
+                    continue
+
+            parts.append(ingredient[last_end:start])
+            parts.append(stnd_str)
+            last_end = end
+            if replace_str.lower() not in replaced_strs:
+                # Keeping the first occurrence as reference
+                replaced_strs.add(replace_str.lower())
+                tokens_replaced[stnd_str] = replace_str
+
+        parts.append(ingredient[last_end:])
+        return "".join(parts), tokens_replaced
+
+
 def standardize_ingredient(ingredient,
                            replace_strings='',
                            before_char_re='',
                            after_char_re='',
-                           cleaning_func=''):
+                           cleaning_func='',
+                           replacer=None):
     """
     Standardizes ingredient text
+    replacer(StringReplacer) should be built once and passed by callers
+    standardizing many texts, it is built from replace_strings if missing
 
     Returns:
         Standardized text and replaced values(dict) for reference
     """
-    tokens_replaced = {}
+    if replacer is None:
+        replacer = StringReplacer(
+            replace_strings, before_char_re, after_char_re)
+
     ingredient = cleaning_func(ingredient, replace_special_chars=True)
     ingredient = ' ' + ingredient.strip() + ' '
+    ingredient, tokens_replaced = replacer.replace(ingredient)
+    if tokens_replaced:
+        ingredient = cleaning_func(ingredient)
+    return ingredient, tokens_replaced
 
-    # Repalcing strings in replace_strings dict
-    stnd_values = sorted(
-        replace_strings.keys(),
-        key=lambda x: len(x),
-        reverse=True
-    )
-
-    match_str = "|".join(stnd_values)
-    replace_re = re.compile(
-        r'(?<={})({})(?={})'.format(
-            before_char_re,
-            match_str, after_char_re
-        ),
-        re.IGNORECASE
-    )
-    for replace_str in replace_re.findall(ingredient):
-        replace_str = replace_str.strip()
-        stnd_str = replace_strings.get(replace_str, None)
-        if not stnd_str:
-            stnd_str = replace_strings.get(replace_str.lower(), None)
-            if not stnd_str:
-                continue
 
-        ingredient = ' ' + ingredient.strip() + ' '
-        """
-        # To check if standard token already exits in the text
-        stnd_re = re.compile(
-            r'(?<={})({})(?={})'.format(
-                before_char_re,
-                stnd_str, after_char_re
-            ),
-            re.IGNORECASE
-        )
-        if stnd_re.search(ingredient):
-            ingredient = stnd_re.sub('#standtoken#', ingredient)
-            ingredient = ' ' + cleaning_func(ingredient) + ' '
-        """
+class ConversionIndex(object):
+    """
+    Cup per unit of ingredient conversions keyed by
+    (ingredient, preparation or form, size).
 
-        # re to replace strings
-        replace_re = re.compile(
-            r'(?<={})({})(?={})'.format(
-                before_char_re,
-                replace_str, after_char_re
-            ),
-            re.IGNORECASE
-        )
+    Preparation is looked up if the ingredient has conversions of it,
+    otherwise form, same as the fallback of the old nested dict
+    """
 
-        if replace_re.search(ingredient):
-            ingredient = replace_re.sub(stnd_str, ingredient)
-            tokens_replaced[stnd_str] = replace_str
+    def __init__(self):
+        self.cup_per_unit = {}
+        # (ingredient, preparation) of all the conversions
+        self.preps = set()
+        self.ingredients = set()
+        self._match_re = None
 
-        #Re substituing standtoken#
-        ingredient = ingredient.replace('#standtoken#', stnd_str)
-        ingredient = cleaning_func(ingredient)
-    return ingredient, tokens_replaced
+    def __contains__(self, ingredient):
+        return ingredient in self.ingredients
+
+    def __len__(self):
+        return len(self.cup_per_unit)
+
+    def add(self, ingredient, prep, size, cup_per_unit):
+        self.ingredients.add(ingredient)
+        self.preps.add((ingredient, prep))
+        self.cup_per_unit[(ingredient, prep, size)] = convert_to_float(
+            cup_per_unit, digits=3)
+
+    def get(self, ingredient, prep, form, size):
+        """
+        Returns:
+            Cup per unit(float) or None if there is no conversion
+        """
+        if (ingredient, prep) not in self.preps:
+            prep = form
+        return self.cup_per_unit.get((ingredient, prep, size))
+
+    @property
+    def match_re(self):
+        """
+        Regex matching any of the conversion ingredients,
+        compiled only when it is used
+        """
+        if self._match_re is None:
+            ingredients = sorted(
+                self.ingredients,
+                key=lambda x: len(x),
+                reverse=True
+            )
+            self._match_re = re.compile(
+                r'({})'.format("|".join(ingredients)), re.IGNORECASE)
+        return self._match_re
 
 
 def get_conversions_data(ing_db):
-    """Gets Conversion data from postgresql"""
-    ingredients = set()
-    ing_conversion = {}
-    for record in IngredientConversion.objects.all():
-        for ing in record.ingredient.split('; '):
+    """
+    Gets Conversion data from postgresql
+
+    Returns:
+        ConversionIndex
+    """
+    conversions = ConversionIndex()
+    records = IngredientConversion.objects.values_list(
+        'ingredient', 'preparation', 'size', 'cup_per_unit')
+    for ingredients, preparation, size, cup_per_unit in records:
+        preps = [i for i in preparation.split('; ') if i.strip()]
+        if not preps:
+            preps = ['']
+
+        for ing in ingredients.split('; '):
             ing = xencode(ing.strip().lower())
             if not ing:
                 continue
 
-            ingredients.add(ing)
-            preps = [i for i in record.preparation.split('; ') if i.strip()]
-            if not preps:
-                preps = ['']
-
             for prep in preps:
-                ing_dict = ing_conversion.setdefault(ing, {})
-                ing_prep = ing_dict.setdefault(prep, {})
-                ing_size = ing_prep.setdefault(record.size, {})
-                ing_size['form'] = record.form
-                ing_size['cup_per_unit'] = record.cup_per_unit
-                ing_size['category'] = record.category
-
-    ingredients = sorted(
-        list(ingredients),
-        key=lambda x: len(x),
-        reverse=True
-    )
-    matched_str = "|".join(ingredients)
-    match_re = re.compile(r'({})'.format(matched_str), re.IGNORECASE)
-    return match_re, ing_conversion
-
-
-def get_ingredientmaster_values():
+                conversions.add(ing, prep, size, cup_per_unit)
+    return conversions
+
+
+def get_ingredientmaster_values(chunk_size=2000):
     """
-    This function gets the data from ingredientMaster collections
+    This function gets the data from ingredientMaster collections,
+    records are read in chunks of chunk_size
 
     Returns:
         replace_strings(dict): alternative values used for standardizing
@@ -257,119 +409,62 @@ def get_ingredientmaster_values():
     state_uom_chart = {}
     valid_skus = {}
 
-    # ingredient dictionary
-    for i in Ingredient.objects.all().\
-            select_related('category', 'state', 'group'):
-        rec_value = i.name
-        if isinstance(rec_value, bytes):
-            rec_value = unidecode(rec_value.decode('utf-8')).strip().lower()
-        else:
-            rec_value = unidecode(rec_value).strip().lower()
-
-        # Removing special char \xc2\xae
-        # which will be replaced to (r) by unidecode
-        rec_value = rec_value.replace('(r)', '')
-        # Replacing ( and ) as this will conlfict with re pattern
-        rec_value = rec_value.replace('(', r'\(').replace(')', r'\)')
+    # ingredient dictionary, records are read as tuples
+    # using server side cursor instead of model objects
+    ingredients = Ingredient.objects.values_list(
+        'name', 'category__name', 'state__name', 'group__name',
+        'notes', 'shelflife', 'finalspec_str', 'alternates_str'
+    ).iterator(chunk_size=chunk_size)
+    for name, category, state, group, notes, shelflife, finalspec, \
+            alternates_str in ingredients:
+        rec_value = get_pattern_value(name)
         d = ingredient_dict.setdefault(rec_value, {})
-        if i.category:
-            d['category'] = i.category.name.lower().strip()
-        else:
-            d['category'] = None
-        if i.state:
-            d['state'] = i.state.name.lower().strip()
-        else:
-            d['state'] = None
-        if i.group:
-            d['group'] = i.group.name.lower().strip()
-        else:
-            d['group'] = None
-
-        d['notes'] = i.notes
-        d['shelflife'] = i.shelflife
-        d['finalspec'] = i.finalspec_str
-
-        if i.alternates_str:
-            for oth_form in [i.strip() for i in i.alternates_str.split(';') if i.strip()]:
-                if isinstance(oth_form, bytes):
-                    oth_form = unidecode(oth_form.decode('utf-8')).strip().lower()
-                else:
-                    oth_form = unidecode(oth_form).strip().lower()
-
-                # Removing special char \xc2\xae
-                # which will be replaced to (r) by unidecode
-                oth_form = oth_form.replace('(r)', '')
-                # Replacing ( and ) as this will conlfict with re pattern
-                oth_form = oth_form.replace('(', r'\(').replace(')', r'\)')
+        d['category'] = category.lower().strip() if category is not None else None
+        d['state'] = state.lower().strip() if state is not None else None
+        d['group'] = group.lower().strip() if group is not None else None
+        d['notes'] = notes
+        d['shelflife'] = shelflife
+        d['finalspec'] = finalspec
+
+        if alternates_str:
+            for oth_form in [i.strip() for i in alternates_str.split(';') if i.strip()]:
+                oth_form = get_pattern_value(oth_form)
                 if oth_form == rec_value:
                     continue
                 replace_strings[oth_form] = rec_value
 
-    for rec in Characteristic.objects.all().select_related('type'):
-        if not rec.type:
-            continue
-
-        if isinstance(rec.name, bytes):
-            rec_value = unidecode(rec.name.decode('utf-8')).strip().lower()
-        else:
-            rec_value = unidecode(rec.name).strip().lower()
-
-        # Removing special char \xc2\xae
-        # which will be replaced to (r) by unidecode
-        rec_value = rec_value.replace('(r)', '')
-        # Replacing ( and ) as this will conlfict with re pattern
-        rec_value = rec_value.replace('(', r'\(').replace(')', r'\)')
-        if rec.type.name == "alcoholic_beverage":
+    characteristics = Characteristic.objects.filter(type__isnull=False).\
+        values_list('name', 'type__name', 'alternates', 'additional_info').\
+        iterator(chunk_size=chunk_size)
+    for name, type_name, alternates, additional_info in characteristics:
+        rec_value = get_pattern_value(name)
+        if type_name == "alcoholic_beverage":
             alcoholic_beverages.append(rec_value)
-        elif rec.type.name == "nonfood_goods":
+        elif type_name == "nonfood_goods":
             nonfood_goods.append(rec_value)
-        elif rec.type.name == "standard_values":
+        elif type_name == "standard_values":
             standard_values.append(rec_value)
-        elif rec.type.name == "ingredient_patterns":
+        elif type_name == "ingredient_patterns":
             ingredient_patterns.append(rec_value)
-        elif rec.type.name == "state_uom_chart":
-            if rec.additional_info:
-                uom_value = eval(rec.additional_info).get(
-                    'unit_of_measure', [])
+        elif type_name == "state_uom_chart":
+            if additional_info:
+                uom_value = additional_info.get('unit_of_measure', '')
                 uom_values = [i.strip()
                               for i in uom_value.split(";") if i.strip()]
                 if len(uom_values) > 0:
                     state_uom_chart[rec_value] = uom_values
-        elif rec.type.name == "valid_skus":
-            i_value = []
-            if rec.additional_info:
-                i_value = eval(rec.additional_info)
-            for value in i_value:
-                if isinstance(value, bytes):
-                    rec_value = unidecode(
-                        value.decode('utf-8')).strip().lower()
-                else:
-                    rec_value = unidecode(value).strip().lower()
-
-                # Removing special char \xc2\xae
-                # which will be replaced to (r) by unidecode
-                rec_value = rec_value.replace('(r)', '')
-                # Replacing ( and ) as this will conlfict with re pattern
-                rec_value = rec_value.replace('(', r'\(').replace(')', r'\)')
-                stdv_dict = valid_skus.setdefault(rec.name, {})
+        elif type_name == "valid_skus":
+            for value in additional_info or []:
+                rec_value = get_pattern_value(value)
+                stdv_dict = valid_skus.setdefault(name, {})
                 stdv_dict[convert_to_float(rec_value)] = rec_value
         else:
-            ingmaster_values[rec_value] = rec.type.name
+            ingmaster_values[rec_value] = type_name
 
-        if rec.alternates:
-            # alternatives dictionary. converting string to list using 'eval'
-            for oth_form in eval(rec.alternates):
-                if isinstance(oth_form, bytes):
-                    oth_form = unidecode(
-                        oth_form.decode('utf-8')).strip().lower()
-                else:
-                    oth_form = unidecode(oth_form).strip().lower()
-
-                # Removing special char \xc2\xae
-                # which will be replaced to (r) by unidecode
-                oth_form = oth_form.replace('(r)', '')
-                # Replacing ( and ) as this will conlfict with re pattern
-                oth_form = oth_form.replace('(', r'\(').replace(')', r'\)')
+        if alternates:
+            # alternates is list of alternative values(json)
+            for oth_form in alternates:
+                oth_form = get_pattern_value(oth_form)
                 if oth_form == rec_value:
                     continue
                 replace_strings[oth_form] = rec_value
@@ -391,3 +486,128 @@ def get_ingredientmaster_values():
     return replace_strings, ingmaster_values, ingredient_dict, \
         alcoholic_beverages, nonfood_goods, ingredient_patterns, \
         state_uom_chart, valid_skus
+
+
+def get_peak_rss():
+    """
+    Returns:
+        Peak resident memory of this process in MB
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # ru_maxrss is in bytes on mac and in KB on linux
+        peak_rss = peak_rss / 1024
+    return round(peak_rss / 1024, 1)
+
+
+def get_masterdata_revision():
+    """
+    Reads master data revision, which is bumped by signals
+    whenever master data is changed
+
+    Returns:
+        Revision(int)
+    """
+    revision = MasterdataRevision.objects.filter(id=MASTERDATA_REVISION_ID).\
+        values_list('revision', flat=True).first()
+    return revision or 0
+
+
+def close_db_connections():
+    """
+    Closes postgresql connections, should be called before forking
+    so the processes don't share the same connection
+    """
+    connections.close_all()
+
+
+def get_masterdata_fingerprint():
+    """
+    Fingerprint of master data used for tokenizing,
+    changes when any record is added, updated or deleted
+
+    Returns:
+        sha1 hex digest(string)
+    """
+    parts = []
+    for model in (Ingredient, Characteristic, CharacteristicType,
+                  State, Category, Group, Size, IngredientConversion,
+                  Pattern):
+        stats = model.objects.aggregate(
+            count=Count('id'), lastmodified=Max('lastmodified'))
+        parts.append('%s:%s:%s' % (
+            model.__name__, stats['count'], stats['lastmodified']))
+    parts.append('revision:%s' % get_masterdata_revision())
+    return hashlib.sha1("|".join(parts).encode('utf-8')).hexdigest()
+
+
+def clean_master_value(value):
+    """
+    Converts master data value to the text used in tokens
+    ie: unidecode, lower case and removing (r)
+
+    Returns:
+        Cleaned value
+    """
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    return unidecode(value).strip().lower().replace('(r)', '')
+
+
+def get_pattern_value(value):
+    """
+    Converts master data value to the regex source used in matchers
+    ie: 'Bok Choy (Chinese)' to 'bok choy \\(chinese\\)'
+
+    Returns:
+        Cleaned and escaped value
+    """
+    # Replacing ( and ) as this will conlfict with re pattern
+    return clean_master_value(value).replace('(', r'\(').replace(')', r'\)')
+
+
+def get_words_re(values):
+    """
+    Builds regex matching any of values as whole words,
+    also in plural ie: 'sea salt' in 'Coarse Sea Salts'
+
+    Returns:
+        Compiled regex
+    """
+    return re.compile(r'(?<![a-z0-9])(?:{})(?:e?s)?(?![a-z0-9])'.format(
+        "|".join(re.escape(i) for i in values)), re.IGNORECASE)
+
+
+def get_masterdata_values(since=None):
+    """
+    Gets Ingredient and Characteristic values with their alternates
+    which are added or modified after since(UTC datetime),
+    all the values if since is None
+
+    Returns:
+        Values(set)
+    """
+    ingredients = Ingredient.objects.all()
+    characteristics = Characteristic.objects.all()
+    if since is not None:
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, timezone.utc)
+        if not settings.USE_TZ:
+            # Datetimes are saved in default time zone with out USE_TZ
+            since = timezone.make_naive(since, timezone.get_default_timezone())
+        ingredients = ingredients.filter(lastmodified__gt=since)
+        characteristics = characteristics.filter(lastmodified__gt=since)
+
+    values = set()
+    for rec in ingredients.only('name', 'alternates_str'):
+        values.add(clean_master_value(rec.name))
+        if rec.alternates_str:
+            values.update(clean_master_value(i)
+                          for i in rec.alternates_str.split(';') if i.strip())
+
+    for rec in characteristics.only('name', 'alternates'):
+        values.add(clean_master_value(rec.name))
+        if rec.alternates:
+            values.update(clean_master_value(i) for i in rec.alternates)
+    values.discard('')
+    return values
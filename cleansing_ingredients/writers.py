@@ -0,0 +1,186 @@
+"""
+Bulk writer used for writing cleansed documents into mongo
+"""
+
+import copy
+import time
+
+from bson import BSON
+from pymongo import InsertOne, ReplaceOne
+from pymongo.errors import AutoReconnect, BulkWriteError, WTimeoutError
+from pymongo.write_concern import WriteConcern
+
+# Errors after which the same bulk write is retried
+TRANSIENT_ERRORS = (AutoReconnect, WTimeoutError)
+
+# Duplicate key error code, returned when inserts done
+# by a failed attempt are retried
+DUPLICATE_KEY_ERROR = 11000
+
+# Write concern error code of wtimeout, bulk_write reports it in
+# BulkWriteError details instead of raising WTimeoutError
+WTIMEOUT_ERROR = 64
+
+# Every SIZE_SAMPLE_RATE-th document is encoded for estimating the BSON
+# size of buffered documents, pymongo encodes all of them again on write
+SIZE_SAMPLE_RATE = 50
+
+
+def get_write_concern(w=None, wtimeout=None, j=None):
+    """
+    Builds WriteConcern from command line values, w can be
+    number of nodes or tag(ie: 'majority')
+
+    Returns:
+        WriteConcern or None for the server default
+    """
+    if w is None and wtimeout is None and j is None:
+        return None
+    if isinstance(w, str) and w.isdigit():
+        w = int(w)
+    return WriteConcern(w=w, wtimeout=wtimeout, j=j)
+
+
+def is_wtimeout(error):
+    """
+    Returns:
+        True if write concern error(dict) of bulk write is a wtimeout
+    """
+    return error.get('code') == WTIMEOUT_ERROR or \
+        bool(error.get('errInfo', {}).get('wtimeout'))
+
+
+class BulkWriter(object):
+    """
+    Buffers documents and writes them using unordered bulk writes.
+
+    Buffered documents should be flushed when batch_size documents or
+    batch_bytes(BSON size estimated from sampled documents) are
+    buffered, see is_full.
+    Documents are inserted or replaced by _id when upsert is True.
+    Bulk writes failing with transient errors or write concern
+    timeouts are retried retries times with exponential backoff
+    """
+
+    def __init__(self, collection, batch_size=1000, batch_bytes=16 * 1024 * 1024,
+                 upsert=False, write_concern=None, retries=3, backoff=0.5,
+                 logger=None):
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+        self.collection = collection
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.upsert = upsert
+        self.retries = retries
+        self.backoff = backoff
+        self.logger = logger
+        self.requests = []
+        self.pending_bytes = 0
+        self.added = 0
+        self.sampled_docs = 0
+        self.sampled_bytes = 0
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, document):
+        """Buffers document to be written in next flush"""
+        if self.upsert:
+            request = ReplaceOne({'_id': document['_id']}, document, upsert=True)
+        else:
+            request = InsertOne(document)
+        self.requests.append(request)
+        if self.added % SIZE_SAMPLE_RATE == 0:
+            self.sampled_docs += 1
+            self.sampled_bytes += len(BSON.encode(document))
+        self.added += 1
+        self.pending_bytes += self.sampled_bytes // self.sampled_docs
+
+    def detach(self):
+        """
+        Moves buffered documents into a new writer, so they can be
+        flushed while next documents are buffered in this writer
+
+        Returns:
+            Writer with the buffered documents
+        """
+        writer = copy.copy(self)
+        self.requests = []
+        self.pending_bytes = 0
+        return writer
+
+    def is_full(self):
+        return len(self.requests) >= self.batch_size or \
+            self.pending_bytes >= self.batch_bytes
+
+    def _bulk_write(self, attempt):
+        """
+        Returns:
+            Number of documents written
+        """
+        try:
+            result = self.collection.bulk_write(self.requests, ordered=False)
+        except BulkWriteError as e:
+            details = e.details
+            write_errors = details.get('writeErrors', [])
+            concern_errors = details.get('writeConcernErrors', [])
+            if write_errors and not (attempt and all(
+                    i['code'] == DUPLICATE_KEY_ERROR for i in write_errors)):
+                raise
+            if concern_errors:
+                if all(is_wtimeout(i) for i in concern_errors):
+                    # Documents are written but not replicated in time,
+                    # retrying makes sure they are
+                    raise WTimeoutError(
+                        concern_errors[0].get('errmsg'), WTIMEOUT_ERROR, details)
+                raise
+            # Duplicates are the documents inserted by the failed attempt
+            return details['nInserted'] + details['nUpserted'] + \
+                details['nMatched'] + len(write_errors)
+        if not result.acknowledged:
+            # Counts are not returned for w=0
+            return len(self.requests)
+        return result.inserted_count + result.upserted_count + \
+            result.matched_count
+
+    def flush(self):
+        """
+        Writes buffered documents
+
+        Returns:
+            Flush stats(dict) with written documents, bytes,
+            documents and bytes per second and retries
+        """
+        start_time = time.time()
+        documents, pending_bytes = len(self.requests), self.pending_bytes
+        written = 0
+        attempt = 0
+        if self.requests:
+            while True:
+                try:
+                    written = self._bulk_write(attempt)
+                    break
+                except TRANSIENT_ERRORS as e:
+                    if attempt >= self.retries:
+                        raise
+                    wait_time = self.backoff * (2 ** attempt)
+                    attempt += 1
+                    if self.logger:
+                        self.logger.warning(
+                            "Bulk write of %s documents failed: %s, Retry: %s in %ss",
+                            documents, e, attempt, wait_time
+                        )
+                    time.sleep(wait_time)
+
+        self.requests = []
+        self.pending_bytes = 0
+        seconds = time.time() - start_time
+        return {
+            'documents': documents,
+            'written': written,
+            'bytes': pending_bytes,
+            'seconds': round(seconds, 3),
+            'docs_per_sec': round(documents / seconds, 1) if seconds else 0.0,
+            'bytes_per_sec': round(pending_bytes / seconds, 1) if seconds else 0.0,
+            'retries': attempt
+        }
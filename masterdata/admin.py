@@ -2,6 +2,7 @@ import re
 from django.contrib import admin
 import csv
 from django import forms
+from django.contrib.postgres.forms import JSONField
 from django.db import models
 from django.http import HttpResponse
 from .models import Characteristic, CharacteristicType, \
@@ -92,9 +93,18 @@ class PatternForm(forms.ModelForm):
 
 class CharacteristicForm(forms.ModelForm):
     class Meta():
+        # alternates and additional_info are edited as JSON text
+        field_classes = {
+            'alternates': JSONField,
+            'additional_info': JSONField,
+        }
         widgets = {
-            'alternates': forms.TextInput(attrs={'class': 'input-small', 'style': 'width :500px;' 'display: inline-block;'}),
-            'additional_info': forms.TextInput(attrs={'class': 'input-small', 'style': 'width :500px;' 'display: inline-block;'}),
+            'alternates': forms.Textarea(attrs={'rows': 2, 'style': 'width :500px;'}),
+            'additional_info': forms.Textarea(attrs={'rows': 2, 'style': 'width :500px;'}),
+        }
+        help_texts = {
+            'alternates': 'JSON list of alternative values, ie: ["tbsp", "tbs"]',
+            'additional_info': 'JSON dict(ie: state_uom_chart) or list(ie: valid_skus) of the type',
         }
 
 
@@ -109,6 +119,7 @@ class CharacteristicAdmin(admin.ModelAdmin):
     list_per_page = 50
     actions_on_top = True
     actions_on_bottom = False
+    form = CharacteristicForm
 
     def get_changelist_form(self, request, **kwargs):
         return CharacteristicForm
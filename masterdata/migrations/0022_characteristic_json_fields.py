@@ -0,0 +1,86 @@
+# Generated by Django 2.0.5 on 2026-10-18 10:00
+
+import ast
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+def to_json_value(value):
+    """Converts bytes in python literal(py2 reprs) to text"""
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    if isinstance(value, (list, tuple, set)):
+        return [to_json_value(i) for i in value]
+    if isinstance(value, dict):
+        return dict((to_json_value(k), to_json_value(v)) for k, v in value.items())
+    return value
+
+
+def text_to_json(apps, schema_editor):
+    """Parses python reprs saved in text fields into json fields"""
+    Characteristic = apps.get_model('masterdata', 'Characteristic')
+    for rec in Characteristic.objects.all().only('id', 'alternates', 'additional_info'):
+        alternates_json = None
+        if rec.alternates and rec.alternates.strip():
+            alternates_json = to_json_value(ast.literal_eval(rec.alternates))
+        additional_info_json = None
+        if rec.additional_info and rec.additional_info.strip():
+            additional_info_json = to_json_value(
+                ast.literal_eval(rec.additional_info))
+        Characteristic.objects.filter(id=rec.id).update(
+            alternates_json=alternates_json,
+            additional_info_json=additional_info_json
+        )
+
+
+def json_to_text(apps, schema_editor):
+    """Saves json fields as python reprs in text fields"""
+    Characteristic = apps.get_model('masterdata', 'Characteristic')
+    for rec in Characteristic.objects.all().only(
+            'id', 'alternates_json', 'additional_info_json'):
+        Characteristic.objects.filter(id=rec.id).update(
+            alternates=None if rec.alternates_json is None
+            else repr(rec.alternates_json),
+            additional_info=None if rec.additional_info_json is None
+            else repr(rec.additional_info_json)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masterdata', '0021_auto_20180627_1200'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='characteristic',
+            name='alternates_json',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='characteristic',
+            name='additional_info_json',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(text_to_json, json_to_text),
+        migrations.RemoveField(
+            model_name='characteristic',
+            name='alternates',
+        ),
+        migrations.RemoveField(
+            model_name='characteristic',
+            name='additional_info',
+        ),
+        migrations.RenameField(
+            model_name='characteristic',
+            old_name='alternates_json',
+            new_name='alternates',
+        ),
+        migrations.RenameField(
+            model_name='characteristic',
+            old_name='additional_info_json',
+            new_name='additional_info',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.0.5 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+def create_revision(apps, schema_editor):
+    MasterdataRevision = apps.get_model('masterdata', 'MasterdataRevision')
+    MasterdataRevision.objects.get_or_create(id=1, defaults={'revision': 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masterdata', '0022_characteristic_json_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasterdataRevision',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('revision', models.BigIntegerField(default=0)),
+                ('lastmodified', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'masterdata_revision',
+            },
+        ),
+        migrations.RunPython(create_revision, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.contrib.postgres.fields import JSONField
 from django.utils import timezone
-from django.db.models.signals import m2m_changed, post_save
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 TRUE_FALSE_CHOICES = (
@@ -16,8 +18,10 @@ class Characteristic(models.Model):
     name = models.CharField(max_length=100, unique=True, null=False)
     type = models.ForeignKey('CharacteristicType', on_delete=models.CASCADE,
                              null=True)
-    alternates = models.TextField(blank=True, null=True)
-    additional_info = models.TextField(blank=True, null=True)
+    # List of alternative values
+    alternates = JSONField(blank=True, null=True)
+    # Dict(state_uom_chart) or list(valid_skus) of values of the type
+    additional_info = JSONField(blank=True, null=True)
     createdate = models.DateTimeField(auto_now_add=True)
     lastmodified = models.DateTimeField(auto_now=True)
 
@@ -177,6 +181,25 @@ class Pattern(models.Model):
     class Meta:
         db_table = 'pattern'
 
+
+# Id of the only MasterdataRevision record
+MASTERDATA_REVISION_ID = 1
+
+
+class MasterdataRevision(models.Model):
+    """
+    Revision of master data, bumped by signals whenever master data
+    records are saved or deleted, so long running tokenizers
+    can check for changes with out reading all the records.
+    Queryset update and bulk_create don't send signals
+    """
+    id = models.AutoField(primary_key=True)
+    revision = models.BigIntegerField(default=0)
+    lastmodified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'masterdata_revision'
+
 # Django Signals
 
 
@@ -231,3 +254,27 @@ def ingredient_m2m(sender, action, instance, *args, **kwargs):
 m2m_changed.connect(ingredient_m2m, sender=Ingredient.alternates.through)
 m2m_changed.connect(ingredient_m2m, sender=Ingredient.finalspec.through)
 m2m_changed.connect(ingredient_m2m, sender=Ingredient.size_finalspec.through)
+
+
+# Bumping master data revision on every change of master data
+def bump_masterdata_revision(sender, **kwargs):
+    action = kwargs.get('action')
+    if action is not None and not action.startswith('post_'):
+        # Skipping pre_add, pre_remove and pre_clear of m2m changes
+        return
+
+    updated = MasterdataRevision.objects.filter(id=MASTERDATA_REVISION_ID).update(
+        revision=F('revision') + 1, lastmodified=timezone.now())
+    if not updated:
+        MasterdataRevision.objects.get_or_create(
+            id=MASTERDATA_REVISION_ID, defaults={'revision': 1})
+
+
+for masterdata_model in [Ingredient, Characteristic, CharacteristicType, State,
+                         Category, Group, Size, IngredientConversion, Pattern]:
+    post_save.connect(bump_masterdata_revision, sender=masterdata_model)
+    post_delete.connect(bump_masterdata_revision, sender=masterdata_model)
+
+for masterdata_through in [Ingredient.alternates.through, Ingredient.finalspec.through,
+                           Ingredient.size_finalspec.through]:
+    m2m_changed.connect(bump_masterdata_revision, sender=masterdata_through)
@@ -1,3 +1,89 @@
+from django import forms
+from django.forms import modelform_factory
 from django.test import TestCase
 
+from .admin import CharacteristicForm
+from .models import Characteristic, CharacteristicType, Ingredient, Size, \
+    Pattern, MasterdataRevision, MASTERDATA_REVISION_ID
+
 # Create your tests here.
+
+
+class MasterdataRevisionTest(TestCase):
+
+    def get_revision(self):
+        revision = MasterdataRevision.objects.filter(id=MASTERDATA_REVISION_ID).\
+            values_list('revision', flat=True).first()
+        return revision or 0
+
+    def test_save_bumps_revision(self):
+        revision = self.get_revision()
+        char_type = CharacteristicType.objects.create(name='unit_of_measure')
+        Characteristic.objects.create(
+            name='cup', type=char_type, alternates=['cups', 'c'])
+        Size.objects.create(name='medium')
+        Pattern.objects.create(pattern='tbsp', target_pattern='tablespoon')
+        self.assertEqual(self.get_revision(), revision + 4)
+
+    def test_update_and_delete_bump_revision(self):
+        size = Size.objects.create(name='medium')
+        revision = self.get_revision()
+        size.name = 'large'
+        size.save()
+        self.assertEqual(self.get_revision(), revision + 1)
+        size.delete()
+        self.assertEqual(self.get_revision(), revision + 2)
+
+    def test_m2m_changes_bump_revision(self):
+        salt = Ingredient.objects.create(name='salt')
+        sea_salt = Ingredient.objects.create(name='sea salt')
+        revision = self.get_revision()
+        salt.alternates.add(sea_salt)
+        self.assertGreater(self.get_revision(), revision)
+        self.assertEqual(
+            Ingredient.objects.get(name='salt').alternates_str, 'sea salt')
+
+        revision = self.get_revision()
+        salt.alternates.remove(sea_salt)
+        self.assertGreater(self.get_revision(), revision)
+
+    def test_revision_is_created_if_missing(self):
+        MasterdataRevision.objects.all().delete()
+        Size.objects.create(name='medium')
+        self.assertEqual(self.get_revision(), 1)
+
+    def test_queryset_update_does_not_bump_revision(self):
+        Size.objects.create(name='medium')
+        revision = self.get_revision()
+        Size.objects.filter(name='medium').update(name='large')
+        self.assertEqual(self.get_revision(), revision)
+
+
+class CharacteristicFormTest(TestCase):
+
+    def get_form(self, data):
+        form_class = modelform_factory(
+            Characteristic, form=CharacteristicForm,
+            fields=('alternates', 'additional_info'))
+        return form_class(data)
+
+    def test_json_fields_are_edited_in_textareas(self):
+        form = self.get_form({})
+        self.assertIsInstance(form.fields['alternates'].widget, forms.Textarea)
+        self.assertIsInstance(
+            form.fields['additional_info'].widget, forms.Textarea)
+
+    def test_json_values_are_parsed(self):
+        form = self.get_form({
+            'alternates': '["cups", "c"]',
+            'additional_info': '{"liquid": ["cup", "ounce"]}'
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['alternates'], ['cups', 'c'])
+        self.assertEqual(
+            form.cleaned_data['additional_info'], {'liquid': ['cup', 'ounce']})
+
+    def test_invalid_json_is_rejected(self):
+        form = self.get_form({'alternates': 'cups, c', 'additional_info': ''})
+        self.assertFalse(form.is_valid())
+        self.assertIn('alternates', form.errors)